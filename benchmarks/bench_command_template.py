@@ -0,0 +1,61 @@
+#
+#	B E N C H   C O M M A N D   T E M P L A T E
+#
+# the cost of building and encoding a setValue command the old way, an XTCommand made from
+# keywords and then encoded, against XTCommand.template encode, and what XTUnit.setValue
+# costs now that it uses a template. Checks that both make the same packet first
+#
+#	python benchmarks/bench_command_template.py [count]
+#
+
+import os
+import sys
+import timeit
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__))))
+
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+def perCall( func, count):
+	return min( timeit.repeat( func, number=count, repeat=5)) / count * 1e6
+
+
+def decoded( rawPacket):
+	workCommand = xtPlugin.XTCommand()
+	workCommand._parse( rawPacket)
+	return [workCommand.get( key) for key in (xtKeyCommand, xtKeyCommandTarget, xtKeyUniqueId, xtKeyValue)]
+
+
+if __name__ == '__main__':
+	count = 100000
+	if len( sys.argv) > 1:
+		count = int( sys.argv[1])
+
+	xtPlugin.cXTension()
+	workPlugin = xtPlugin.XTension
+	workPlugin.writeLog = lambda *args, **kwargs: None
+
+	# nothing is connected so the packets are just thrown away
+	workPlugin._sendPacket = lambda rawPacket, priority=False: None
+
+	setValueTemplate = xtPlugin.XTCommand.template( xtKeyUniqueId, xtKeyValue, xtKeyCommand=xtCommandSetValue, xtKeyCommandTarget=xtTargetUnit)
+
+	def oldWay():
+		return xtPlugin.XTCommand( xtKeyCommand=xtCommandSetValue, xtKeyCommandTarget=xtTargetUnit, xtKeyUniqueId='abc-123', xtKeyValue=55)._encode()
+
+	def templateWay():
+		return setValueTemplate.encode( 'abc-123', 55)
+
+	if decoded( oldWay()) != decoded( templateWay()):
+		raise RuntimeError( "the template and XTCommand packets are not the same")
+
+	workData = xtPlugin.xtData()
+	workData.set( xtUnitKeyUniqueId, 'abc-123')
+	workUnit = xtPlugin.XTUnit( workData)
+
+	print( "XTCommand + _encode:   %6.2f us" % perCall( oldWay, count))
+	print( "template.encode:       %6.2f us" % perCall( templateWay, count))
+	print( "XTUnit.setValue:       %6.2f us" % perCall( lambda: workUnit.setValue( 55), count))
+	print( "XTUnit.turnOn:         %6.2f us" % perCall( workUnit.turnOn, count))
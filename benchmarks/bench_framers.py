@@ -0,0 +1,118 @@
+#
+#	B E N C H   F R A M E R S
+#
+# how much of one core each framer needs to keep up with a device sending 1MB a second. One
+# second of synthetic stream, 1MB, is fed in reads of a few sizes and the time taken is the
+# share of a core. The line stream is also split the way plugins did it before the framers,
+# adding to a bytes buffer and splitting and re-slicing it after every read, for comparison
+#
+#	python benchmarks/bench_framers.py
+#
+
+import os
+import random
+import re
+import struct
+import sys
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__))))
+
+import xtension_plugin as xtPlugin
+
+
+streamSize = 1048576 # one second at 1MB/s
+readSizes = (64, 1460, 16384)
+
+
+#
+# the streams are made up of random printable messages of 10 to 70 bytes
+#
+def randomMessages( workRandom):
+	while True:
+		yield bytes( workRandom.randrange( 33, 127) for i in range( workRandom.randrange( 10, 70)))
+
+
+def makeStream( makeFrame, seed=2):
+	workRandom = random.Random( seed)
+	workFrames = []
+	workSize = 0
+
+	for workMessage in randomMessages( workRandom):
+		workFrame = makeFrame( workMessage)
+		if workSize + len( workFrame) > streamSize:
+			break
+
+		workFrames.append( workFrame)
+		workSize += len( workFrame)
+
+	return b''.join( workFrames), len( workFrames)
+
+
+#
+# what every plugin used to do with self.buffer in dataAvailable
+#
+class NaiveLineSplitter( object):
+
+	def __init__( self):
+		self.buffer = b''
+
+	def feed( self, newData):
+		self.buffer += newData
+
+	def frames( self):
+		workFrames = []
+		while b'\r\n' in self.buffer:
+			workFrame, self.buffer = self.buffer.split( b'\r\n', 1)
+			workFrames.append( workFrame)
+
+		return workFrames
+
+
+def timeFramer( makeFramer, streamData, readSize, repeat=3):
+	bestTime = None
+
+	for i in range( repeat):
+		workFramer = makeFramer()
+		frameCount = 0
+		startTime = time.perf_counter()
+
+		for readStart in range( 0, len( streamData), readSize):
+			workFramer.feed( streamData[ readStart:readStart + readSize])
+			frameCount += len( workFramer.frames())
+
+		workTime = time.perf_counter() - startTime
+		if bestTime == None or workTime < bestTime:
+			bestTime = workTime
+
+	return bestTime, frameCount
+
+
+if __name__ == '__main__':
+	lineStream = makeStream( lambda workMessage: workMessage + b'\r\n')
+	fixedStream = makeStream( lambda workMessage: workMessage[ :10])
+	prefixStream = makeStream( lambda workMessage: struct.pack( '>H', len( workMessage)) + workMessage)
+	nmeaStream = makeStream( lambda workMessage: b'$' + workMessage.replace( b'$', b'').replace( b'*', b'') + b'*00\r\n')
+
+	workCases = [
+		('naive split',		lineStream,		NaiveLineSplitter),
+		('delimiter',		lineStream,		lambda: xtPlugin.XTDelimiterFramer( b'\r\n')),
+		('parsing',			lineStream,		lambda: xtPlugin.XTParsingFramer( b'\r\n', 80)),
+		('fixed',			fixedStream,	lambda: xtPlugin.XTFixedFramer( 10)),
+		('length prefix',	prefixStream,	lambda: xtPlugin.XTLengthPrefixFramer( 2)),
+		('regex',			nmeaStream,		lambda: xtPlugin.XTRegexFramer( re.compile( br'\$[^*]*\*..')))]
+
+	print( "share of one core at 1MB/s, reads of %s bytes" % ', '.join( str( x) for x in readSizes))
+
+	for (caseName, (streamData, expectedFrames), makeFramer) in workCases:
+		workResults = []
+
+		for readSize in readSizes:
+			workTime, frameCount = timeFramer( makeFramer, streamData, readSize)
+
+			if frameCount != expectedFrames:
+				raise RuntimeError( "%s gave %s frames, expected %s" % (caseName, frameCount, expectedFrames))
+
+			workResults.append( "%6.1f%%" % (workTime * 100.0))
+
+		print( "%-14s %6d frames  %s" % (caseName, expectedFrames, '  '.join( workResults)))
@@ -0,0 +1,124 @@
+#
+#	B E N C H   S E R I A L   R E A D S
+#
+# a fake serial device on a pty that sends 40 byte lines the way a 115200 baud device does, a
+# few bytes at a time with gaps between the lines, and counts the dataAvailable calls per KB
+# with the old byte then in_waiting reads, with serialReadSize set, and the frames with a
+# delimiter framer on top of that.
+#
+#	sudo python benchmarks/bench_serial_reads.py
+#
+# the port is opened as /dev/tty.<name> so a link to the pty is made in /dev, which needs root.
+# needs pyserial. Linux won't set RTS and DTR on a pty so setting them is skipped here
+#
+
+import os
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__))))
+
+import serial
+
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+#
+#	X T   F A K E   S E R I A L   D E V I C E
+#
+# the other end of a pty linked to as /dev/tty.<portName>. send writes chunkSize bytes at a
+# time with chunkDelay between them, about what a USB serial adapter hands over at 115200
+#
+class XTFakeSerialDevice( object):
+
+	def __init__( self, portName='xtfake', chunkSize=8, chunkDelay=0.0007):
+		self.portName = portName
+		self.chunkSize = chunkSize
+		self.chunkDelay = chunkDelay
+
+		self.master, self.slave = os.openpty()
+		tty.setraw( self.slave)
+
+		self.linkPath = '/dev/tty.' + portName
+		if os.path.lexists( self.linkPath):
+			os.remove( self.linkPath)
+
+		os.symlink( os.ttyname( self.slave), self.linkPath)
+
+	def send( self, theData):
+		for chunkStart in range( 0, len( theData), self.chunkSize):
+			os.write( self.master, theData[ chunkStart:chunkStart + self.chunkSize])
+
+			# sleep isn't fine enough for this
+			chunkEnd = time.perf_counter() + self.chunkDelay
+			while time.perf_counter() < chunkEnd:
+				pass
+
+	def close( self):
+		os.remove( self.linkPath)
+		os.close( self.master)
+		os.close( self.slave)
+
+
+class CountingConnection( xtPlugin.XTRemoteConnection):
+
+	def __init__( self, **kwds):
+		self.calls = 0
+		self.frameCount = 0
+		self.byteCount = 0
+		xtPlugin.XTRemoteConnection.__init__( self, **kwds)
+
+	def dataAvailable( self):
+		self.calls += 1
+		self.byteCount += len( self.buffer)
+		self.buffer = b''
+
+	def frameReceived( self, frame):
+		self.calls += 1
+		self.frameCount += 1
+		self.byteCount += len( frame) + 1
+
+	def error( self, e):
+		print( "error: %s" % e)
+		return True
+
+
+testLine = b'T:21.5,H:45.2,P:1013.2,ID:abcdef012345\r'
+lineCount = 200
+lineGap = 0.02
+
+
+def runCase( caseName, **kwds):
+	workDevice = XTFakeSerialDevice()
+	workConnection = CountingConnection( **dict( kwds, **{xtKeyPortName: workDevice.portName}))
+	time.sleep( 0.5)
+
+	for i in range( lineCount):
+		workDevice.send( testLine)
+		time.sleep( lineGap)
+
+	time.sleep( 0.3)
+	workConnection.close()
+	time.sleep( 0.2)
+	workDevice.close()
+
+	kiloBytes = lineCount * len( testLine) / 1024.0
+	print( "%-22s %5d calls  %5.1f per KB  %6d bytes" % (caseName, workConnection.calls, workConnection.calls / kiloBytes, workConnection.byteCount))
+
+
+if __name__ == '__main__':
+	serial.Serial._update_rts_state = lambda self: None
+	serial.Serial._update_dtr_state = lambda self: None
+
+	xtPlugin.cXTension()
+	workPlugin = xtPlugin.XTension
+	workPlugin.settings = xtPlugin.xtData()
+	workPlugin.writeLog = lambda *args, **kwargs: None
+	workPlugin.setRunState = lambda *args, **kwargs: None
+
+	runCase( 'byte then in_waiting')
+	runCase( 'serialReadSize 4096', serialReadSize=4096)
+	runCase( 'with a framer', serialReadSize=4096, framer=xtPlugin.XTDelimiterFramer( b'\r'))
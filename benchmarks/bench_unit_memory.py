@@ -0,0 +1,81 @@
+#
+#	B E N C H   U N I T   M E M O R Y
+#
+# bytes used per unit from a setUnits packet all the way to the indexed XTUnit objects at
+# 1k, 10k and 50k units. Pass other counts on the command line to try those instead
+#
+#	python benchmarks/bench_unit_memory.py [count ...]
+#
+# needs python 3 for tracemalloc
+#
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__))))
+
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+extraKeys = 30 # about what a real unit has beyond the basics
+
+
+def makeUnitsData( count):
+	rootData = xtPlugin.xtData()
+
+	for i in range( count):
+		unitData = xtPlugin.xtData()
+		unitData.name = 'unit'
+		unitData.set( xtUnitKeyUniqueId, str( 1000 + i))
+		unitData.set( xtUnitKeyName, 'Unit %s' % i)
+		unitData.set( xtUnitKeyTag, 'ZW')
+		unitData.set( xtUnitKeyAddress, 'A%s' % i)
+		unitData.set( xtUnitKeyValue, float( i % 100))
+
+		for j in range( extraKeys):
+			unitData.set( 'key%s' % j, 'value %s for unit %s' % (j, i))
+
+		rootData.insertContainer( unitData)
+
+	return rootData.save()
+
+
+def measure( count):
+	theCommand = xtPlugin.XTCommand( xtKeyCommand=xtCommandGetMyUnits)
+	theCommand.set( xtKeyData, makeUnitsData( count))
+
+	workPlugin = xtPlugin.XTension
+	workPlugin.unitIndexById = {}
+	workPlugin.unitIndexByName = {}
+	workPlugin.unitIndexByAddress = {}
+	workPlugin.unitIndexByBareAddress = {}
+	workPlugin.unitIndexByTag = {}
+	workPlugin.unitIndexByKey = {}
+
+	gc.collect()
+	tracemalloc.start()
+	baseSize = tracemalloc.get_traced_memory()[0]
+
+	workPlugin.event_receivedData( theCommand)
+
+	gc.collect()
+	usedSize = tracemalloc.get_traced_memory()[0] - baseSize
+	tracemalloc.stop()
+
+	if len( workPlugin.unitIndexById) != count:
+		raise RuntimeError( "expected %s units and got %s" % (count, len( workPlugin.unitIndexById)))
+
+	return usedSize / float( count)
+
+
+if __name__ == '__main__':
+	xtPlugin.cXTension()
+	xtPlugin.XTension.writeLog = lambda *args, **kwargs: None
+
+	counts = [int( x) for x in sys.argv[1:]] or [1000, 10000, 50000]
+
+	for count in counts:
+		print( "%6d units: %7.0f bytes/unit" % (count, measure( count)))
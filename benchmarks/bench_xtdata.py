@@ -0,0 +1,95 @@
+#
+#	B E N C H   X T D A T A
+#
+# parse and save throughput of xtData on a units reply the size of a small and a large
+# install. Pass --baseline and the directory of an older xtension_plugin.py to time that one
+# against this one on the same data, for example the one from before the memoryview codec:
+#
+#	mkdir /tmp/baseline && git show <commit>:xtension_plugin.py > /tmp/baseline/xtension_plugin.py
+#	python benchmarks/bench_xtdata.py --baseline /tmp/baseline
+#
+# also parses it from a memoryview, as xtKeyData arrives, and checks that both modules and the
+# view give the same tree and that a truncated stream stops cleanly
+#
+
+import importlib.util
+import os
+import sys
+import timeit
+
+benchDir = os.path.dirname( os.path.abspath( __file__))
+sys.path.insert( 0, os.path.dirname( benchDir))
+sys.path.insert( 0, benchDir)
+
+import xtension_plugin as xtPlugin
+from bench_unit_memory import makeUnitsData
+
+
+def loadBaseline( baselineDir):
+	workSpec = importlib.util.spec_from_file_location( 'baseline_plugin', os.path.join( baselineDir, 'xtension_plugin.py'))
+	workModule = importlib.util.module_from_spec( workSpec)
+	workSpec.loader.exec_module( workModule)
+	return workModule
+
+
+def tree( workData):
+	return (workData.name, workData.uuid, sorted( workData.values.items()), [tree( x) for x in workData.containers])
+
+
+def best( func, count=5):
+	return min( timeit.repeat( func, number=count, repeat=3)) / count
+
+
+def timeModule( workModule, rawData):
+	parsedData = workModule.xtData()
+	parsedData._parse( rawData)
+
+	parseTime = best( lambda: workModule.xtData()._parse( rawData))
+	saveTime = best( parsedData.save)
+	return parsedData, parseTime, saveTime
+
+
+if __name__ == '__main__':
+	baselineModule = None
+	if '--baseline' in sys.argv:
+		baselineModule = loadBaseline( sys.argv[ sys.argv.index( '--baseline') + 1])
+
+	xtPlugin.cXTension()
+	xtPlugin.XTension.writeLog = lambda *args, **kwargs: None
+
+	for count in (100, 3000):
+		rawData = makeUnitsData( count)
+		megaBytes = len( rawData) / 1e6
+
+		newData, parseTime, saveTime = timeModule( xtPlugin, rawData)
+
+		if newData.save() != rawData:
+			raise RuntimeError( "save doesn't give back what was parsed")
+
+		print( "%5d units %.2fMB  parse %6.1fms (%3.0fMB/s)  save %6.1fms (%3.0fMB/s)" % (count, megaBytes, parseTime * 1e3, megaBytes / parseTime, saveTime * 1e3, megaBytes / saveTime))
+
+		# the same data as a view into a bigger packet, the way xtKeyData arrives from XTension
+		workPacket = bytearray( 16) + rawData
+		workView = memoryview( workPacket)[ 16:]
+		viewData = xtPlugin.xtData()
+		viewData._parse( workView)
+
+		if tree( viewData) != tree( newData):
+			raise RuntimeError( "a memoryview parsed differently")
+
+		parseTime = best( lambda: xtPlugin.xtData()._parse( workView))
+		print( "   from a view    parse %6.1fms (%3.0fMB/s)" % (parseTime * 1e3, megaBytes / parseTime))
+
+		if baselineModule != None:
+			oldData, parseTime, saveTime = timeModule( baselineModule, rawData)
+
+			if tree( oldData) != tree( newData):
+				raise RuntimeError( "the baseline parsed it differently")
+
+			print( "   baseline       parse %6.1fms (%3.0fMB/s)  save %6.1fms (%3.0fMB/s)" % (parseTime * 1e3, megaBytes / parseTime, saveTime * 1e3, megaBytes / saveTime))
+
+	# a truncated stream has to stop without hanging or raising
+	rawData = makeUnitsData( 50)
+	for cutAt in (len( rawData) - 1, len( rawData) // 2, 9, 5):
+		workData = xtPlugin.xtData()
+		print( "truncated at %5d: parse returned %s with %s units" % (cutAt, workData._parse( rawData[ :cutAt]), len( workData.containers)))
@@ -0,0 +1,29 @@
+#
+# the package directory is the module directory, the tests import xtension_plugin and
+# xtension_constants directly the same way the plugin does from inside it
+#
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__))))
+
+import xtension_plugin as xtPlugin
+
+
+#
+# the global XTension that the scheduler and the connections log through. Nothing is connected
+# to it, the log is kept in logLines so a test can look at it
+#
+@pytest.fixture( scope='session')
+def xtension():
+	if getattr( xtPlugin, 'XTension', None) == None:
+		xtPlugin.cXTension()
+
+	workPlugin = xtPlugin.XTension
+	workPlugin.logLines = []
+	workPlugin.writeLog = lambda message, *args, **kwargs: workPlugin.logLines.append( str( message))
+	workPlugin.debugLog = lambda message, *args, **kwargs: None
+	return workPlugin
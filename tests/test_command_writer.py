@@ -0,0 +1,79 @@
+import threading
+
+import xtension_plugin as xtPlugin
+
+
+#
+# a lock that stops the writer just before it takes it for a write, after it has already
+# taken the batch out of the queues
+#
+class GateLock( object):
+
+	def __init__( self):
+		self.lock = threading.Lock()
+		self.entered = 0
+		self.atWrite = threading.Event()
+		self.goAhead = threading.Event()
+		self.goAhead.set()
+
+	def __enter__( self):
+		self.entered += 1
+		if threading.current_thread().name == 'XTension Write Thread' and self.entered % 2 == 0:
+			self.atWrite.set()
+			self.goAhead.wait( 2.0)
+
+		self.lock.acquire()
+		return self
+
+	def __exit__( self, *args):
+		self.lock.release()
+
+
+def test_writesInOrder( xtension):
+	workWrites = []
+	workWriter = xtPlugin.XTCommandWriter( workWrites.append, writeLock=threading.Lock())
+
+	workWriter.enqueue( b'one')
+	workWriter.enqueue( b'two')
+	workWriter.enqueue( b'first', priority=True)
+	assert workWriter.flush( 2.0)
+	assert b''.join( workWrites) in (b'onetwofirst', b'firstonetwo', b'onefirsttwo')
+	workWriter.stop( 2.0)
+
+
+def test_discardDropsATakenBatch( xtension):
+	workWrites = []
+	gateLock = GateLock()
+	gateLock.goAhead.clear()
+	workWriter = xtPlugin.XTCommandWriter( workWrites.append, writeLock=gateLock)
+
+	workWriter.enqueue( b'old ack')
+	assert gateLock.atWrite.wait( 2.0)
+
+	# the connection is replaced while the writer waits to write what it took
+	with gateLock.lock:
+		workWriter.enqueue( b'old too')
+		workWriter.discard()
+
+	gateLock.goAhead.set()
+	workWriter.enqueue( b'new')
+	assert workWriter.flush( 2.0)
+
+	assert workWrites == [b'new']
+	assert workWriter.getMetrics()[ 'discarded'] == 2
+	workWriter.stop( 2.0)
+
+
+def test_discardLetsFlushGo( xtension):
+	gateLock = GateLock()
+	workWriter = xtPlugin.XTCommandWriter( lambda workData: None, writeLock=gateLock)
+	workWriter.stop( 2.0)
+
+	flushed = threading.Event()
+	workWriter.enqueue( b'never written')
+	workWriter.enqueue( flushed)
+
+	with gateLock.lock:
+		workWriter.discard()
+
+	assert flushed.is_set()
@@ -0,0 +1,81 @@
+import time
+
+import xtension_plugin as xtPlugin
+
+
+class FakeUnit( object):
+
+	def __init__( self):
+		self.sends = []
+
+	def sendCommand( self, **kwds):
+		self.sends.append( (time.time(), kwds))
+
+
+def waitFor( condition, timeout=2.0):
+	endTime = time.time() + timeout
+	while not condition():
+		if time.time() > endTime:
+			return False
+		time.sleep( 0.002)
+
+	return True
+
+
+def test_sendsAfterTimeout( xtension):
+	workUnit = FakeUnit()
+	workCommand = xtPlugin.xtDeferredCommand( workUnit, timeout=0.02)
+	workCommand.addData( first=1)
+	workCommand.addData( second=2)
+
+	assert waitFor( lambda: len( workUnit.sends) == 1)
+	assert workUnit.sends[0][1] == {'first':1, 'second':2, 'xtKeyCommand':xtPlugin.xtCommandNoOp}
+
+
+def test_extendAfterTheCallWasTaken( xtension):
+	workUnit = FakeUnit()
+	workCommand = xtPlugin.xtDeferredCommand( workUnit, timeout=0.05, extendOnAdd=True)
+	workCommand.addData( first=1)
+	firstCall = workCommand._scheduled
+
+	# the scheduler has taken the call but deferredSend is still waiting for the lock when
+	# another value is added, which makes the reschedule queue a second call
+	workCommand.lock.acquire()
+	assert waitFor( lambda: firstCall.done)
+	workCommand.command[ 'second'] = 2
+	workCommand._begin()
+	assert workCommand._scheduled is not firstCall
+	workCommand.lock.release()
+
+	assert waitFor( lambda: len( workUnit.sends) == 1)
+	assert workUnit.sends[0][1][ 'second'] == 2
+
+	# the second call must not send the next command before its own timeout
+	workCommand.timeout = 1.0
+	workCommand.addData( third=3)
+	time.sleep( 0.2)
+	assert len( workUnit.sends) == 1
+
+	workCommand.flush()
+	assert len( workUnit.sends) == 2
+	assert workUnit.sends[1][1][ 'third'] == 3
+
+
+def test_flushAfterTheCallWasTaken( xtension):
+	workUnit = FakeUnit()
+	workCommand = xtPlugin.xtDeferredCommand( workUnit, timeout=0.02)
+	workCommand.addData( first=1)
+	firstCall = workCommand._scheduled
+
+	# flush can't cancel a call the scheduler has already taken
+	workCommand.lock.acquire()
+	assert waitFor( lambda: firstCall.done)
+	workCommand.lock.release()
+	workCommand.flush()
+
+	workCommand.timeout = 1.0
+	workCommand.addData( second=2)
+	time.sleep( 0.1)
+	assert len( workUnit.sends) == 1
+	workCommand.flush()
+	assert len( workUnit.sends) == 2
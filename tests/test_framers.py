@@ -0,0 +1,176 @@
+import random
+import struct
+
+import pytest
+
+import xtension_plugin as xtPlugin
+
+
+def feedAll( workFramer, streamData, readSize):
+	workFrames = []
+	for readStart in range( 0, len( streamData), readSize):
+		workFramer.feed( streamData[ readStart:readStart + readSize])
+		workFrames += workFramer.frames()
+
+	return workFrames
+
+
+def nextFrames( workFramer):
+	workFrames = []
+	workFrame = workFramer.nextFrame()
+	while workFrame != None:
+		workFrames.append( workFrame)
+		workFrame = workFramer.nextFrame()
+
+	return workFrames
+
+
+#
+#	D E L I M I T E R
+#
+@pytest.mark.parametrize( 'readSize', [1, 2, 3, 7, 1000])
+def test_delimiterSplitAcrossReads( readSize):
+	workFramer = xtPlugin.XTDelimiterFramer( b'\r\n')
+	assert feedAll( workFramer, b'one\r\ntwo\r\n\r\nthree\r\nfour', readSize) == [b'one', b'two', b'three']
+	assert workFramer.pending() == 4
+
+
+def test_delimiterKeepAndEmpty():
+	workFramer = xtPlugin.XTDelimiterFramer( b'\r', keepDelimiter=True, skipEmpty=False)
+	workFramer.feed( b'a\r\rb\r')
+	assert workFramer.frames() == [b'a\r', b'\r', b'b\r']
+
+
+def test_delimiterNextFrameMatchesFrames():
+	streamData = b'ab\ncd\n\nef\ng'
+	workFramer = xtPlugin.XTDelimiterFramer( b'\n')
+	workFramer.feed( streamData)
+	assert nextFrames( workFramer) == [b'ab', b'cd', b'ef']
+
+	workFramer = xtPlugin.XTDelimiterFramer( b'\n')
+	workFramer.feed( streamData)
+	assert workFramer.frames() == [b'ab', b'cd', b'ef']
+
+
+def test_delimiterDiscardsOversizedFrame( xtension):
+	workFramer = xtPlugin.XTDelimiterFramer( b'\r', maxFrameSize=8)
+	workFramer.feed( b'0123456789')
+	assert workFramer.frames() == []
+	assert workFramer.discarded == 10
+
+	workFramer.feed( b'ok\r')
+	assert workFramer.frames() == [b'ok']
+
+
+def test_delimiterCompacts():
+	workFramer = xtPlugin.XTDelimiterFramer( b'\r')
+	workFramer.kCompactSize = 16
+
+	for i in range( 100):
+		workFramer.feed( b'frame %d\r' % i)
+		assert workFramer.frames() == [b'frame %d' % i]
+
+	assert len( workFramer.buffer) < 32
+
+
+#
+#	F I X E D
+#
+@pytest.mark.parametrize( 'readSize', [1, 3, 4, 5, 100])
+def test_fixed( readSize):
+	workFramer = xtPlugin.XTFixedFramer( 4)
+	assert feedAll( workFramer, b'aaaabbbbccccdd', readSize) == [b'aaaa', b'bbbb', b'cccc']
+	assert workFramer.pending() == 2
+
+
+#
+#	L E N G T H   P R E F I X
+#
+@pytest.mark.parametrize( 'prefixSize,bigEndian', [(1, True), (2, True), (2, False), (4, True), (4, False)])
+def test_lengthPrefix( prefixSize, bigEndian):
+	prefixFormat = ('>' if bigEndian else '<') + {1:'B', 2:'H', 4:'I'}[ prefixSize]
+	workMessages = [b'x', b'hello', b'', b'y' * 200]
+	streamData = b''.join( struct.pack( prefixFormat, len( x)) + x for x in workMessages)
+
+	for readSize in (1, 2, 5, 1000):
+		workFramer = xtPlugin.XTLengthPrefixFramer( prefixSize, bigEndian=bigEndian)
+		assert feedAll( workFramer, streamData, readSize) == workMessages
+
+
+def test_lengthPrefixIncludesAndKeepsPrefix():
+	workFramer = xtPlugin.XTLengthPrefixFramer( 1, lengthIncludesPrefix=True, keepPrefix=True)
+	workFramer.feed( b'\x03ab\x02c')
+	assert workFramer.frames() == [b'\x03ab', b'\x02c']
+
+
+def test_lengthPrefixBadSizeResyncs( xtension):
+	workFramer = xtPlugin.XTLengthPrefixFramer( 2, maxFrameSize=10)
+	workFramer.feed( b'\xff\xff' + b'\x00\x02ok')
+	assert workFramer.frames() == [b'ok']
+	assert workFramer.discarded == 2
+
+
+def test_lengthPrefixRejectsSize():
+	with pytest.raises( ValueError):
+		xtPlugin.XTLengthPrefixFramer( 3)
+
+
+#
+#	R E G E X
+#
+def test_regex():
+	workFramer = xtPlugin.XTRegexFramer( br'\$[^*]*\*..')
+	assert feedAll( workFramer, b'junk$GP,1*AB$GP,2*C', 4) == [b'$GP,1*AB']
+	assert workFramer.discarded == 4
+
+	workFramer.feed( b'D')
+	assert workFramer.frames() == [b'$GP,2*CD']
+
+
+def test_regexRejectsEmptyMatch():
+	with pytest.raises( ValueError):
+		xtPlugin.XTRegexFramer( br'a*')
+
+
+#
+#	P A R S I N G
+#
+def test_parsingTerminatorOrLength():
+	workFramer = xtPlugin.XTParsingFramer( b'\r', 4)
+	workFramer.feed( b'ab\rcdefgh\r')
+	assert workFramer.frames() == [b'ab', b'cdef', b'gh']
+
+
+def test_parsingTerminatorAcrossLengthCut():
+	# the terminator starting inside the length has to be found however the reads split it
+	workFramer = xtPlugin.XTParsingFramer( b'\r\n', 4)
+	assert feedAll( workFramer, b'abc\r\nxyz\r\n', 4) == [b'abc', b'xyz']
+
+
+def test_parsingFlushCutsAtLength():
+	workFramer = xtPlugin.XTParsingFramer( b'END', 4)
+	workFramer.feed( b'abcdE')
+	assert workFramer.frames() == []
+	assert workFramer.flush() == b'abcd'
+	assert workFramer.flush() == b'E'
+	assert workFramer.flush() == None
+
+
+def test_parsingSameFramesForAnyReads():
+	workRandom = random.Random( 5)
+
+	for i in range( 2000):
+		terminator = workRandom.choice( [b'\r', b'\r\n', b'END'])
+		length = workRandom.randrange( 1, 9)
+		streamData = bytes( workRandom.choice( b'ab\r\nEND') for j in range( workRandom.randrange( 0, 40)))
+
+		wholeFramer = xtPlugin.XTParsingFramer( terminator, length)
+		wholeFramer.feed( streamData)
+		wholeFrames = wholeFramer.frames()
+
+		readSize = workRandom.randrange( 1, 6)
+		splitFramer = xtPlugin.XTParsingFramer( terminator, length)
+		splitFrames = feedAll( splitFramer, streamData, readSize)
+
+		assert splitFrames == wholeFrames, (terminator, length, streamData, readSize)
+		assert splitFramer.pending() == wholeFramer.pending()
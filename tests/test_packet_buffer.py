@@ -0,0 +1,109 @@
+import socket
+import struct
+
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+def packetK( body):
+	return b'K' + struct.pack( 'IB', len( body) + 6, 128) + body
+
+
+def packetJ( body):
+	return b'J' + struct.pack( 'H', len( body) + 3) + body
+
+
+def putData( packetBuffer, theData):
+	# the same as a read that returned theData, as many reads as it takes
+	while theData:
+		workView = packetBuffer.getReceiveBuffer()
+		count = min( len( workView), len( theData))
+		workView[ :count] = theData[ :count]
+		workView.release()
+		packetBuffer.received( count)
+		theData = theData[ count:]
+
+
+def allPackets( packetBuffer):
+	workPackets = []
+	workPacket = packetBuffer.nextPacket()
+	while workPacket != None:
+		workPackets.append( workPacket.tobytes())
+		workPacket.release()
+		workPacket = packetBuffer.nextPacket()
+
+	return workPackets
+
+
+def test_packetsSplitAcrossReads():
+	streamData = packetK( b'one') + packetJ( b'two') + packetK( b'three')
+
+	for readSize in (1, 2, 4, 5, 7, 100):
+		packetBuffer = xtPlugin.XTPacketBuffer( 16)
+		workPackets = []
+
+		for readStart in range( 0, len( streamData), readSize):
+			putData( packetBuffer, streamData[ readStart:readStart + readSize])
+			workPackets += allPackets( packetBuffer)
+
+		assert workPackets == [packetK( b'one'), packetJ( b'two'), packetK( b'three')]
+
+
+def test_garbageIsSkipped():
+	packetBuffer = xtPlugin.XTPacketBuffer()
+	putData( packetBuffer, b'xyz' + packetK( b'ok'))
+	assert allPackets( packetBuffer) == [packetK( b'ok')]
+
+
+def test_largePacketAsksForTheRest():
+	packetBuffer = xtPlugin.XTPacketBuffer( 1024, 1 << 20)
+	largePacket = packetK( b'x' * 400000)
+
+	putData( packetBuffer, largePacket[ :1024])
+	assert packetBuffer.nextPacket() == None
+	assert packetBuffer.pendingSize == len( largePacket)
+
+	workView = packetBuffer.getReceiveBuffer()
+	assert len( workView) == len( largePacket) - 1024
+	workView.release()
+
+	putData( packetBuffer, largePacket[ 1024:])
+	assert allPackets( packetBuffer) == [largePacket]
+
+	# the grown buffer is let go of once it's empty
+	packetBuffer.getReceiveBuffer().release()
+	assert len( packetBuffer.buffer) == packetBuffer.initialSize
+
+
+def test_receiveFromSocket():
+	readSock, writeSock = socket.socketpair()
+
+	try:
+		packetBuffer = xtPlugin.XTPacketBuffer()
+		writeSock.sendall( packetK( b'abc') + packetK( b'de'))
+
+		received = 0
+		while received < 2 * 6 + 5:
+			received += packetBuffer.receive( readSock)
+
+		assert allPackets( packetBuffer) == [packetK( b'abc'), packetK( b'de')]
+
+		writeSock.close()
+		assert packetBuffer.receive( readSock) == 0
+	finally:
+		readSock.close()
+
+
+def test_packetParses( xtension):
+	workTemplate = xtPlugin.XTCommand.template( xtKeyUniqueId, xtKeyValue, xtKeyCommand=xtCommandSetValue)
+	packetBuffer = xtPlugin.XTPacketBuffer()
+	putData( packetBuffer, workTemplate.encode( 'abc', 55))
+
+	workPacket = packetBuffer.nextPacket()
+	workCommand = xtPlugin.XTCommand()
+	workCommand._parse( workPacket)
+	workPacket.release()
+
+	assert workCommand.get( xtKeyCommand) == xtCommandSetValue
+	assert workCommand.get( xtKeyUniqueId) == 'abc'
+	assert workCommand.get( xtKeyValue) == '55'
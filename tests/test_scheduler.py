@@ -0,0 +1,221 @@
+import threading
+import time
+
+import pytest
+
+import xtension_plugin as xtPlugin
+
+
+@pytest.fixture
+def scheduler( xtension):
+	workScheduler = xtPlugin.XTScheduler( name='Test Scheduler Thread')
+	yield workScheduler
+	workScheduler.stop( 2.0)
+
+
+def waitFor( condition, timeout=2.0):
+	endTime = time.time() + timeout
+	while not condition():
+		if time.time() > endTime:
+			return False
+		time.sleep( 0.005)
+
+	return True
+
+
+def test_callsRunInOrder( scheduler):
+	workCalls = []
+	allDone = threading.Event()
+
+	scheduler.callLater( 0.06, workCalls.append, 3)
+	scheduler.callLater( 0.02, workCalls.append, 1)
+	scheduler.callLater( 0.04, workCalls.append, 2)
+	scheduler.callLater( 0.08, allDone.set)
+
+	assert allDone.wait( 2.0)
+	assert workCalls == [1, 2, 3]
+	assert scheduler.getMetrics()[ 'callsRun'] == 4
+
+
+def test_cancel( scheduler):
+	workCalls = []
+	allDone = threading.Event()
+
+	workCall = scheduler.callLater( 0.02, workCalls.append, 'cancelled')
+	scheduler.cancel( workCall)
+	scheduler.callLater( 0.04, allDone.set)
+
+	assert allDone.wait( 2.0)
+	assert workCalls == []
+	assert not workCall.isPending()
+
+
+def test_rescheduleLaterAndEarlier( scheduler):
+	workTimes = {}
+	startTime = time.time()
+
+	laterCall = scheduler.callLater( 0.02, lambda: workTimes.setdefault( 'later', time.time() - startTime))
+	laterCall = scheduler.reschedule( laterCall, 0.15)
+
+	earlierCall = scheduler.callLater( 1.0, lambda: workTimes.setdefault( 'earlier', time.time() - startTime))
+	earlierCall = scheduler.reschedule( earlierCall, 0.05)
+
+	assert waitFor( lambda: len( workTimes) == 2)
+	assert workTimes[ 'earlier'] < 0.5
+	assert workTimes[ 'later'] >= 0.14
+	assert scheduler.getMetrics()[ 'pending'] == 0
+
+
+def test_rescheduleAfterRunSchedulesAgain( scheduler):
+	workCalls = []
+
+	workCall = scheduler.callLater( 0.01, workCalls.append, 'x')
+	assert waitFor( lambda: len( workCalls) == 1)
+
+	scheduler.reschedule( workCall, 0.01)
+	assert waitFor( lambda: len( workCalls) == 2)
+
+
+def test_errorIsLoggedAndThreadKeepsGoing( scheduler, xtension):
+	allDone = threading.Event()
+
+	def badCall():
+		raise ValueError( 'scheduled call failed')
+
+	scheduler.callLater( 0.01, badCall)
+	scheduler.callLater( 0.02, allDone.set)
+
+	assert allDone.wait( 2.0)
+	assert any( 'scheduled call failed' in x for x in xtension.logLines)
+
+
+def test_stopDropsPending( xtension):
+	workScheduler = xtPlugin.XTScheduler( name='Test Scheduler Thread')
+	workCalls = []
+
+	workCall = workScheduler.callLater( 0.05, workCalls.append, 'dropped')
+	workScheduler.stop( 2.0)
+	time.sleep( 0.1)
+
+	assert workCalls == []
+	assert workCall.cancelled
+	assert not workScheduler.thread.is_alive()
+
+	# and nothing can be scheduled after
+	assert workScheduler.callLater( 0.01, workCalls.append, 'late').cancelled
+
+
+def test_callInWorkerKeepsTheSchedulerFree( scheduler):
+	releaseSlow = threading.Event()
+	workCalls = []
+
+	scheduler.callLater( 0.01, scheduler.callInWorker, 'slow', releaseSlow.wait)
+	scheduler.callLater( 0.05, workCalls.append, 'on time')
+
+	assert waitFor( lambda: workCalls == ['on time'])
+	releaseSlow.set()
+
+
+def test_callInWorkerOneAtATimePerLane( scheduler):
+	running = [0]
+	maxRunning = [0]
+	finished = []
+	countLock = threading.Lock()
+
+	def laneCall():
+		with countLock:
+			running[0] += 1
+			maxRunning[0] = max( maxRunning[0], running[0])
+
+		time.sleep( 0.02)
+
+		with countLock:
+			running[0] -= 1
+			finished.append( 1)
+
+	for i in range( 5):
+		scheduler.callInWorker( 'one lane', laneCall)
+
+	assert waitFor( lambda: len( finished) == 5)
+	assert maxRunning[0] == 1
+
+
+#
+#	X T   T I M E R   and   X T   D O   L A T E R
+#
+def test_timerRepeatsAndStops( xtension):
+	workCounts = []
+
+	class CountingTimer( xtPlugin.XTTimer):
+		def action( self):
+			workCounts.append( threading.current_thread().name)
+			if len( workCounts) == 3:
+				self.stop()
+
+	workTimer = CountingTimer( 0.02)
+	workTimer.start()
+
+	assert waitFor( lambda: len( workCounts) == 3)
+	time.sleep( 0.1)
+	assert len( workCounts) == 3
+	assert not workTimer.isRunning
+	assert 'Scheduler Worker' in workCounts[0]
+
+
+def test_slowTimerDoesNotDelayOthers( xtension):
+	releaseSlow = threading.Event()
+	fastCounts = []
+
+	class SlowTimer( xtPlugin.XTTimer):
+		def action( self):
+			releaseSlow.wait( 2.0)
+
+	class FastTimer( xtPlugin.XTTimer):
+		def action( self):
+			fastCounts.append( 1)
+
+	slowTimer = SlowTimer( 0.01)
+	fastTimer = FastTimer( 0.01)
+	slowTimer.start()
+	fastTimer.start()
+
+	try:
+		assert waitFor( lambda: len( fastCounts) >= 10, 1.0)
+	finally:
+		slowTimer.stop()
+		fastTimer.stop()
+		releaseSlow.set()
+
+
+def test_runInlineTimer( xtension):
+	workThreads = []
+
+	class InlineTimer( xtPlugin.XTTimer):
+		runInline = True
+
+		def action( self):
+			workThreads.append( threading.current_thread().name)
+			self.stop()
+
+	InlineTimer( 0.01).start()
+
+	assert waitFor( lambda: len( workThreads) == 1)
+	assert workThreads[0] == 'XTension Scheduler Thread'
+
+
+def test_doLaterIsPushedBack( xtension):
+	workTimes = []
+
+	class WorkLater( xtPlugin.XTDoLater):
+		def action( self):
+			workTimes.append( time.time())
+
+	workLater = WorkLater()
+	startTime = time.time()
+	workLater.setTimeout( 0.05)
+	time.sleep( 0.03)
+	workLater.setTimeout( 0.1)
+
+	assert waitFor( lambda: len( workTimes) == 1)
+	assert workTimes[0] - startTime >= 0.12
+	assert not workLater.isPending()
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+import tty
+
+import pytest
+import serial
+
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+pytestmark = pytest.mark.skipif( not hasattr( os, 'openpty'), reason='needs a pty')
+
+
+#
+# a connection with no port of it's own reading from the slave end of a pty, the test writes
+# to the master end the way a serial device would
+#
+@pytest.fixture
+def ptyConnection( xtension):
+	master, slave = os.openpty()
+	tty.setraw( slave)
+
+	workConnection = xtPlugin.XTRemoteConnection( **{xtKeyPortName:xtPortNameNone, 'serialReadSize':4096})
+	workConnection.serialPort = serial.Serial( os.ttyname( slave), timeout=1)
+	workConnection.master = master
+
+	yield workConnection
+
+	workConnection.serialPort.close()
+	os.close( slave)
+
+	try:
+		os.close( master)
+	except OSError:
+		pass
+
+
+def sendInChunks( master, theData, chunkSize=4, chunkDelay=0.001):
+	def sendAll():
+		for chunkStart in range( 0, len( theData), chunkSize):
+			os.write( master, theData[ chunkStart:chunkStart + chunkSize])
+			time.sleep( chunkDelay)
+
+	workThread = threading.Thread( target=sendAll)
+	workThread.start()
+	return workThread
+
+
+def test_burstIsOneRead( ptyConnection):
+	testLine = b'T:21.5,H:45.2,P:1013.2,ID:abcdef012345'
+	workThread = sendInChunks( ptyConnection.master, testLine)
+
+	assert ptyConnection._readSerialBurst() == testLine
+	workThread.join()
+
+
+def test_burstEndsAtTheDelimiter( ptyConnection):
+	ptyConnection.setFramer( xtPlugin.XTDelimiterFramer( b'\r'))
+	ptyConnection.serialInterByteTimeout = 1.0
+
+	startTime = time.time()
+	os.write( ptyConnection.master, b'one line\r')
+	assert ptyConnection._readSerialBurst() == b'one line\r'
+	assert time.time() - startTime < 0.5
+
+
+def test_burstStopsAtReadSize( ptyConnection):
+	ptyConnection.serialReadSize = 8
+	os.write( ptyConnection.master, b'0123456789')
+	time.sleep( 0.05)
+
+	assert ptyConnection._readSerialBurst() == b'01234567'
+	assert ptyConnection._readSerialBurst() == b'89'
+
+
+def test_timeoutIsEmpty( ptyConnection):
+	ptyConnection.serialPort.timeout = 0.05
+	assert ptyConnection._readSerialBurst() == b''
+
+
+def test_portClosingIsDetected( ptyConnection):
+	os.close( ptyConnection.master)
+
+	with pytest.raises( serial.SerialException):
+		ptyConnection._readSerialBurst()
@@ -0,0 +1,61 @@
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+def makeUnitData( uniqueId):
+	workData = xtPlugin.xtData()
+	workData.set( xtUnitKeyName, 'unit %s' % uniqueId, suppressNotifications=True)
+	workData.set( xtUnitKeyUniqueId, uniqueId, suppressNotifications=True)
+	workData.set( xtUnitKeyAddress, uniqueId, suppressNotifications=True)
+	return workData
+
+
+def sentCommands( xtension, monkeypatch):
+	workPackets = []
+	monkeypatch.setattr( xtension, '_sendPacket', lambda rawPacket, priority=False: workPackets.append( bytes( rawPacket)))
+	return workPackets
+
+
+def test_templatesSendTheSameCommand( xtension, monkeypatch):
+	workPackets = sentCommands( xtension, monkeypatch)
+	workUnit = xtPlugin.XTUnit( makeUnitData( 'tmpl1'))
+
+	workUnit.setValue( 55, xtKeyDefaultLabel='level')
+	workCommand = xtPlugin.XTCommand( xtKeyCommand=xtCommandSetValue, xtKeyValue=55, xtKeyDefaultLabel='level')
+	workCommand.set( xtKeyUniqueId, 'tmpl1')
+	workCommand.set( xtKeyCommandTarget, xtTargetUnit)
+
+	sentCommand = xtPlugin.XTCommand()
+	sentCommand._parse( workPackets[0])
+	assert sentCommand.values == workCommand.values
+
+
+def test_overriddenSendCommandGetsEveryCommand( xtension, monkeypatch):
+	workPackets = sentCommands( xtension, monkeypatch)
+	workCalls = []
+
+	class LoggingUnit( xtPlugin.XTUnit):
+		def sendCommand( self, **kwds):
+			workCalls.append( kwds)
+			xtPlugin.XTUnit.sendCommand( self, **kwds)
+
+	workUnit = LoggingUnit( makeUnitData( 'tmpl2'))
+	workUnit.turnOn()
+	workUnit.turnOff( updateOnly=True)
+	workUnit.setValue( 12)
+	workUnit.sendNoOp()
+
+	assert [x[ xtKeyCommand] for x in workCalls] == [xtCommandOn, xtCommandOff, xtCommandSetValue, xtCommandNoOp]
+	assert workCalls[1][ xtKeyUpdateOnly] == xtTrue
+	assert workCalls[2][ xtKeyValue] == 12
+	assert len( workPackets) == 4
+
+
+def test_commandKeyCacheIsLimited( xtension, monkeypatch):
+	monkeypatch.setattr( xtPlugin, '_commandKeyCache', {})
+	monkeypatch.setattr( xtPlugin, 'kMaxCommandKeys', 5)
+
+	for i in range( 20):
+		assert xtPlugin._resolveCommandKey( 'k%d' % i) == ('k%d' % i + '    ')[:4]
+
+	assert len( xtPlugin._commandKeyCache) == 5
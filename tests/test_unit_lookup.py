@@ -0,0 +1,51 @@
+import xtension_plugin as xtPlugin
+from xtension_constants import *
+
+
+class FakeUnit( object):
+	pass
+
+
+def freshIndexes( xtension, monkeypatch):
+	monkeypatch.setattr( xtension, 'unitIndexByAddress', {})
+	monkeypatch.setattr( xtension, 'unitIndexByKey', {})
+	monkeypatch.setattr( xtension, '_unitLookupMisses', {})
+
+
+def test_keyIndex( xtension, monkeypatch):
+	freshIndexes( xtension, monkeypatch)
+	workUnit = FakeUnit()
+	xtension.unitIndexByAddress[ 'ZWABC'] = workUnit
+	xtension.unitIndexByKey[ ('ZW', 'ABC')] = workUnit
+
+	assert xtension.getUnitFromAddress( 'ZW', 'abc') is workUnit
+	assert xtension.getUnitFromAddress( 'ZWA', 'BC') == None
+	assert xtension.getUnitLookupMisses()[1] == {('ZWA', 'BC'):1}
+
+
+def test_entriesAddedByAddressOnly( xtension, monkeypatch):
+	freshIndexes( xtension, monkeypatch)
+	workUnit = FakeUnit()
+	xtension.unitIndexByAddress[ 'ZWABC'] = workUnit
+
+	assert xtension.getUnitFromAddress( 'ZW', 'abc') is workUnit
+	assert xtension.getUnitFromAddress( 'ZW', 'xyz') == None
+
+
+def test_removedNameIsNotIndexed( xtension, monkeypatch):
+	monkeypatch.setattr( xtension, 'unitIndexByName', {})
+	workData = xtPlugin.xtData()
+	workData.set( xtUnitKeyName, 'porch light', suppressNotifications=True)
+	workData.set( xtUnitKeyUniqueId, 'name1', suppressNotifications=True)
+	workUnit = xtPlugin.XTUnit( workData)
+	assert xtension.unitIndexByName == {'porch light':workUnit}
+
+	removeData = xtPlugin.xtData()
+	removeData.values[ xtUnitKeyName] = b'_del_'
+	workData.merge( removeData)
+
+	assert workUnit.name == None
+	assert xtension.unitIndexByName == {}
+
+	workData.set( xtUnitKeyName, 'renamed')
+	assert xtension.unitIndexByName == {'renamed':workUnit}
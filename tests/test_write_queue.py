@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+import xtension_plugin as xtPlugin
+
+
+#
+# stands in for a non blocking socket that has room for roomLeft more bytes
+#
+class FakeSocket( object):
+
+	def __init__( self, roomLeft=None):
+		self.roomLeft = roomLeft
+		self.sends = []
+		self.failWith = None
+
+	def send( self, theData, toAddress):
+		if self.failWith != None:
+			raise self.failWith
+
+		theData = bytes( theData)
+
+		if self.roomLeft != None:
+			theData = theData[ :self.roomLeft]
+			self.roomLeft -= len( theData)
+
+		self.sends.append( (theData, toAddress))
+		return len( theData)
+
+	def received( self):
+		return b''.join( x[0] for x in self.sends)
+
+
+def makeQueue( fakeSocket, **kwds):
+	# with onWakeup there is no thread, sendAvailable is called by the test like the IO loop would
+	return xtPlugin.XTWriteQueue( fakeSocket.send, onWakeup=lambda: None, **kwds)
+
+
+def test_coalescesWrites( xtension):
+	fakeSocket = FakeSocket()
+	writeQueue = makeQueue( fakeSocket)
+
+	for i in range( 5):
+		writeQueue.put( b'%d,' % i)
+
+	assert writeQueue.sendAvailable() == False
+	assert fakeSocket.sends == [(b'0,1,2,3,4,', None)]
+	assert writeQueue.getMetrics()[ 'packets'] == 5
+	assert writeQueue.getMetrics()[ 'sends'] == 1
+
+
+def test_coalesceLimitAndDatagrams( xtension):
+	fakeSocket = FakeSocket()
+	writeQueue = makeQueue( fakeSocket, maxCoalesce=4)
+
+	writeQueue.put( b'ab')
+	writeQueue.put( b'cd')
+	writeQueue.put( b'ef')
+	writeQueue.put( b'gram', ('192.0.2.1', 1000))
+	writeQueue.put( b'gram', ('192.0.2.1', 1000))
+	writeQueue.sendAvailable()
+
+	assert fakeSocket.sends == [(b'abcd', None), (b'ef', None), (b'gram', ('192.0.2.1', 1000)), (b'gram', ('192.0.2.1', 1000))]
+
+
+def test_noCoalesce( xtension):
+	fakeSocket = FakeSocket()
+	writeQueue = makeQueue( fakeSocket, coalesce=False)
+
+	writeQueue.put( b'a')
+	writeQueue.put( b'b')
+	writeQueue.sendAvailable()
+
+	assert fakeSocket.sends == [(b'a', None), (b'b', None)]
+
+
+def test_partialSendsResume( xtension):
+	fakeSocket = FakeSocket( roomLeft=3)
+	writeQueue = makeQueue( fakeSocket)
+
+	writeQueue.put( b'hello ')
+	writeQueue.put( b'world')
+
+	assert writeQueue.sendAvailable() == True
+	assert writeQueue.getMetrics()[ 'bytesPending'] == 8
+
+	fakeSocket.roomLeft = None
+	assert writeQueue.sendAvailable() == False
+	assert fakeSocket.received() == b'hello world'
+	assert writeQueue.getMetrics()[ 'bytesPending'] == 0
+	assert not writeQueue.hasPending()
+
+
+def test_fullAndDrained( xtension):
+	workEvents = []
+	fakeSocket = FakeSocket( roomLeft=0)
+	writeQueue = makeQueue( fakeSocket, highWater=10, onFull=lambda: workEvents.append( 'full'), onDrained=lambda: workEvents.append( 'drained'))
+
+	writeQueue.put( b'12345')
+	assert not writeQueue.isFull()
+
+	writeQueue.put( b'67890')
+	assert writeQueue.isFull()
+	assert workEvents == ['full']
+
+	# nothing is thrown away for being over
+	writeQueue.put( b'abc')
+	assert writeQueue.getMetrics()[ 'bytesPending'] == 13
+
+	# still above lowWater, half of highWater
+	fakeSocket.roomLeft = 7
+	writeQueue.sendAvailable()
+	assert workEvents == ['full']
+
+	fakeSocket.roomLeft = 1
+	writeQueue.sendAvailable()
+	assert workEvents == ['full', 'drained']
+	assert not writeQueue.isFull()
+	assert writeQueue.getMetrics()[ 'fullCount'] == 1
+
+
+def test_errorClearsQueue( xtension):
+	workErrors = []
+	fakeSocket = FakeSocket()
+	fakeSocket.failWith = OSError( 'broken pipe')
+	writeQueue = makeQueue( fakeSocket, onError=workErrors.append)
+
+	writeQueue.put( b'abc')
+	writeQueue.put( b'de')
+
+	assert writeQueue.sendAvailable() == False
+	assert [str( x) for x in workErrors] == ['broken pipe']
+	assert not writeQueue.hasPending()
+	assert writeQueue.getMetrics()[ 'bytesDropped'] == 5
+
+
+def test_stopRefusesPuts( xtension):
+	writeQueue = makeQueue( FakeSocket())
+	writeQueue.put( b'abc')
+	writeQueue.stop()
+
+	assert writeQueue.put( b'more') == False
+	assert writeQueue.getMetrics()[ 'bytesDropped'] == 3
+
+
+def test_threadSendsAndFlushes( xtension):
+	fakeSocket = FakeSocket()
+	writeQueue = xtPlugin.XTWriteQueue( fakeSocket.send, name='Test Write Thread')
+
+	for i in range( 100):
+		writeQueue.put( b'%d\r' % i)
+
+	assert writeQueue.flush( 2.0)
+	assert fakeSocket.received() == b''.join( b'%d\r' % i for i in range( 100))
+
+	workThread = writeQueue.thread
+	writeQueue.stop()
+	workThread.join( 2.0)
+	assert not workThread.is_alive()
+
+
+def test_waitForRoomTimesOut( xtension):
+	writeQueue = makeQueue( FakeSocket( roomLeft=0), highWater=4)
+	writeQueue.put( b'12345')
+
+	startTime = time.time()
+	assert writeQueue.waitForRoom( 0.05) == False
+	assert time.time() - startTime >= 0.04
+
+
+def test_waitForRoomWakesWhenSent( xtension):
+	fakeSocket = FakeSocket( roomLeft=0)
+	writeQueue = makeQueue( fakeSocket, highWater=4)
+	writeQueue.put( b'12345')
+
+	def sendLater():
+		time.sleep( 0.05)
+		fakeSocket.roomLeft = None
+		writeQueue.sendAvailable()
+
+	threading.Thread( target=sendLater).start()
+	assert writeQueue.waitForRoom( 2.0) == True
+
+
+def test_drainLatency( xtension):
+	writeQueue = makeQueue( FakeSocket())
+	writeQueue.put( b'abc')
+	time.sleep( 0.02)
+	writeQueue.sendAvailable()
+
+	workMetrics = writeQueue.getMetrics()
+	assert workMetrics[ 'maxDrainLatency'] >= 0.015
+	assert workMetrics[ 'averageDrainLatency'] == pytest.approx( workMetrics[ 'maxDrainLatency'])
@@ -0,0 +1,118 @@
+import xtension_plugin as xtPlugin
+
+
+def makeData( **values):
+	workData = xtPlugin.xtData()
+	for key in values:
+		workData.set( key, values[ key], suppressNotifications=True)
+
+	return workData
+
+
+def test_mergeSubscribersSeeTheOldValue( xtension):
+	workData = makeData( first='a', second='b')
+	seenValues = []
+
+	def valueChanged( theKey, theValue, theTag, theData):
+		seenValues.append( (theKey, theValue, theData.get( theKey)))
+
+	workData.subscribe( ['first', 'second'], valueChanged)
+	workData.merge( makeData( first='A', second='B'))
+
+	assert sorted( seenValues) == [('first', 'A', 'a'), ('second', 'B', 'b')]
+	assert workData.get( 'first') == 'A'
+	assert workData.get( 'second') == 'B'
+
+
+def test_mergeAllSubscribersSeeTheOldValue( xtension):
+	workData = makeData( first='a')
+	seenValues = []
+
+	workData.subscribeToAll( lambda theKey, theValue, theTag, theData: seenValues.append( (theKey, theValue, theData.get( theKey))))
+	workData.merge( makeData( first='A', added='new'))
+
+	assert sorted( seenValues) == [('added', 'new', None), ('first', 'A', 'a')]
+
+
+def test_mergeRemovedKey( xtension):
+	workData = makeData( first='a')
+	seenValues = []
+
+	workData.subscribe( 'first', lambda theKey, theValue, theTag, theData: seenValues.append( (theValue, theData.get( theKey))))
+
+	removeData = xtPlugin.xtData()
+	removeData.values[ 'first'] = b'_del_'
+	workData.merge( removeData)
+
+	assert seenValues == [(None, 'a')]
+	assert workData.get( 'first') == None
+
+
+#
+#	C O N T A I N E R   I N D E X E S
+#
+def makeContainer( name):
+	workContainer = xtPlugin.xtData()
+	workContainer.name = name
+	return workContainer
+
+
+def test_containerRemoveThenInsert( xtension):
+	workData = xtPlugin.xtData()
+	first = makeContainer( 'unit')
+	second = makeContainer( 'unit')
+	workData.insertContainer( first)
+	workData.insertContainer( second)
+	assert workData.getContainerCount( 'unit') == 2
+
+	assert workData.removeContainer( first)
+	assert not workData.removeContainer( first)
+	third = makeContainer( 'other')
+	workData.insertContainer( third)
+
+	assert workData.getAllContainers( 'unit') == [second]
+	assert workData.getContainer( 'other', 1) is third
+	assert workData.containerByUUID( first.uuid) == None
+	assert workData.containerByUUID( third.uuid) is third
+
+
+def test_containerRename( xtension):
+	workData = xtPlugin.xtData()
+	workContainer = makeContainer( 'unit')
+	workData.insertContainer( workContainer)
+	assert workData.getContainer( 'unit', 1) is workContainer
+
+	workContainer.name = 'renamed'
+	assert workData.getContainer( 'unit', 1) == None
+	assert workData.getContainer( 'renamed', 1) is workContainer
+
+
+def test_containerReplacedDirectly( xtension):
+	workData = xtPlugin.xtData()
+	workData.insertContainer( makeContainer( 'unit'))
+	assert workData.getContainerCount( 'unit') == 1
+
+	workData.containers[0] = makeContainer( 'other')
+	workData.containersChanged()
+	assert workData.getContainerCount( 'unit') == 0
+	assert workData.getContainerCount( 'other') == 1
+
+
+#
+#	P A R S E
+#
+def test_parseFromAView( xtension):
+	workData = makeData( first='a', number=5)
+	workData.insertContainer( makeData( inner='b'))
+	workData.containers[0].name = 'child'
+	rawData = workData.save()
+
+	workPacket = bytearray( b'head') + rawData
+	viewData = xtPlugin.xtData()
+	assert viewData._parse( memoryview( workPacket)[ 4:])
+
+	# the values were copied out, reusing the packet doesn't change them
+	workPacket[:] = bytes( len( workPacket))
+	assert viewData.get( 'first') == 'a'
+	assert viewData.getContainer( 'child', 1).get( 'inner') == 'b'
+	assert viewData.save() == rawData
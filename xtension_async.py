@@ -0,0 +1,1219 @@
+# -*- coding: utf-8 -*-
+#
+#		XTENSION PLUGIN ASYNCIO SUPPORT   http://MacHomeAutomation.com
+#
+#	an asyncio version of the connection to XTension for plugins that would rather run everything
+#	on one event loop than use a thread for each device. This needs python 3.7 or later and so
+#	is kept out of xtension_plugin.py which still has to load in python 2.7. Import it instead of
+#	xtension_plugin, everything in that is available from here as well:
+#
+#		from xtension_plugin.xtension_constants import *
+#		from xtension_plugin.xtension_async import *
+#
+#		XTension = cAsyncXTension()
+#
+#		async def main():
+#			await XTension.startupAsync()
+#			await XTension.waitForShutdown()
+#
+#		asyncio.run( main())
+#
+#	the units, scripts, xtData and everything else are the same objects as with cXTension and
+#	command and script handlers are added the same way. The difference is that a handler can be
+#	a coroutine, "async def", which is awaited before the next command from XTension is handled.
+#	XTDoLater, XTTimer and the XTRemoteConnection threads still work, sendCommand can be called
+#	from any thread.
+#
+# version 1 10/18/2026
+#	initial version, cAsyncXTension
+#	added AsyncXTRemoteConnection, the same connections as XTRemoteConnection on asyncio streams
+#	with await conn.readframe() and await conn.write( data), and XTAsyncSerial for the serial port
+#
+
+import asyncio
+import inspect
+import os
+import socket
+import threading
+from collections import deque
+
+try:
+	from xtension_plugin.xtension_plugin import *
+	from xtension_plugin import xtension_plugin as _xtPlugin
+except ImportError:
+	from xtension_plugin import *
+	import xtension_plugin as _xtPlugin
+
+_monotonic = _xtPlugin._monotonic
+
+
+#
+#
+#	X T   H O S T   P R O T O C O L
+#
+#
+# the pipe to XTension as an asyncio BufferedProtocol. asyncio reads straight into the
+# XTPacketBuffer the same way threadedRead does with recv_into. Pings are answered
+# here as soon as they are read just like the receive thread. Everything else is queued for
+# cAsyncXTension._commandRunner which handles them one at a time in order.
+#
+
+class XTHostProtocol( asyncio.BufferedProtocol):
+
+	def __init__( self, owner):
+		self.owner = owner
+		self.transport = None
+
+	def connection_made( self, transport):
+		self.transport = transport
+
+	def get_buffer( self, sizeHint):
+		return self.owner._packetBuffer.getReceiveBuffer()
+
+	def buffer_updated( self, count):
+		owner = self.owner
+		packetBuffer = owner._packetBuffer
+		packetBuffer.received( count)
+
+		while True:
+			thisPacket = packetBuffer.nextPacket()
+			if thisPacket == None:
+				break
+
+			workCommand = XTParsedCommand()
+			workCommand._parse( thisPacket)
+			thisPacket.release()
+
+			if not workCommand.isValid:
+				owner.writeLog( "Command from XTension failed to parse", xtLogRed)
+				continue
+
+			thisCommandCode = workCommand.get( xtKeyCommand, "(none)")
+
+			if thisCommandCode in owner.kControlCommands:
+				owner._handleCommand( workCommand)
+				owner._sendAck( workCommand, True)
+			else:
+				owner._queueCommand( workCommand)
+
+	def eof_received( self):
+		# returning nothing closes the transport and connection_lost is called
+		return False
+
+	def connection_lost( self, exc):
+		self.owner._hostConnectionLost( exc)
+
+	def pause_writing( self):
+		self.owner._pauseWriting()
+
+	def resume_writing( self):
+		self.owner._resumeWriting()
+
+
+
+#
+#
+#	C   A S Y N C   X T E N S I O N
+#
+#
+# use this instead of cXTension and call "await XTension.startupAsync()" from inside the event
+# loop instead of XTension.startup(). It returns once the settings and units have been received.
+#
+# sendCommand, and so writeLog and the rest, never blocks. The packets are written to the
+# transport and go out as the socket has room. It returns an awaitable that is done once the
+# transport's buffer is back under its limit, so a coroutine sending a lot can use
+# "await XTension.sendCommand( ...)" to slow down, anything else can just ignore it.
+#
+# "async for theCommand in XTension.commands( xtCommandOn, xtCommandOff):" gets every command
+# received, or only the ones with the command codes given, after the handlers have run.
+#
+# the receive side stops reading from XTension when more than dispatchQueueLimit commands are
+# waiting to be handled and starts again when that is down to half. dispatchWorkers and
+# useWriterThread are not used.
+#
+
+class cAsyncXTension( cXTension):
+
+	def __init__( self):
+		cXTension.__init__( self)
+
+		self._loop = None
+		self._loopThreadId = None
+		self._transport = None
+		self._protocol = None
+
+		self._commandQueue = None
+		self._commandTask = None
+		self._readingPaused = False
+
+		# the coroutines returned by the handlers of the command being handled now, see _handlerReturned
+		self._awaiting = None
+
+		# asyncio.Queues of the commands() iterators and the command codes they want, None for all
+		self._commandListeners = []
+
+		self._startedEvent = None
+		self._shutdownEvent = None
+
+		self._writeDone = None
+		self._writePaused = None
+
+	#
+	#	S T A R T U P   A S Y N C
+	#
+	# connects to XTension and waits up to timeout seconds for our settings and units, forever
+	# if it's None, startupTimeout if it's not passed. Returns True if they were received
+	#
+	async def startupAsync( self, timeout=None):
+		self._startupBegan = _monotonic()
+
+		if timeout == None:
+			timeout = self.startupTimeout
+
+		self._loop = asyncio.get_running_loop()
+		self._loopThreadId = threading.get_ident()
+
+		self._commandQueue = asyncio.Queue()
+		self._startedEvent = asyncio.Event()
+		self._shutdownEvent = asyncio.Event()
+
+		self._writeDone = self._loop.create_future()
+		self._writeDone.set_result( None)
+
+		# get our XTension address, port and ID from the command line
+		self.XTensionAddress = sys.argv[1]
+		self.XTensionPort = int( sys.argv[2])
+		self.XTensionConnectionId = sys.argv[3]
+
+		self._packetBuffer = XTPacketBuffer( self.receiveSize, self.maxReceiveSize)
+
+		self._transport, self._protocol = await self._loop.create_connection( lambda: XTHostProtocol( self), self.XTensionAddress, self.XTensionPort)
+		self.sock = self._transport.get_extra_info( 'socket')
+		self._startupMark( 'connect')
+
+		# connect us to our interface instance inside XTension
+		self._rawWrite( self.helloMessage + ":" + self.XTensionConnectionId + "\r")
+		self._startupMark( 'hello')
+
+		self.ready = True
+
+		if self.useWarmStart and self._loadWarmStart():
+			self._startedEvent.set()
+
+		self._commandTask = self._loop.create_task( self._commandRunner())
+
+		# ask for our settings and our units
+		self.getMySettings()
+		self.getMyData()
+
+		try:
+			await asyncio.wait_for( self._startedEvent.wait(), timeout)
+		except asyncio.TimeoutError:
+			self.writeLog( "settings and units not received from XTension after %s seconds" % timeout, xtLogRed)
+			return False
+
+		return True
+
+	#
+	#	W A I T   F O R   S H U T D O W N
+	#
+	# returns when XTension has shut us down, or the connection to it has been lost
+	#
+	async def waitForShutdown( self):
+		await self._shutdownEvent.wait()
+
+	#
+	#	C O M M A N D S
+	#
+	# an async iterator of the commands received from XTension, only the ones with the command
+	# codes passed if any are. The iterator ends when we are shut down
+	#
+	def commands( self, *commandCodes):
+		return XTCommandIterator( self, frozenset( commandCodes) if commandCodes else None)
+
+	#
+	#	S E N D   C O M M A N D
+	#
+	def sendCommand( self, theCommand, priority=False):
+		cXTension.sendCommand( self, theCommand, priority)
+
+		if self._writePaused != None:
+			return self._writePaused
+
+		return self._writeDone
+
+	#
+	#	D O   S H U T D O W N
+	#
+	# the same as cXTension.doShutdown except that it returns, the shutdown happens in the loop
+	# and waitForShutdown returns once it's done
+	#
+	def doShutdown( self):
+		shutdownCommand = XTCommand( xtKeyCommand = xtCommandShutdown)
+		self._callInLoop( self._queueCommand, shutdownCommand)
+
+	#
+	# sleeping for a second in the loop would stop everything, closing the transport sends
+	# anything that is waiting before it closes the socket
+	#
+	def event_shutdown( self, theCommand):
+		self.writeLog( "shutting down...")
+		self.isShuttingDown = True
+
+	#
+	# packets are written to the transport in the loop, from other threads they are passed
+	# to the loop to write
+	#
+	def _sendPacket( self, rawPacket, priority=False):
+		if self._transport == None or self._transport.is_closing():
+			return
+
+		if threading.get_ident() == self._loopThreadId:
+			self._transport.write( rawPacket)
+		else:
+			self._loop.call_soon_threadsafe( self._writeFromThread, rawPacket)
+
+	def _writeFromThread( self, rawPacket):
+		if self._transport != None and not self._transport.is_closing():
+			self._transport.write( rawPacket)
+
+	def _rawWrite( self, msg):
+		if type( msg) != bytes:
+			msg = msg.encode()
+
+		self._sendPacket( msg)
+
+	def _callInLoop( self, callback, *args):
+		if threading.get_ident() == self._loopThreadId:
+			callback( *args)
+		else:
+			self._loop.call_soon_threadsafe( callback, *args)
+
+	def _pauseWriting( self):
+		if self._writePaused == None:
+			self._writePaused = self._loop.create_future()
+
+	def _resumeWriting( self):
+		workFuture = self._writePaused
+		self._writePaused = None
+
+		if workFuture != None and not workFuture.done():
+			workFuture.set_result( None)
+
+	#
+	#	_ Q U E U E   C O M M A N D
+	#
+	def _queueCommand( self, workCommand):
+		self._commandQueue.put_nowait( workCommand)
+
+		if not self._readingPaused and self._commandQueue.qsize() >= self.dispatchQueueLimit:
+			self._readingPaused = True
+			self._transport.pause_reading()
+
+	#
+	#	_ C O M M A N D   R U N N E R
+	#
+	# handles the commands from XTension in the order they were received. The handlers are
+	# called by _handleCommand just like the receive thread does and then any that returned
+	# a coroutine are awaited before the command is acked
+	#
+	async def _commandRunner( self):
+		workQueue = self._commandQueue
+
+		while True:
+			workCommand = await workQueue.get()
+
+			if workCommand == None:
+				return
+
+			if self._readingPaused and workQueue.qsize() <= self.dispatchQueueLimit // 2:
+				self._readingPaused = False
+				self._transport.resume_reading()
+
+			thisCommandCode = workCommand.get( xtKeyCommand, "(none)")
+
+			await self._runHandlers( workCommand)
+
+			if thisCommandCode == xtCommandShutdown:
+				await self._finishShutdown()
+				return
+
+			self._sendAck( workCommand)
+
+			for (listenerQueue, commandCodes) in self._commandListeners:
+				if commandCodes == None or thisCommandCode in commandCodes:
+					listenerQueue.put_nowait( workCommand)
+
+			if not self._startedEvent.is_set() and self.gotSettings and self.gotUnits:
+				self._startedEvent.set()
+
+	async def _runHandlers( self, workCommand):
+		self._awaiting = []
+
+		try:
+			self._handleCommand( workCommand)
+		finally:
+			workAwaiting = self._awaiting
+			self._awaiting = None
+
+		for workAwaitable in workAwaiting:
+			try:
+				await workAwaitable
+			except Exception as e:
+				self.writeLog( "error handling (%s) from XTension: %s" % (workCommand.get( xtKeyCommand, "no command"), e), xtLogRed)
+				self.writeLog( traceback.format_exc(), xtLogRed)
+
+	#
+	#	_ H A N D L E R   R E T U R N E D
+	#
+	# a handler that is a coroutine is awaited by _runHandlers. One called some other way, like
+	# a ping handler or from another thread, is run as a task of its own
+	#
+	def _handlerReturned( self, workResult):
+		if not inspect.isawaitable( workResult):
+			return
+
+		if self._awaiting != None and threading.get_ident() == self._loopThreadId:
+			self._awaiting.append( workResult)
+		else:
+			asyncio.run_coroutine_threadsafe( self._awaitHandler( workResult), self._loop)
+
+	async def _awaitHandler( self, workAwaitable):
+		try:
+			await workAwaitable
+		except Exception as e:
+			self.writeLog( "error in handler: %s" % e, xtLogRed)
+			self.writeLog( traceback.format_exc(), xtLogRed)
+
+	#
+	# after the shutdown handlers have run, the same as the receive thread does
+	#
+	async def _finishShutdown( self):
+		self.isShuttingDown = True
+
+		self._stopIOLoop()
+		self._stopScheduler()
+
+		if self._transport != None:
+			self._transport.close()
+
+		self.ready = False
+		self._stopListeners()
+		self._shutdownEvent.set()
+
+	def _hostConnectionLost( self, exc):
+		if self.isShuttingDown:
+			print( "XTension pipe has been closed")
+		else:
+			print( "there was an error on the pipe to XTension\r")
+
+		self.ready = False
+
+		# the runner ends after anything already received has been handled and XTension will
+		# start us again
+		if self._commandQueue != None:
+			self._commandQueue.put_nowait( None)
+
+		self._stopListeners()
+		self._shutdownEvent.set()
+
+	def _stopListeners( self):
+		for (listenerQueue, commandCodes) in self._commandListeners:
+			listenerQueue.put_nowait( None)
+
+		self._commandListeners = []
+
+
+
+#
+#	X T   C O M M A N D   I T E R A T O R
+#
+# returned by cAsyncXTension.commands. It's added to the listeners when it's created so no
+# command is missed between creating it and the first time through the async for
+#
+
+class XTCommandIterator:
+
+	def __init__( self, owner, commandCodes):
+		self.owner = owner
+		self.queue = asyncio.Queue()
+		self.finished = owner._shutdownEvent != None and owner._shutdownEvent.is_set()
+
+		if not self.finished:
+			owner._commandListeners.append( (self.queue, commandCodes))
+
+	def __aiter__( self):
+		return self
+
+	async def __anext__( self):
+		if self.finished:
+			raise StopAsyncIteration
+
+		workCommand = await self.queue.get()
+
+		if workCommand == None:
+			self.finished = True
+			raise StopAsyncIteration
+
+		return workCommand
+
+	#
+	# stops getting commands, for leaving an async for early
+	#
+	def close( self):
+		self.finished = True
+		self.owner._commandListeners = [workListener for workListener in self.owner._commandListeners if workListener[0] is not self.queue]
+
+
+
+#
+#
+#	X T   A S Y N C   F R A M E S
+#
+#
+# the frames waiting for readframe, shared by AsyncXTRemoteConnection and the connections
+# accepted by its TCP server. The default frameReceived and dataAvailable put what arrived
+# here, subclass them instead to handle the data as it's read like with XTRemoteConnection.
+# When frameQueueLimit frames are waiting reading stops until readframe has taken half of them.
+#
+
+class XTAsyncFrames:
+
+	frameQueueLimit = 1000
+	
+	def _initFrames( self):
+		self._frames = deque()
+		self._frameWaiter = None
+		self._roomWaiter = None
+		self._framesEnded = False
+		
+	#
+	#	R E A D   F R A M E
+	#
+	# the next frame, or with no framer whatever data arrived in the next read. Returns None
+	# once the connection has been closed
+	#
+	async def readframe( self):
+		workEntry = await self.readframefrom()
+		
+		if workEntry == None:
+			return None
+			
+		return workEntry[0]
+		
+	#
+	#	R E A D   F R A M E   F R O M
+	#
+	# the next frame and the address it came from, for the UDP server where every datagram 
+	# can be from somewhere else
+	#
+	async def readframefrom( self):
+		while not self._frames:
+			if self._framesEnded:
+				return None
+				
+			self._frameWaiter = asyncio.get_running_loop().create_future()
+			
+			try:
+				await self._frameWaiter
+			finally:
+				self._frameWaiter = None
+				
+		workEntry = self._frames.popleft()
+		
+		if self._roomWaiter != None and len( self._frames) <= self.frameQueueLimit // 2:
+			self._wakeWaiter( self._roomWaiter)
+			
+		return workEntry
+		
+	def _queueFrame( self, frame, address=None):
+		self._frames.append( (frame, address))
+		
+		if self._frameWaiter != None:
+			self._wakeWaiter( self._frameWaiter)
+			
+	#
+	# called by the read loops after every read, waits for room if too many frames are waiting
+	#
+	async def _waitForRoom( self):
+		if len( self._frames) < self.frameQueueLimit:
+			return
+			
+		self._roomWaiter = asyncio.get_running_loop().create_future()
+		
+		try:
+			await self._roomWaiter
+		finally:
+			self._roomWaiter = None
+			
+	#
+	# readframe returns None once the frames already received have been read
+	#
+	def _endFrames( self):
+		self._framesEnded = True
+		
+		if self._frameWaiter != None:
+			self._wakeWaiter( self._frameWaiter)
+			
+		if self._roomWaiter != None:
+			self._wakeWaiter( self._roomWaiter)
+			
+	def _wakeWaiter( self, workFuture):
+		if not workFuture.done():
+			workFuture.set_result( None)
+
+
+
+#
+#
+#	X T   A S Y N C   S E R I A L
+#
+#
+# a serial.Serial port read and written without blocking by watching its file descriptor in 
+# the event loop. pyserial-asyncio does much the same thing but this way plugins don't need 
+# another package. Only for posix ports, which is all XTension has.
+#
+
+class XTAsyncSerial:
+
+	def __init__( self, serialPort):
+		self.serialPort = serialPort
+		self.fd = serialPort.fileno()
+		os.set_blocking( self.fd, False)
+		
+	#
+	#	R E A D
+	#
+	# up to readSize bytes, waiting until there is at least one. Returns b'' if the port has
+	# gone away. pyserial sets VMIN to 0 so a read with nothing waiting returns b'' rather than
+	# EAGAIN, it only means the port is gone if the loop said there was something to read
+	#
+	async def read( self, readSize):
+		waited = False
+		
+		while True:
+			try:
+				newData = os.read( self.fd, readSize)
+				
+				if newData or waited:
+					return newData
+					
+			except BlockingIOError:
+				pass
+				
+			await self._waitFor( False)
+			waited = True
+			
+	#
+	#	W R I T E
+	#
+	# returns once all of theData has been written to the port
+	#
+	async def write( self, theData):
+		workView = memoryview( theData)
+		
+		while len( workView) > 0:
+			try:
+				workView = workView[ os.write( self.fd, workView):]
+				continue
+			except BlockingIOError:
+				pass
+				
+			await self._waitFor( True)
+			
+	def close( self):
+		try:
+			self.serialPort.close()
+		except Exception:
+			pass
+			
+	async def _waitFor( self, writing):
+		workLoop = asyncio.get_running_loop()
+		workFuture = workLoop.create_future()
+		
+		def ready():
+			if not workFuture.done():
+				workFuture.set_result( None)
+				
+		if writing:
+			workLoop.add_writer( self.fd, ready)
+		else:
+			workLoop.add_reader( self.fd, ready)
+			
+		try:
+			await workFuture
+		finally:
+			if writing:
+				workLoop.remove_writer( self.fd)
+			else:
+				workLoop.remove_reader( self.fd)
+
+
+
+#
+#
+#	A S Y N C   X T   R E M O T E   C O N N E C T I O N
+#
+#
+# XTRemoteConnection on the asyncio event loop. It's created the same way, with the same kwds
+# overriding the settings from XTension, and then started from inside the loop:
+#
+#	theConnection = AsyncXTRemoteConnection( framer=XTDelimiterFramer( b'\r'))
+#	await theConnection.start()
+#
+#	while True:
+#		theFrame = await theConnection.readframe()
+#		if theFrame == None:
+#			break # closed
+#		await theConnection.write( b'ACK\r')
+#
+# the outgoing TCP connection and the serial port reconnect after an error the same as the
+# threads do, readframe just waits through it. The events, eventConnected, error, listening,
+# socketTimeout and so on, are all called as usual but in the loop so they must not block. Or
+# subclass frameReceived or dataAvailable to handle the data as it's read instead of with 
+# readframe, the framer, parsing params and self.buffer all work the same.
+#
+# write is a coroutine here, await it from the loop or from other threads use
+# asyncio.run_coroutine_threadsafe( theConnection.write( theData), theLoop). It returns once
+# the data has been passed to the socket or port so await write is all the flow control needed.
+# useIOLoop and useWriteQueue are not used.
+#
+# a TCP server calls makeTCPServerConnection for each connection which should return an 
+# AsyncXTTCPServerConnection, each has its own readframe and write.
+#
+
+class AsyncXTRemoteConnection( XTRemoteConnection, XTAsyncFrames):
+
+	readSize = 65536
+	
+	def __init__( self, **kwds):
+		kwds.pop( 'useIOLoop', None)
+		kwds.pop( 'useWriteQueue', None)
+		
+		self._loop = None
+		self._loopThreadId = None
+		self._task = None
+		self._server = None
+		self._writer = None
+		self._serial = None
+		self._udpTransport = None
+		self._timeoutHandle = None
+		self._initFrames()
+		
+		XTRemoteConnection.__init__( self, **kwds)
+		
+	#
+	# the connection is made in start rather than here
+	#
+	def _startConnection( self):
+		portName = self.getParm( xtKeyPortName, None)
+		
+		if portName == None or portName == xtPortNameNone:
+			self.connectionMethod = xtPortNameNone
+		elif portName == xtPortNameOutgoingTCP or portName == xtPortNameListen:
+			self.connectionMethod = portName
+			self.listenType = self.getParm( xtKeyListenType, xtKeyListenTypeTCP)
+		else:
+			self.connectionMethod = 'serial'
+			
+	#
+	#	S T A R T
+	#
+	# opens the connection or starts the server. The outgoing TCP connection and the serial 
+	# port are made by a task that keeps reconnecting until close is called. Returns False if 
+	# there was nothing to start or a server could not be started
+	#
+	async def start( self):
+		self._loop = asyncio.get_running_loop()
+		self._loopThreadId = threading.get_ident()
+		self.closed = False
+		self._framesEnded = False
+		
+		workLog = _xtPlugin.XTension
+		
+		if self.connectionMethod == xtPortNameNone:
+			workLog.debugLog( "no port specified")
+			return False
+			
+		elif self.connectionMethod == xtPortNameOutgoingTCP:
+			workLog.debugLog( "opening outgoing TCP connection")
+			self._task = self._loop.create_task( self._runTCP())
+			
+		elif self.connectionMethod == xtPortNameListen:
+			if self.listenType == xtKeyListenTypeTCP:
+				workLog.debugLog( "starting TCP listening server")
+				
+				if not await self._startTCPServer():
+					return False
+					
+			elif self.listenType == xtKeyListenTypeUDP:
+				workLog.debugLog( "starting UDP listening server")
+				
+				if not await self._startUDPServer():
+					return False
+			else:
+				workLog.debugLog( "unknkown listen type requested (%s)" % self.listenType)
+				return False
+				
+		else:
+			workLog.debugLog( "opening serial port connection to port: " + self.getParm( xtKeyPortName, 'none'))
+			self._task = self._loop.create_task( self._runSerial())
+			
+		self._lastActivity = _monotonic()
+		self._timeoutHandle = self._loop.call_later( 1, self._checkTimeout)
+		return True
+		
+	#
+	#	C L O S E
+	#
+	def close( self):
+		self.isConnected = False
+		self.connected = False
+		self.closed = True
+		self._resetBuffer()
+		
+		if self._parsingHandler:
+			self._parsingHandler = False
+			_xtPlugin.XTension.removeCommandHandler( xtCommandSetParsingParams, self.event_setParsingParams)
+			
+		if self._parsingFlush != None:
+			_xtPlugin.XTension.getScheduler().cancel( self._parsingFlush)
+			self._parsingFlush = None
+			
+		if self._loop != None and threading.get_ident() != self._loopThreadId:
+			self._loop.call_soon_threadsafe( self._release)
+		else:
+			self._release()
+			
+	def _release( self):
+		if self._timeoutHandle != None:
+			self._timeoutHandle.cancel()
+			self._timeoutHandle = None
+			
+		if self._task != None:
+			self._task.cancel()
+			self._task = None
+			
+		if self._writer != None:
+			self._writer.close()
+			self._writer = None
+			
+		if self._serial != None:
+			self._serial.close()
+			self._serial = None
+			
+		if self._udpTransport != None:
+			self._udpTransport.close()
+			self._udpTransport = None
+			
+		if self._server != None:
+			self._server.close()
+			self._server = None
+			
+		for workConnection in list( self.connectedThreads):
+			workConnection.close()
+			
+		self.sock = None
+		self.serialPort = None
+		self._endFrames()
+		
+	#
+	#	W R I T E
+	#
+	async def write( self, theData, toAddress=None):
+		try:
+			if self._writer != None:
+				self._writer.write( theData)
+				await self._writer.drain()
+				return True
+				
+			elif self._serial != None:
+				await self._serial.write( theData)
+				return True
+				
+			elif self._udpTransport != None:
+				self._udpTransport.sendto( theData, toAddress)
+				return True
+				
+		except Exception as e:
+			self.error( e)
+			return False
+			
+		self.error( 'write with no connection')
+		return False
+		
+	#
+	# the events are all called in the loop so the parsing timeout is passed back to it
+	#
+	def _parsingTimeoutExpired( self):
+		if self._loop != None:
+			self._loop.call_soon_threadsafe( self._flushParsing)
+			
+	#
+	# the threads call socketTimeout each time a read times out after a second of nothing
+	#
+	def _checkTimeout( self):
+		quietTime = _monotonic() - self._lastActivity
+		
+		if quietTime < 1:
+			self._timeoutHandle = self._loop.call_later( 1 - quietTime, self._checkTimeout)
+			return
+			
+		self._timeoutHandle = self._loop.call_later( 1, self._checkTimeout)
+		
+		if self.connectionMethod == xtPortNameListen:
+			return
+			
+		try:
+			self.socketTimeout()
+		except Exception as e:
+			_xtPlugin.XTension.writeLog( "Error in AsyncXTRemoteConnection.socketTimeout( %s)" % e, xtLogRed)
+			
+	#
+	# reads until the other end closes or there is an error, which is returned
+	#
+	async def _readStream( self, readMethod):
+		try:
+			while True:
+				newData = await readMethod( self.readSize)
+				
+				if newData == b'':
+					return 'disconnected'
+					
+				self._deliverData( newData)
+				await self._waitForRoom()
+				
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			return e
+			
+	#
+	#	O U T G O I N G   T C P
+	#
+	async def _runTCP( self):
+		workLog = _xtPlugin.XTension
+		
+		while not workLog.isShuttingDown and not self.closed:
+			try:
+				workAddress = self.getParm( xtKeyRemoteAddress)
+				workPort = int( self.getParm( xtKeyRemotePort))
+				
+				workLog.debugLog( "connecting to: %s:%s" % (workAddress, str( workPort)))
+				
+				workReader, self._writer = await asyncio.wait_for( asyncio.open_connection( workAddress, workPort), 10)
+				
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				self._writer = None
+				self.sock = None
+				self.isConnected = False
+				self.connected = False
+				
+				if self.errorSent == False:
+					self.errorSent = True
+					self._callError( e)
+					
+				await asyncio.sleep( 2)
+				continue
+				
+			workLog.debugLog( "connected OK")
+			
+			self.sock = self._writer.get_extra_info( 'socket')
+			
+			try:
+				self.sock.setsockopt( socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+			except Exception:
+				pass
+				
+			self._resetBuffer()
+			self.isConnected = True
+			self.connected = True
+			self._lastActivity = _monotonic()
+			
+			try:
+				self.eventConnected()
+			except Exception as f:
+				workLog.writeLog( "Error in AsyncXTRemoteConnection.connected %s" % f, xtLogRed)
+				
+			e = await self._readStream( workReader.read)
+			
+			if self._writer != None:
+				self._writer.close()
+				self._writer = None
+				
+			self.sock = None
+			self.isConnected = False
+			self.connected = False
+			
+			if self.closed or workLog.isShuttingDown:
+				return
+				
+			self._callError( e)
+			workLog.debugLog( "attempting to restart connection after %s" % e)
+			await asyncio.sleep( 2)
+			
+	#
+	#	S E R I A L
+	#
+	# the port is opened by XTRemoteConnection._openSerialPort so it's set up exactly the same
+	#
+	async def _runSerial( self):
+		workLog = _xtPlugin.XTension
+		
+		while not workLog.isShuttingDown and not self.closed:
+			if not self._openSerialPort():
+				await asyncio.sleep( 1)
+				continue
+				
+			self._serial = XTAsyncSerial( self.serialPort)
+			self._lastActivity = _monotonic()
+			
+			e = await self._readStream( self._serial.read)
+			
+			if self._serial != None:
+				self._serial.close()
+				self._serial = None
+				
+			self.serialPort = None
+			self.connected = False
+			
+			if self.closed or workLog.isShuttingDown:
+				return
+				
+			workLog.debugLog( "exception in serial read: %s" % e)
+			self._callError( e)
+			await asyncio.sleep( 2)
+			
+	def _callError( self, e):
+		try:
+			self.error( e)
+		except Exception as f:
+			_xtPlugin.XTension.writeLog( "Error in AsyncXTRemoteConnection( %s) and a further error in AsyncXTRemoteConnection.error( %s)" % (e, f), xtLogRed)
+			
+	#
+	#	T C P   S E R V E R
+	#
+	async def _startTCPServer( self):
+		listenNetwork, listenPort = self._listenAddress()
+		
+		if listenPort == -1:
+			_xtPlugin.XTension.writeLog( "no port was specified for the listening TCP server. Cannot startup", xtLogRed)
+			_xtPlugin.XTension.setRunState( xtRunStateFail, "no port specified")
+			return False
+			
+		try:
+			self._server = await asyncio.start_server( self._acceptStream, listenNetwork, listenPort, reuse_address=True, backlog=10)
+		except Exception as e:
+			self.connected = False
+			self.error( e)
+			_xtPlugin.XTension.setRunState( xtRunStateFail, str( e))
+			return False
+			
+		self.sock = self._server.sockets[0]
+		self.connected = True
+		self.listening()
+		return True
+		
+	async def _acceptStream( self, workReader, workWriter):
+		workAddress = workWriter.get_extra_info( 'peername')
+		workConnection = self.makeTCPServerConnection( workAddress[0])
+		
+		if workConnection == None:
+			_xtPlugin.XTension.debugLog( "connection from %s was refused" % workAddress[0], xtLogRed)
+			workWriter.close()
+			return
+			
+		self.connectedThreads.append( workConnection)
+		
+		workConnection._setup( workAddress[0], workAddress[1], workReader, workWriter, self)
+		await workConnection._run()
+		
+	#
+	#	M A K E   T C P   S E R V E R   C O N N E C T I O N
+	#
+	# the same as makeTCPServerThread, return your subclass of AsyncXTTCPServerConnection or
+	# None to refuse the connection
+	#
+	def makeTCPServerConnection( self, remoteAddress):
+		return AsyncXTTCPServerConnection()
+		
+	#
+	#	U D P   S E R V E R
+	#
+	async def _startUDPServer( self):
+		listenNetwork, listenPort = self._listenAddress()
+		
+		if listenPort == -1:
+			_xtPlugin.XTension.writeLog( "no port was specified for the listening UDP server. Cannot startup", xtLogRed)
+			_xtPlugin.XTension.setRunState( xtRunStateFail, "no port specified")
+			return False
+			
+		try:
+			# made here for SO_REUSEADDR which create_datagram_endpoint no longer allows
+			workSock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM)
+			workSock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			workSock.bind( (listenNetwork, listenPort))
+			
+			self._udpTransport, workProtocol = await self._loop.create_datagram_endpoint( lambda: XTAsyncDatagramProtocol( self), sock=workSock)
+		except Exception as e:
+			self.error( e)
+			self.isConnected = False
+			self.connected = False
+			return False
+			
+		self.sock = workSock
+		self.isConnected = True
+		self.listening()
+		return True
+		
+	#
+	# each datagram replaces the buffer just like the UDP server thread
+	#
+	def _datagramReceived( self, workMessage, workAddress):
+		self._deliverDatagram( workMessage, workAddress)
+		
+		if len( self._frames) > self.frameQueueLimit:
+			# datagrams can't wait so the oldest are dropped
+			self._frames.popleft()
+			
+	#
+	# the default events queue what arrived for readframe
+	#
+	def dataAvailable( self):
+		workData = self.buffer
+		self.buffer = b''
+		self._queueFrame( workData, self.remoteAddress)
+		
+	def frameReceived( self, frame):
+		self._queueFrame( frame, self.remoteAddress)
+		
+		
+		
+#
+# passes the datagrams to the AsyncXTRemoteConnection
+#
+
+class XTAsyncDatagramProtocol( asyncio.DatagramProtocol):
+
+	def __init__( self, owner):
+		self.owner = owner
+		
+	def datagram_received( self, data, addr):
+		self.owner._datagramReceived( data, addr)
+		
+	def error_received( self, exc):
+		self.owner._callError( exc)
+
+
+
+#
+#
+#	A S Y N C   X T   T C P   S E R V E R   C O N N E C T I O N
+#
+#
+# a connection accepted by the TCP server of an AsyncXTRemoteConnection, the same events as
+# XTTCPServerConnection plus readframe and an awaitable write
+#
+
+class AsyncXTTCPServerConnection( XTAsyncFrames):
+
+	framer = None
+	readSize = 65536
+	
+	def _setup( self, ip, port, reader, writer, myServer):
+		self.ip = ip
+		self.port = port
+		self.reader = reader
+		self.writer = writer
+		self.sock = writer.get_extra_info( 'socket')
+		self.parentServer = myServer
+		
+		self.buffer = b''
+		self.isConnected = True
+		self.connected = True
+		self._initFrames()
+		
+	async def _run( self):
+		try:
+			self.eventConnected()
+		except Exception as e:
+			_xtPlugin.XTension.writeLog( "error in AsyncXTTCPServerConnection.eventConnected %s" % e, xtLogRed)
+			
+		try:
+			while self.connected:
+				newData = await self.reader.read( self.readSize)
+				
+				if newData == b'':
+					self._connectionLost( 'disconnected')
+					return
+					
+				self._deliverData( newData)
+				await self._waitForRoom()
+				
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			self._connectionLost( e)
+			
+	def _connectionLost( self, e):
+		wasConnected = self.connected
+		self.close()
+		
+		if wasConnected and not _xtPlugin.XTension.isShuttingDown:
+			try:
+				self.error( e)
+			except Exception as f:
+				_xtPlugin.XTension.writeLog( "error in AsyncXTTCPServerConnection.error %s" % f, xtLogRed)
+				
+	#
+	#	C L O S E
+	#
+	def close( self):
+		self.isConnected = False
+		self.connected = False
+		self.writer.close()
+		
+		if self in self.parentServer.connectedThreads:
+			self.parentServer.connectedThreads.remove( self)
+			
+		self._endFrames()
+		
+	# the framer works exactly like it does for XTTCPServerConnection
+	_deliverData = XTTCPServerConnection._deliverData
+	_deliverFrames = XTTCPServerConnection._deliverFrames
+	setFramer = XTTCPServerConnection.setFramer
+	
+	#
+	#	W R I T E
+	#
+	async def write( self, theData):
+		if not self.connected:
+			_xtPlugin.XTension.writeLog( "write to disconnected socket", xtLogRed)
+			return False
+			
+		try:
+			self.writer.write( theData)
+			await self.writer.drain()
+			return True
+		except Exception as e:
+			self._connectionLost( e)
+			return False
+			
+	#
+	# SUBCLASS THESE METHODS TO HANDLE EVENTS
+	#
+	def eventConnected( self):
+		_xtPlugin.XTension.writeLog( "Accepted Connection from: %s:%s" % (self.ip, str( self.port)))
+		
+	def dataAvailable( self):
+		workData = self.buffer
+		self.buffer = b''
+		self._queueFrame( workData, self.ip)
+		
+	def frameReceived( self, frame):
+		self._queueFrame( frame, self.ip)
+		
+	def error( self, e):
+		_xtPlugin.XTension.writeLog( "Error on socket %s" % e)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 #
 #		XTENSION PLUGIN STANDARD INCLUDE   http://MacHomeAutomation.com
-#		Plugin Version 3.4.2
+#		Plugin Version 3.6
 #		API Version 2
 #
 #	this code provides the glue that can connect any other python code to XTension
@@ -71,6 +71,64 @@
 #	added support for passing "debug" as the last parameter to startup the connection in debug mode
 # version 3.4.2 4/10/2021
 #	fixed error with new "getBlocked" method in XTUnit class which would always return blocked if the unit had ever been blocked
+# version 3.6 10/18/2026
+#	the pipe to XTension is now read with recv_into into a preallocated XTPacketBuffer and packets
+#	are passed to XTCommand._parse as memoryviews rather than appending to and re-slicing a bytes buffer.
+#	XTension.receiveSize and XTension.maxReceiveSize control the size of the reads
+#	added XTension.dispatchWorkers to handle commands on a pool of worker threads, in order per unit, so
+#	that a slow handler no longer holds up the XTension Receive Thread. See XTension.getDispatchMetrics()
+#	ping commands are now answered by the receive thread ahead of other commands and never go to the
+#	dispatch workers, set debug mode waits for the commands before it. XTension.sendCommand takes priority=True to send ahead of other traffic
+#	commands to XTension are now encoded into a single packet and written by the XTension Write Thread
+#	which combines everything waiting into one write. See XTension.useWriterThread and sendFlushDelay
+#	added XTCommand.template( ...) for commands that are sent over and over, XTUnit.turnOn, turnOff,
+#	setValue and sendNoOp use them now. Command keys are looked up once rather than with globals() every time
+#	commands from XTension are now XTParsedCommands that only slice a value out of the packet when it is
+#	asked for. added getView( key) to XTCommand, xtData now accepts bytes, bytearray or a memoryview
+#	xtData is now parsed in one pass over a memoryview and saved into a single bytearray. A truncated
+#	xtData no longer leaves _parse looping forever on python 3
+#	xtData.get caches the converted value until the value changes. added xtData.getFloat which XTUnit.getValue,
+#	getState, getStatus and getPreset use so that reading an unchanged value is just a lookup
+#	xtData containers are indexed by name and uuid so that merging all the units is no longer
+#	a search of every unit for every one merged. added xtData.removeContainer and containersChanged,
+#	renaming a container or removing one rebuilds the indexes
+#	xtData.merge compares the raw values and types and notifies subscribers of all the changes in one pass
+#	fixed hasChildrenSubscribers, unsubscribeToChildren, subscribeForList and unsubscribeForList
+#	xtData, XTSharedObject and XTUnit use __slots__. subscriber lists, handler dicts, decode caches and
+#	container indexes are only created when used and short values are shared between objects.
+#	fixed removeScriptHandler
+#	added unitIndexByBareAddress and unitIndexByTag, getUnitIgnoringTag and getUnitIgnoringAddress use them
+#	instead of walking all the units. added getUnitsIgnoringTag and getUnitsIgnoringAddress
+#	fixed XTUnit._indexChanged not seeing tag changes and not upper casing a changed address
+#	added makeUnitKey and getUnitFromKey for looking up units by a (tag, address) key made once. addresses
+#	with no unit are only logged the first time, see getUnitLookupMisses
+#	added XTScheduler, one thread with a heap on the monotonic clock. XTDoLater and XTTimer use it instead
+#	of a thread each, allow fractions of a second and XTTimer no longer drifts. see XTension.getScheduler
+#	their actions are run by XTension.schedulerWorkers threads so a slow one doesn't hold up the others,
+#	set runInline on the class to run a quick one on the scheduler thread instead
+#	xtDeferredCommand is sent by the scheduler rather than a thread each. added extendOnAdd, maxLatency,
+#	maxFields and flush
+#	added XTIOLoop. XTRemoteConnection.useIOLoop runs the connection from one selectors thread shared by all
+#	connections instead of a thread each. see XTension.getIOLoop
+#	fixed the UDP listen type, forceIp, the TCP server accept and XTTCPServerConnection write and close
+#	added XTDelimiterFramer, XTFixedFramer, XTLengthPrefixFramer and XTRegexFramer. give one to a connection
+#	with setFramer or framer= and complete frames are passed to frameReceived instead of dataAvailable
+#	added XTRemoteConnection.useParsingParams and setParsingParams to handle xtCommandSetParsingParams, the
+#	terminator, length and timeout from XTension are applied as they arrive. the timeout runs on the scheduler
+#	added XTRemoteConnection.serialReadSize and serialInterByteTimeout to read serial data in bursts
+#	rather than a few bytes at a time. the serial port name can be overridden in the kwds like the other settings
+#	added XTWriteQueue and XTRemoteConnection.useWriteQueue, write queues the data for a writer thread or the
+#	IO loop instead of blocking the caller. see writeQueueFull, writeQueueDrained, flushWrites and getWriteMetrics
+#	added xtension_async with cAsyncXTension for plugins that run on an asyncio event loop, command and script
+#	handlers there can be coroutines. XTPacketBuffer.getReceiveBuffer and received are for reading with something
+#	other than a socket
+#	XTRemoteConnection picks and starts its connection in _startConnection which AsyncXTRemoteConnection in
+#	xtension_async replaces
+#	startup waits on an event set as soon as the settings and units are received instead of checking every half
+#	second, added startupTimeout and startupTimings which is logged in debug mode
+#	added useWarmStart to start from a snapshot of the last settings and units and merge XTension's reply into it
+#	added useReconnect to connect to XTension again when the connection is lost instead of exiting, the units,
+#	handlers, timers and connections are kept and commands sent in the meantime are held or dropped
 
 
 import sys
@@ -101,6 +159,18 @@ import json
 import serial
 import math
 import uuid 
+from collections import deque
+import heapq
+import errno
+import re
+import select
+import mmap
+
+# XTIOLoop needs selectors which python 2 does not have, XTRemoteConnection uses threads there
+try:
+	import selectors
+except ImportError:
+	selectors = None
 
 # try to set the process title to our plugin instance name if possible
 # this still doesnt work for activity monitor or top, but ps will show the right thing
@@ -119,6 +189,15 @@ except ImportError:
 	
 
 
+# monotonic clock for measuring intervals, python 2 does not have one
+# note that "time" is the function here and not the module thanks to the import * above
+try:
+	_monotonic = monotonic
+except NameError:
+	_monotonic = time
+	
+	
+
 xtensionPluginVersion = 4
 
 # debugging aid during utf8 handling
@@ -169,6 +248,26 @@ class cXTension:
 	unitIndexById 		= {}
 	unitIndexByName 	= {}
 	
+	#
+	# the same units by just the address or just the tag. More than one unit can have the 
+	# same address with different tags, or the same tag, so these hold a list of units for each
+	# see getUnitsIgnoringTag and getUnitsIgnoringAddress
+	#
+	unitIndexByBareAddress	= {}
+	unitIndexByTag			= {}
+	
+	#
+	# the same units as unitIndexByAddress but keyed by the (tag, address) tuple from makeUnitKey
+	# see getUnitFromKey
+	#
+	unitIndexByKey			= {}
+	
+	#
+	# the most (tag, address) keys that getUnitFromKey remembers not finding. Each one is only 
+	# logged the first time, after that they are just counted, see getUnitLookupMisses
+	#
+	kMaxUnitMissCache		= 1000
+	
 	#
 	# shared script indexes if you're sharing the database then these can be used to look up
 	# scripts that were shared with you.
@@ -234,18 +333,115 @@ class cXTension:
 	
 	
 	isShuttingDown = False
+	
+	#
+	# size of each read from the pipe to XTension. The buffer will ask for more than this
+	# when it knows it is waiting on a large packet, like the initial setUnits dump, but
+	# never more than maxReceiveSize in a single read. Change before calling startup
+	#
+	receiveSize		= 4028
+	maxReceiveSize	= 1048576
+	
+	#
+	# by default every command from XTension is handled in the XTension Receive Thread and a slow
+	# handler holds up everything behind it. Set dispatchWorkers to the number of threads you want
+	# before calling startup and the receive thread will only read and route the commands. They are
+	# handled by the worker threads instead, in order for any one unit or script, but different units
+	# in parallel. No more than dispatchQueueLimit commands are queued before the reader waits.
+	# XTension.getDispatchMetrics() returns the queue depth and wait times
+	#
+	dispatchWorkers		= 0
+	dispatchQueueLimit	= 1000
+	
+	#
+	# the XTDoLater and XTTimer actions are run by this many threads so that a slow one doesn't
+	# delay every other timer waiting on the scheduler. Set before the first one is created
+	#
+	schedulerWorkers	= 2
+	
+	kInterfaceLane		= '(interface)'
+	
+	#
+	# commands that are answered by the receive thread as soon as they are read. They never wait
+	# behind the handling of other commands and their replies are sent ahead of other traffic.
+	# Only ping, shutdown and set debug mode stay in order with everything else
+	#
+	kControlCommands	= frozenset( [xtCommandPing])
+	
+	#
+	# commands to XTension are written by their own thread which combines everything waiting into
+	# a single write. sendFlushDelay is how many seconds it waits to collect more before writing, 0
+	# writes them as soon as possible. Set useWriterThread to False before calling startup to have
+	# sendCommand write to the socket itself in the calling thread as before.
+	# XTension.getWriterMetrics() returns the number of packets and writes
+	#
+	useWriterThread		= True
+	sendFlushDelay		= 0.0
+	
+	#
+	# seconds startup waits for our settings and units before giving up and returning False,
+	# None waits forever. XTension.startupTimings has how long each part of the startup took and
+	# it's written to the log in debug mode
+	#
+	startupTimeout		= None
+	
+	#
+	# set useWarmStart before calling startup to keep the settings and units that XTension sends
+	# in warmStartFile next to info.json. The next startup builds everything from that file and 
+	# returns without waiting for XTension. XTension's own reply is merged in when it arrives, 
+	# changed values are updated as usual, new units are added and units that are not ours any 
+	# more are removed
+	#
+	useWarmStart		= False
+	warmStartFile		= 'warmstart.snapshot'
+	
+	# the magic, version, length of the connection id, of the settings and of the units
+	_warmStartHeader	= Struct( "<4sBxxxIII")
+	kWarmStartMagic		= b'XTws'
+	kWarmStartVersion	= 1
+	
+	#
+	# normally when the connection to XTension is lost the receive thread exits and XTension starts
+	# the plugin again. Set useReconnect before calling startup to instead keep running and connect
+	# again, waiting reconnectDelay seconds and then twice as long after each failure up to 
+	# reconnectMaxDelay. After reconnectTimeout seconds, None for never, it gives up and exits as
+	# before. The units, handlers, timers and XTRemoteConnections all stay as they are, the settings
+	# and units are asked for again and merged in like after a warm start.
+	#
+	# commands sent while disconnected are held and sent once connected again with kHoldPackets,
+	# up to reconnectHoldLimit bytes after which the oldest are dropped. Or they are all dropped 
+	# with kDropPackets. Priority packets, acks and ping replies, are always dropped
+	#
+	useReconnect		= False
+	reconnectDelay		= 0.5
+	reconnectMaxDelay	= 30
+	reconnectTimeout	= None
+	reconnectPolicy		= 'hold'
+	reconnectHoldLimit	= 1048576
+	
+	kHoldPackets		= 'hold'
+	kDropPackets		= 'drop'
 		
 	
 	def __init__(self):
 
 		# it appears this is not necessary as b'' on python3 is just str as if it wasn't there	
-		if isPy3:
-			self._commandBuffer = b''
-		else:
-			self._commandBuffer = ''
+		# the receive buffer for the pipe to XTension is created in startup so that
+		# any changes you make to receiveSize or maxReceiveSize before then are used
+		self._packetBuffer = None
+		self._dispatcher = None
+		self._writer = None
+		
+		# the XTScheduler for XTDoLater, XTTimer and friends, created when first needed
+		self._scheduler = None
+		self._schedulerLock = threading.Lock()
+		
+		# the XTIOLoop for XTRemoteConnections with useIOLoop set, created when first needed
+		self._ioLoop = None
 	
 		self.data = {} #all params stored in here
 		self.writeLock = threading.Lock() #make sure 2 commands don't write in the middle of each other
+		self.bulkWriteLock = threading.Lock() # commands sent without priority queue up on this before the writeLock
 		# keep a global reference in this module for us ot be able to do things like writeLog and such
 		global XTension
 		XTension = self
@@ -254,6 +450,10 @@ class cXTension:
 		
 		self.getUnitWithAddress = self.getUnitFromAddress
 		
+		# (tag, address):number of lookups that didn't find a unit, see getUnitFromKey
+		self._unitLookupMisses = {}
+		self._unitLookupMissTotal = 0
+		
 		#
 		#	load our info file as we may need serial information from it among other things
 		#
@@ -271,6 +471,36 @@ class cXTension:
 		self.gotSettings = False
 		self.gotUnits = False
 		
+		# set once both the settings and units have been received, startup waits on it
+		self._startupEvent = threading.Event()
+		self._startupBegan = None
+		self.startupTimings = {}
+		
+		# the raw settings and units from XTension to be saved for the next warm start and
+		# whether the next units from XTension are everything we should have, after a warm start
+		# or a reconnect, so that anything not in them can be removed. See _reconcileUnits
+		self._warmSettings = None
+		self._warmUnits = None
+		self._reconcilePending = False
+		
+		# the unique id sent with the last getMyData, XTension sends it back in the reply. Only
+		# that reply is the full list of our units, any other setUnits is a new or changed unit
+		self._unitsRequestId = None
+		
+		# see useReconnect, packets sent while the connection to XTension is down are held in
+		# _heldPackets until it's back
+		self._hostConnected = True
+		self._reconnectLock = threading.Lock()
+		self._heldPackets = deque()
+		self._heldSize = 0
+		self.reconnectCount = 0
+		self.packetsDroppedWhileDisconnected = 0
+		
+		# called from the receive thread when the connection to XTension is lost and again when
+		# it has been made again with useReconnect
+		self.onHostLost = None
+		self.onHostReconnected = None
+		
 		# current run state so we dont sent constant updates to XTension
 		self.currentRunState = ''
 		
@@ -308,9 +538,14 @@ class cXTension:
 
 		# called separately and not during init so that you can insert an xUnit 
 		# creation handler before the units are received from XTension
-	def startup( self):
+		# returns True once the settings and units have been received or False if that took 
+		# longer than timeout seconds, startupTimeout if it's not passed
+	def startup( self, timeout=None):
 	
-
+		self._startupBegan = _monotonic()
+		
+		if timeout == None:
+			timeout = self.startupTimeout
 
 		
 		# get our XTension address, port and ID from the command line
@@ -324,14 +559,28 @@ class cXTension:
 		# make the socket and connect, or try to
 		self.sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM)
 		self.sock.connect((self.XTensionAddress, self.XTensionPort))
+		self._startupMark( 'connect')
 		
 		# this is the first connect message the only important part is the connection ID
 		# as that matches this socket up with the appropriate interface inside XTension
 		# it's passed to us on the command line when we are started up
 		self._rawWrite( self.helloMessage + ":" + self.XTensionConnectionId + "\r") #connect us to our interface instance inside XTension		
+		self._startupMark( 'hello')
 
 		self.ready = True
 		
+		self._packetBuffer = XTPacketBuffer( self.receiveSize, self.maxReceiveSize)
+		
+		if self.useWriterThread:
+			self._writer = XTCommandWriter( self._rawWrite, self.sendFlushDelay, writeLock=self.writeLock)
+		
+		if self.dispatchWorkers > 0:
+			self._dispatcher = XTCommandDispatcher( self._handleCommand, self.dispatchWorkers, self.dispatchQueueLimit)
+			
+		# before anything from XTension can be read and handled
+		if self.useWarmStart:
+			self._loadWarmStart()
+		
 		# begin the listening on the port
 		# which is done in this thread
 		readThread = Thread( target=self.threadedRead, args=(), name='XTension Receive Thread')
@@ -341,9 +590,164 @@ class cXTension:
 		self.getMySettings() # ask for our all keyed data object
 		self.getMyData() # ask for all the objects assigned to us
 		
-		# now wait for the settings and units to be received
-		while not self.gotSettings or not self.gotUnits:
-			sleep( 0.5)
+		# now wait for the settings and units to be received, event_gotSettings and
+		# event_receivedData set the event as soon as both are here
+		if not self._startupEvent.wait( timeout):
+			self.writeLog( "settings and units not received from XTension after %s seconds" % timeout, xtLogRed)
+			return False
+			
+		return True
+			
+	#
+	#	_ S T A R T U P   M A R K
+	#
+	# remembers how long after startup began a step of it was finished, see startupTimings
+	#
+	def _startupMark( self, stepName):
+		if self._startupBegan != None and stepName not in self.startupTimings:
+			self.startupTimings[ stepName] = _monotonic() - self._startupBegan
+			
+	#
+	# called as the settings and the units arrive, once both are here startup can return
+	#
+	def _checkStarted( self):
+		if not self.gotSettings or not self.gotUnits or self._startupEvent.is_set():
+			return
+			
+		self._startupMark( 'total')
+		self._startupEvent.set()
+		
+		if self.debugMode and self.startupTimings:
+			workSteps = sorted( self.startupTimings.items(), key=lambda workStep: workStep[1])
+			lastTime = 0
+			workParts = []
+			
+			for (stepName, stepTime) in workSteps:
+				if stepName != 'total':
+					workParts.append( "%s %.1fms" % (stepName, (stepTime - lastTime) * 1000))
+					lastTime = stepTime
+				
+			self.debugLog( "startup took %.1fms: %s" % (self.startupTimings[ 'total'] * 1000, ", ".join( workParts)))
+			
+	#
+	#
+	#	W A R M   S T A R T
+	#
+	# the snapshot is the raw xtData of the settings and of the units exactly as XTension sent
+	# them, after a header with their sizes and the connection id they were for. It's mapped
+	# rather than read and each part is handed to xtData just like the data in a command. It is
+	# written once per run, when the first settings and units have both been received, to a
+	# temporary file that is then renamed over the old one so a crash can't leave half a file.
+	#
+	def _warmStartPath( self):
+		return os.path.join( sys.path[0], self.warmStartFile)
+		
+	def _loadWarmStart( self):
+		snapshotPath = self._warmStartPath()
+		
+		try:
+			with open( snapshotPath, 'rb') as snapshotFile:
+				snapshotMap = mmap.mmap( snapshotFile.fileno(), 0, access=mmap.ACCESS_READ)
+		except (IOError, OSError, ValueError):
+			# no snapshot yet, or an empty one
+			return False
+			
+		try:
+			workHeader = self._warmStartHeader
+			(workMagic, workVersion, idLength, settingsLength, unitsLength) = workHeader.unpack_from( snapshotMap, 0)
+			
+			settingsStart = workHeader.size + idLength
+			unitsStart = settingsStart + settingsLength
+			
+			if workMagic != self.kWarmStartMagic or workVersion != self.kWarmStartVersion or unitsStart + unitsLength != len( snapshotMap):
+				self.writeLog( "ignoring warm start snapshot that is not valid: %s" % snapshotPath, xtLogRed)
+				return False
+				
+			# a snapshot made for another instance of this plugin
+			if snapshotMap[ workHeader.size:settingsStart] != self.XTensionConnectionId.encode( 'utf-8'):
+				return False
+				
+			settingsData = xtData( snapshotMap[ settingsStart:unitsStart])
+			unitsData = xtData( snapshotMap[ unitsStart:unitsStart + unitsLength])
+			
+		except Exception as e:
+			self.writeLog( "unable to read warm start snapshot %s: %s" % (snapshotPath, e), xtLogRed)
+			return False
+			
+		finally:
+			snapshotMap.close()
+			
+		self._startupMark( 'snapshot read')
+		
+		self._applySettings( settingsData)
+		self._applyData( unitsData)
+		self._reconcilePending = True
+		
+		self.debugLog( "warm start with %s units from %s" % (len( self.unitIndexById), snapshotPath))
+		return True
+		
+	#
+	# the reply to getMyData after a warm start or a reconnect, everything we have that isn't
+	# in it has been deleted or is not shared with us any more
+	#
+	def _reconcileUnits( self, myData):
+		replyIds = set()
+		
+		for x in myData.getAllContainers( "unit"):
+			replyIds.add( x.get( xtUnitKeyUniqueId, None))
+			
+		for x in myData.getAllContainers( "script"):
+			replyIds.add( x.get( xtUnitKeyUniqueId, None))
+			
+		staleObjects = [workUnit for (workId, workUnit) in self.unitIndexById.items() if workId not in replyIds]
+		staleObjects.extend( [workScript for (workId, workScript) in self.scriptIndexById.items() if workId not in replyIds])
+		
+		self._applyData( myData)
+		
+		for workObject in staleObjects:
+			try:
+				workObject._objectRemoved( None)
+			except Exception as e:
+				self.writeLog( "error removing %s that XTension no longer has: %s" % (workObject.name, e), xtLogRed)
+				self.writeLog( traceback.format_exc(), xtLogRed)
+				
+		self.debugLog( "units merged with XTension, %s removed" % len( staleObjects))
+		
+	#
+	# once both have been received they are written by a thread of their own
+	#
+	def _saveWarmStartLater( self):
+		if self._warmSettings == None or self._warmUnits == None:
+			return
+			
+		saveThread = Thread( target=self._saveWarmStart, args=(self._warmSettings, self._warmUnits), name='XTension Warm Start Save')
+		saveThread.daemon = True
+		saveThread.start()
+		
+	def _saveWarmStart( self, settingsBytes, unitsBytes):
+		snapshotPath = self._warmStartPath()
+		tempPath = snapshotPath + '.tmp'
+		connectionId = self.XTensionConnectionId.encode( 'utf-8')
+		
+		try:
+			with open( tempPath, 'wb') as snapshotFile:
+				snapshotFile.write( self._warmStartHeader.pack( self.kWarmStartMagic, self.kWarmStartVersion, len( connectionId), len( settingsBytes), len( unitsBytes)))
+				snapshotFile.write( connectionId)
+				snapshotFile.write( settingsBytes)
+				snapshotFile.write( unitsBytes)
+				snapshotFile.flush()
+				os.fsync( snapshotFile.fileno())
+				
+			# replaces the old one in one step on the same volume
+			os.rename( tempPath, snapshotPath)
+			
+		except Exception as e:
+			self.writeLog( "unable to save warm start snapshot %s: %s" % (snapshotPath, e), xtLogRed)
+			
+			try:
+				os.remove( tempPath)
+			except OSError:
+				pass
 			
 	
 	
@@ -429,7 +833,9 @@ class cXTension:
 		# 3.3 support for the AllScriptHandlers list as well
 		for thisHandler in self._allScriptHandlers:
 			try:
-				thisHandler( commandName, positionalParms, dataParms)
+				workResult = thisHandler( commandName, positionalParms, dataParms)
+				if workResult != None:
+					self._handlerReturned( workResult)
 			except Exception as e:
 				XTension.writeLog( "Error in allScriptHandler( '" + commandName + "'): " + str( e), xtLogRed)
 				XTension.writeLog( traceback.format_exc(), xtLogRed)
@@ -443,7 +849,9 @@ class cXTension:
 		
 		for workHandler in self._scriptHandlers[ commandName]:
 			try:
-				workHandler( commandName, positionalParms, dataParms)
+				workResult = workHandler( commandName, positionalParms, dataParms)
+				if workResult != None:
+					self._handlerReturned( workResult)
 			except Exception as e:
 				XTension.writeLog( "Error handling command '" + commandName + "' " + str( e), xtLogRed)
 				XTension.writeLog( traceback.format_exc(), xtLogRed)
@@ -494,7 +902,7 @@ class cXTension:
 	#
 			
 	def event_respondToPing( self, theCommand):		
-		self.sendCommand( XTCommand( xtKeyCommand = xtCommandPingResponse))			
+		self.sendCommand( XTCommand( xtKeyCommand = xtCommandPingResponse), True)			
 	
 	
 	
@@ -516,22 +924,84 @@ class cXTension:
 		if address == None and 'address' in kwargs:
 			address = kwargs[ 'address']
 
-		addressPath = ""
-		if tag:
-			addressPath += str( tag);
+		return self.getUnitFromKey( self.makeUnitKey( tag, address))
 		
-		if address:
+		
+	#
+	#	M A K E   U N I T   K E Y
+	#
+	# the normalized (tag, address) tuple that units are indexed by in unitIndexByKey. If you 
+	# look up the same devices over and over make the key once and keep it, then call 
+	# getUnitFromKey with it and none of the string work is repeated for every packet.
+	#
+	def makeUnitKey( self, tag, address):
+		if tag == None:
+			tag = ''
+		elif not isinstance( tag, str):
+			tag = str( tag)
+			
+		if address == None:
+			address = ''
+		else:
 			try:
-				addressPath += address.upper()
+				address = address.upper()
 			except:
-				addressPath += str( address).upper()
+				address = str( address).upper()
+				
+		return (tag, address)
+		
+	#
+	#	G E T   U N I T   F R O M   K E Y
+	#
+	# the unit for a key from makeUnitKey or None. Addresses that have no unit are only logged
+	# the first time they are asked for, after that they are just counted
+	#
+	# every unit XTUnit indexes is in both unitIndexByKey and unitIndexByAddress, so if
+	# unitIndexByAddress has more entries then a plugin has added some of it's own to it, as
+	# it was the only index, and only then is it looked in as well. Otherwise a miss never
+	# builds the old tag + address string
+	#
+	def getUnitFromKey( self, unitKey):
+		workUnit = self.unitIndexByKey.get( unitKey)
+		if workUnit != None:
+			return workUnit
 			
+		if len( self.unitIndexByAddress) > len( self.unitIndexByKey):
+			workUnit = self.unitIndexByAddress.get( unitKey[0] + unitKey[1])
+			if workUnit != None:
+				return workUnit
+			
+		self._unitLookupMissTotal += 1
 		
-		if addressPath in self.unitIndexByAddress:
-			return self.unitIndexByAddress[ addressPath]
-		else:
-			self.debugLog( "---UNIT NOT FOUND AT PATH: (%s)" % addressPath)
+		missCount = self._unitLookupMisses.get( unitKey)
+		if missCount != None:
+			self._unitLookupMisses[ unitKey] = missCount + 1
 			return None
+			
+		# if there are more unknown addresses than we want to remember start over, they will 
+		# each be logged once more
+		if len( self._unitLookupMisses) >= self.kMaxUnitMissCache:
+			self._unitLookupMisses.clear()
+			
+		self._unitLookupMisses[ unitKey] = 1
+		self.debugLog( "---UNIT NOT FOUND AT PATH: (%s%s)" % unitKey)
+		return None
+		
+	#
+	#	G E T   U N I T   L O O K U P   M I S S E S
+	#
+	# returns the total number of lookups that didn't find a unit and a dict of
+	# (tag, address):count for the ones still remembered, most useful for finding
+	# devices that are sending data but have no unit in XTension
+	#
+	def getUnitLookupMisses( self):
+		return (self._unitLookupMissTotal, dict( self._unitLookupMisses))
+	
+	#
+	# called by XTUnit when it is indexed under a key so that it is logged again if it goes away
+	#
+	def _forgetUnitLookupMiss( self, unitKey):
+		self._unitLookupMisses.pop( unitKey, None)
 	
 	#
 	#	G E T   U N I T   W I T H   A D D R E S S
@@ -569,18 +1039,28 @@ class cXTension:
 	#	sometimes useful to be able to get a unit reference without knowing the tag
 	#	ahead of time. Useful for incoming commands from a device where the address will
 	#	be unique and the tag would not be known until the unit subclass is returned
-	#	this is not as efficient a routine however as I don't yet maintain a separate index
-	#	by this so the array must be walked to find it. This will not work if the
-	#	address might be duplicated across tag types
+	#	this is a lookup in unitIndexByBareAddress. If the address is duplicated across tag
+	#	types this returns the first one that was indexed, use getUnitsIgnoringTag to get all of
+	#	them and decide for yourself.
 	#
 	def getUnitIgnoringTag( self, address):
-		address = address.upper()
-		for key in self.unitIndexById:
-			workUnit = self.unitIndexById[ key]
-			if workUnit.address == address:
-				return workUnit
+		workList = self.unitIndexByBareAddress.get( str( address).upper())
+		if workList == None:
+			return None
+			
+		if len( workList) > 1 and self.debugMode:
+			self.debugLog( "getUnitIgnoringTag: address (%s) is used by %d units" % (address, len( workList)))
+			
+		return workList[0]
 		
-		return None
+	#
+	#	G E T   U N I T S   I G N O R I N G   T A G
+	#
+	#	all the units with the address regardless of tag, an empty list if there are none
+	#	and more than one if the address is ambiguous.
+	#
+	def getUnitsIgnoringTag( self, address):
+		return list( self.unitIndexByBareAddress.get( str( address).upper(), ()))
 		
 	#
 	#	G E T   U N I T   I G N O R I N G   A D D R E S S
@@ -588,14 +1068,21 @@ class cXTension:
 	#	sometimes you may only ever have one unit with a particular tag and you 
 	#	may not know the address the user has given it or it just doesn't matter because
 	#	there can be only one. This will return the first unit it finds with the passed
-	#	tag. It will ignore multiples.
+	#	tag. It will ignore multiples, use getUnitsIgnoringAddress to get all of them.
 	def getUnitIgnoringAddress( self, tag):
-		for key in self.unitIndexById:
-			workUnit = self.unitIndexById[ key]
-			if workUnit.tag == tag:
-				return workUnit
+		workList = self.unitIndexByTag.get( tag)
+		if workList == None:
+			return None
+			
+		return workList[0]
 		
-		return None
+	#
+	#	G E T   U N I T S   I G N O R I N G   A D D R E S S
+	#
+	#	all the units with the tag, an empty list if there are none
+	#
+	def getUnitsIgnoringAddress( self, tag):
+		return list( self.unitIndexByTag.get( tag, ()))
 	
 	
 	#
@@ -653,14 +1140,26 @@ class cXTension:
 	#
 	def threadedRead( self):
 		# called from the init method once the socket has been closed and we are now threaded
+		
+		packetBuffer = self._packetBuffer
 	
 		while True:
 		
-			newData = self.sock.recv( 4028)
-			if newData == b'':
+			# data is received directly into the packet buffer so there is no more
+			# appending to and re-slicing of a bytes buffer for every read
+			try:
+				receivedCount = packetBuffer.receive( self.sock)
+			except Exception:
+				# the connection was reset, the same as it being closed
+				receivedCount = 0
+				
+			if receivedCount == 0:
 				if self.isShuttingDown:
 					print( "XTension pipe has been closed")
 					break
+				elif self.useReconnect and self._reconnect():
+					packetBuffer = self._packetBuffer
+					continue
 				else:
 					print( "there was an error on the pipe to XTension\r")
 					self.ready = False
@@ -668,144 +1167,65 @@ class cXTension:
 					# an then XTension will try to restart us
 				
 			
-			self._commandBuffer += newData
-			
+			# everything else from this read is collected here and handled after any
+			# pings that came in with it have already been answered
+			bulkCommands = []
 			
-
-			while len( self._commandBuffer) > 4:
-		
-				
-				packetHeader = self._commandBuffer[:1]
-					
-				if packetHeader == b"J":
-					packetSize = unpack( "H", self._commandBuffer[1:3])[0]
-				elif packetHeader == b"K":
-					packetSize = unpack( "I", self._commandBuffer[1:5])[0]
-				else:
-					# an unknown packet header has been received
-					# assuming garbage in the buffer or a malformed packet or something
-					# we need to shrink the buffer until we find the next potentially
-					# valid header and start trying to read from there. That might not work
-					# of course and we should probably quit and let XTension restart us
-					# but we will try
-					self._commandBuffer = self._commandBuffer[:1]
-					continue
-				
-
+			while True:
 			
-				# if we do not have enough data to parse the packet yet then just return and wait
-				# for the next read.
-				if len( self._commandBuffer) < packetSize:
+				# returns None until a complete packet is in the buffer
+				thisPacket = packetBuffer.nextPacket()
+				if thisPacket == None:
 					break
-			
-				# pop the packet off the front of the buffer 
-				thisPacket = self._commandBuffer[0:packetSize]
-				self._commandBuffer = self._commandBuffer[packetSize:]
 				
-				workCommand = XTCommand()
+				workCommand = XTParsedCommand()
 				workCommand._parse( thisPacket)
+				
+				# the packet is just a view into the receive buffer and is only good
+				# until the next read, the command has its own copy of the packet now
+				thisPacket.release()
 								
 				
 				if not workCommand.isValid:
 					self.writeLog( "Command from XTension failed to parse", xtLogRed)
 					#dont try to actually do anything with a failed packet
 					continue
-				
 					
-				#if self.debugMode and workCommand.get( xtKeyCommand) != xtCommandPing:
-				#	self.writeLog( "command from XTension (%s)" % workCommand.get( xtKeyCommand))
-				#	workCommand._debugLog()
-
+				# ping is answered right here in the receive thread no matter how much other work
+				# is waiting or queued for the dispatch workers. XTension restarts us if we miss
+				# 2 pings in a row so they cannot wait behind a slow device handler. 
+				thisCommandCode = workCommand.get( xtKeyCommand, "(none)")
 				
-
-				#XTension.writeLog( 'tag=(%s) address=(%s)' % (workCommand.get( xtKeyTag, '(none)'), workCommand.get( xtKeyAddress, '(none)')))
-				#workCommand._debugLog()
-
-				# if the packet has both an address and an address prefix then this command
-				# is destined for a specific unit. Find the unit in our index and send it on
-				if xtKeyTag in workCommand.values and xtKeyAddress in workCommand.values:
-					workUnit = self.getUnitFromAddress( workCommand.get( xtKeyTag), workCommand.get(xtKeyAddress))
-					
-					if workUnit != None:
-						
-						try:
-							workUnit.handleCommandFromXTension( workCommand)
-						except Exception as e:
-							XTension.writeLog( "error handing (" + workCommand.get( xtKeyCommand) + ") from XTension: " + str( e), xtLogred)
-							XTension.writeLog( traceback.format_exc(), xtLogRed)
-							
-				# the other way of addressing an object is via the unique id and a target value that tells us what object to send it to
-				# if this command has both a command target and a unique ID then it is this type of command and we can route it per that.
-				elif xtKeyCommandTarget in workCommand.values and xtKeyUniqueId in workCommand.values:
-					
-					#
-					# what is the target of the delete message
-					# this was previously used just for units as it's the deleteunit command
-					# however it's now used for all shared objects as well. When it's deleted
-					# or when it's no longer shared to us then we will be sent this message
-					# that we should handle and treat that unit or object as no longer ours
-					# to control or monitor
-					#
-					thisTarget = workCommand.get( xtKeyCommandTarget)
-					
-					#
-					# target unit
-					#
-					if thisTarget == xtTargetUnit:
-						workUnit = self.getUnitFromId( workCommand.get( xtKeyUniqueId))
-						if workUnit != None:
-							try:
-								workUnit.handleCommandFromXTension( workCommand)
-							except Exception as e:
-								XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand) + ") to Unit: " + str( e), xtLogRed)
-								XTension.writeLog( traceback.format_exc(), xtLogRed)
-
-						else:
-							self.writeLog( "Unable to handle command for unit:", xtLogRed)
-							workCommand._debugLog()
-					
-					#
-					# target script
-					#
-					
-					elif thisTarget == xtTargetGlobalScript:
-						workScript = self.getScriptFromId( workCommand.get( xtKeyUniqueId))
-						if workScript != None:
-							try:
-								workScript.handleCommandFromXTension( workCommand)
-							except Exception as e:
-								XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand) + ") to Script: " + str( e), xtLogRed)
-								XTension.writeLog( traceback.format_exc(), xtLogRed)
-
-						else:
-							self.writeLog( "Unable to handle command for script:", xtLogRed)
-							workCommand._debugLog()
-							
+				if thisCommandCode in self.kControlCommands:
+					self._handleCommand( workCommand)
+					self._sendAck( workCommand, True)
+				else:
+					bulkCommands.append( workCommand)
 					
-					#
-					# as more objects are supported they should be handled here
-					# TODO lists are already supported but not in the plugin code
-					#
 					
-
-				# now look for any other handlers that are registered for this command type and forward that through as well								
-				# pull out the command code to see if we have a higher level handler for the command to call
+			for workCommand in bulkCommands:
+				
 				thisCommandCode = workCommand.get( xtKeyCommand, "(none)")
 				
-				if thisCommandCode in self._commandHandlers:
-					for workHandler in self._commandHandlers[ thisCommandCode]:
-						try:
-							workHandler( workCommand)
-						except Exception as e:
-							XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand, "no command") + ") from XTension: " + str( e), xtLogRed)
-							XTension.writeLog( traceback.format_exc(), xtLogRed)
-						
 				#special handling for shutdown command, have to exit here so that multiple other commands
 				# can be executed to shutdown other sockets or anything else
 				# if you call sys.exit in any of the other added handlers then this will fall out and the remainder of them
 				# will never be called. So i will take care of that here you don't have to do that in your shutdown handlers.
 				
-				if thisCommandCode == xtCommandShutdown:					
+				if thisCommandCode == xtCommandShutdown:
+				
+					# let anything already handed to the dispatch workers finish before
+					# the shutdown handlers run in this thread
+					if self._dispatcher != None:
+						self._dispatcher.drain( 2.0)
+						self._dispatcher.stop()
+						
+					self._handleCommand( workCommand)
+					
+					self._stopIOLoop()
+					self._stopScheduler()
+					self._stopWriter()
+									
 					try:
 						self.sock.shutdown(socket.SHUT_RDWR)
 						self.sock.close()
@@ -814,62 +1234,399 @@ class cXTension:
 						
 					self.ready = False
 					sys.exit()
+					
+				# debug mode changes once everything XTension sent before it has been handled,
+				# so the commands before it are logged the way they were and the ones after the new way
+				if thisCommandCode == xtCommandSetDebugMode and self._dispatcher != None:
+					self._dispatcher.drain( 2.0)
+					self._handleCommand( workCommand)
+					self._sendAck( workCommand)
+					continue
+				
+				if self._dispatcher != None:
+					# this blocks if the dispatch queue is full which stops us reading from
+					# XTension until the workers catch up
+					self._dispatcher.submit( self._commandLane( workCommand), workCommand)
+				else:
+					self._handleCommand( workCommand)
 						
-				# ack that we received the command
-				ackCommand = XTCommand()
-				ackCommand.set( xtKeyCommand, xtCommandAck)
-				ackCommand.set( xtKeyPacketId, workCommand.get( xtKeyPacketId))
-				self.sendCommand( ackCommand)
-
-	
+				self._sendAck( workCommand)
+				
+				
 	#
-	#	D O   S H U T D O W N
+	#	_ S E N D   A C K
 	#
-	#	called by the script when we want to be restarted by XTension, this basically
-	# 	just mimics the reception of the shutdown command and all events should trigger based
-	# 	on that and the script will quit, but XTension did not shut it down so it will restart
-	#	it in 5 seconds with the new settings or for whatever other reason.
-	# 	this handler does no logging, you should log the reason why this is happening or
-	#	necessary before you call this.
+	# ack that we received the command
 	#
-	def doShutdown( self):
-
-		# make a command to pass to the handlers so there is no error
-		shutdownCommand = XTCommand( xtKeyCommand = xtCommandShutdown)
+	def _sendAck( self, workCommand, priority=False):
+		ackCommand = XTCommand()
+		ackCommand.set( xtKeyCommand, xtCommandAck)
+		ackCommand.set( xtKeyPacketId, workCommand.get( xtKeyPacketId))
+		self.sendCommand( ackCommand, priority)
+		
+	#
+	#	_ R E C O N N E C T
+	#
+	# called from the receive thread with useReconnect when the connection to XTension is lost.
+	# Connects and says hello again, sends whatever was held while we were disconnected and asks
+	# for the settings and units to merge any changes. Returns False if we are shutting down or
+	# reconnectTimeout has passed and the receive thread should exit as it always has
+	#
+	def _reconnect( self):
+		self._hostConnected = False
+		lostTime = _monotonic()
+		droppedBefore = self.packetsDroppedWhileDisconnected
+		
+		print( "lost the connection to XTension, reconnecting\r")
+		self._callHostEvent( self.onHostLost)
 		
-		if xtCommandShutdown in self._commandHandlers:
-			for workHandler in self._commandHandlers[ xtCommandShutdown]:
-				try:
-					workHandler( shutdownCommand)
-				except Exception as e:
-					XTension.writeLog( "error in doShutdown handler: " + str( e), xtLogRed)
-					XTension.writeLog( traceback.format_exc(), xtLogRed)
-
-		# now that we are not closing the socket in the handler we registered we should also do it here
-		# paainf RDRW should send the meta data upstream that we are closing both the read and write paths
-		# and so the upstream device should send the appropriate error code that we have been disconnected.
-		# otherwise it can wait the entirety of the TCP timeout value which can be forever, or 2 minutes
-		# whichever comes first.
 		try:
-			self.sock.shutdown( socket.SHUT_RDWR)
 			self.sock.close()
 		except:
 			pass
 			
-		self.ready = False
-
-		sys.exit()
-
-								
+		retryDelay = self.reconnectDelay
+		workSock = None
+		
+		while workSock == None:
+			sleep( retryDelay)
+			
+			if self.isShuttingDown:
+				return False
 				
+			if self.reconnectTimeout != None and _monotonic() - lostTime > self.reconnectTimeout:
+				print( "unable to reconnect to XTension after %s seconds\r" % self.reconnectTimeout)
+				return False
 				
-	#
-	#
-	# 	R E C E I V E D   U N I T S 
-	#
-	#
-	#	called when we receive our initial dump of units from XTension 
-	# 	called when XTension sends us either an update to a unit or a new unit
+			try:
+				workSock = socket.create_connection( (self.XTensionAddress, self.XTensionPort), 10)
+				workSock.settimeout( None)
+			except Exception as e:
+				workSock = None
+				retryDelay = min( retryDelay * 2, self.reconnectMaxDelay)
+				
+		# anything left of a packet from the old connection is thrown away
+		self._packetBuffer = XTPacketBuffer( self.receiveSize, self.maxReceiveSize)
+		
+		# the writer thread takes the same lock, so nothing it still has queued for the old
+		# connection, like the acks for commands from it, gets onto the new socket at all
+		with self.writeLock:
+			self.sock = workSock
+			self._rawWrite( self.helloMessage + ":" + self.XTensionConnectionId + "\r")
+			
+			if self._writer != None:
+				self._writer.discard()
+		
+		# written before anything sent from now on so that they are still in order
+		with self._reconnectLock:
+			heldPackets = self._heldPackets
+			self._heldPackets = deque()
+			self._heldSize = 0
+			
+			for rawPacket in heldPackets:
+				self._writePacket( rawPacket)
+				
+			self._hostConnected = True
+			
+		self.reconnectCount += 1
+		
+		# only the reply to this getMyData is reconciled against, any setUnits that arrives
+		# ahead of it is just applied
+		self._reconcilePending = True
+		self.getMySettings()
+		self.getMyData()
+		
+		self.writeLog( "reconnected to XTension after %.1f seconds, %s commands were held and %s dropped" % (_monotonic() - lostTime, len( heldPackets), self.packetsDroppedWhileDisconnected - droppedBefore))
+		self._callHostEvent( self.onHostReconnected)
+		return True
+		
+	def _callHostEvent( self, callback):
+		if callback == None:
+			return
+			
+		try:
+			callback()
+		except Exception as e:
+			self.writeLog( "error in %s: %s" % (callback, e), xtLogRed)
+			self.writeLog( traceback.format_exc(), xtLogRed)
+
+	
+	#
+	#	_ H A N D L E   C O M M A N D
+	#
+	# routes a command received from XTension to the unit or script it is addressed to
+	# and then to any handlers registered for its command code. Called from the read thread
+	# or, if dispatchWorkers is set, from one of the dispatch worker threads
+	#
+	def _handleCommand( self, workCommand):
+
+		#if self.debugMode and workCommand.get( xtKeyCommand) != xtCommandPing:
+		#	self.writeLog( "command from XTension (%s)" % workCommand.get( xtKeyCommand))
+		#	workCommand._debugLog()
+
+		
+
+		#XTension.writeLog( 'tag=(%s) address=(%s)' % (workCommand.get( xtKeyTag, '(none)'), workCommand.get( xtKeyAddress, '(none)')))
+		#workCommand._debugLog()
+
+		# if the packet has both an address and an address prefix then this command
+		# is destined for a specific unit. Find the unit in our index and send it on
+		if xtKeyTag in workCommand.values and xtKeyAddress in workCommand.values:
+			workUnit = self.getUnitFromAddress( workCommand.get( xtKeyTag), workCommand.get(xtKeyAddress))
+			
+			if workUnit != None:
+				
+				try:
+					workUnit.handleCommandFromXTension( workCommand)
+				except Exception as e:
+					XTension.writeLog( "error handing (" + workCommand.get( xtKeyCommand) + ") from XTension: " + str( e), xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+					
+		# the other way of addressing an object is via the unique id and a target value that tells us what object to send it to
+		# if this command has both a command target and a unique ID then it is this type of command and we can route it per that.
+		elif xtKeyCommandTarget in workCommand.values and xtKeyUniqueId in workCommand.values:
+			
+			#
+			# what is the target of the delete message
+			# this was previously used just for units as it's the deleteunit command
+			# however it's now used for all shared objects as well. When it's deleted
+			# or when it's no longer shared to us then we will be sent this message
+			# that we should handle and treat that unit or object as no longer ours
+			# to control or monitor
+			#
+			thisTarget = workCommand.get( xtKeyCommandTarget)
+			
+			#
+			# target unit
+			#
+			if thisTarget == xtTargetUnit:
+				workUnit = self.getUnitFromId( workCommand.get( xtKeyUniqueId))
+				if workUnit != None:
+					try:
+						workUnit.handleCommandFromXTension( workCommand)
+					except Exception as e:
+						XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand) + ") to Unit: " + str( e), xtLogRed)
+						XTension.writeLog( traceback.format_exc(), xtLogRed)
+
+				else:
+					self.writeLog( "Unable to handle command for unit:", xtLogRed)
+					workCommand._debugLog()
+			
+			#
+			# target script
+			#
+			
+			elif thisTarget == xtTargetGlobalScript:
+				workScript = self.getScriptFromId( workCommand.get( xtKeyUniqueId))
+				if workScript != None:
+					try:
+						workScript.handleCommandFromXTension( workCommand)
+					except Exception as e:
+						XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand) + ") to Script: " + str( e), xtLogRed)
+						XTension.writeLog( traceback.format_exc(), xtLogRed)
+
+				else:
+					self.writeLog( "Unable to handle command for script:", xtLogRed)
+					workCommand._debugLog()
+					
+			
+			#
+			# as more objects are supported they should be handled here
+			# TODO lists are already supported but not in the plugin code
+			#
+			
+
+		# now look for any other handlers that are registered for this command type and forward that through as well								
+		# pull out the command code to see if we have a higher level handler for the command to call
+		thisCommandCode = workCommand.get( xtKeyCommand, "(none)")
+		
+		if thisCommandCode in self._commandHandlers:
+			for workHandler in self._commandHandlers[ thisCommandCode]:
+				try:
+					workResult = workHandler( workCommand)
+					if workResult != None:
+						self._handlerReturned( workResult)
+				except Exception as e:
+					XTension.writeLog( "error handling (" + workCommand.get( xtKeyCommand, "no command") + ") from XTension: " + str( e), xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+
+	#
+	#	_ H A N D L E R   R E T U R N E D
+	#
+	# called with whatever a command or script handler returned if it wasn't None. Nothing is
+	# done with it here, cAsyncXTension in xtension_async uses it to await handlers that are
+	# coroutines
+	#
+	def _handlerReturned( self, workResult):
+		pass
+		
+	#
+	#	_ C O M M A N D   L A N E
+	#
+	# the key used by the dispatcher to keep the commands for a single unit or script in order
+	# while commands for other units are handled in parallel. Commands for units are keyed by the
+	# unique id if we can find the unit, and otherwise by the tag and address. Everything else,
+	# like setUnits and the settings, goes through the interface lane in the order it was received.
+	#
+	def _commandLane( self, workCommand):
+		if workCommand.exists( xtKeyTag) and workCommand.exists( xtKeyAddress):
+			workUnit = self.getUnitFromAddress( workCommand.get( xtKeyTag), workCommand.get( xtKeyAddress))
+			if workUnit != None:
+				return workUnit.uniqueId
+				
+			return workCommand.get( xtKeyTag) + workCommand.get( xtKeyAddress).upper()
+			
+		elif workCommand.exists( xtKeyCommandTarget) and workCommand.exists( xtKeyUniqueId):
+			return workCommand.get( xtKeyUniqueId)
+			
+		return self.kInterfaceLane
+		
+	#
+	#	G E T   W R I T E R   M E T R I C S
+	#
+	# returns a dictionary with the number of packets and writes made by the writer thread
+	# or None if useWriterThread is off
+	#
+	def getWriterMetrics( self):
+		if self._writer == None:
+			return None
+			
+		return self._writer.getMetrics()
+		
+		
+	#
+	#	_ S T O P   W R I T E R
+	#
+	# writes anything still waiting before the socket is closed. After this commands
+	# are written directly by sendCommand again.
+	#
+	def _stopWriter( self):
+		workWriter = self._writer
+		if workWriter == None:
+			return
+			
+		self._writer = None
+		workWriter.stop( 2.0)
+		
+		
+	#
+	#	G E T   S C H E D U L E R
+	#
+	# the one XTScheduler thread shared by every XTDoLater and XTTimer. You can use it for your
+	# own delayed or repeating calls too, see XTScheduler.callLater
+	#
+	def getScheduler( self):
+		if self._scheduler == None:
+			with self._schedulerLock:
+				if self._scheduler == None:
+					self._scheduler = XTScheduler( workers=self.schedulerWorkers)
+					
+		return self._scheduler
+		
+	#
+	#	_ S T O P   S C H E D U L E R
+	#
+	# called after the shutdown handlers have run, anything still waiting to be run is dropped
+	# and nothing scheduled after this will run. 
+	#
+	def _stopScheduler( self):
+		with self._schedulerLock:
+			workScheduler = self._scheduler
+			
+		if workScheduler != None:
+			workScheduler.stop( 2.0)
+			
+		
+	#
+	#	G E T   I O   L O O P
+	#
+	# the one XTIOLoop thread shared by every XTRemoteConnection with useIOLoop set. Returns None
+	# on python 2 where there is no selectors module
+	#
+	def getIOLoop( self):
+		if selectors == None:
+			return None
+			
+		if self._ioLoop == None:
+			with self._schedulerLock:
+				if self._ioLoop == None:
+					self._ioLoop = XTIOLoop()
+					
+		return self._ioLoop
+		
+	def _stopIOLoop( self):
+		with self._schedulerLock:
+			workLoop = self._ioLoop
+			
+		if workLoop != None:
+			workLoop.stop( 2.0)
+			
+			
+	#
+	#	G E T   D I S P A T C H   M E T R I C S
+	#
+	# returns a dictionary with the current and maximum queue depth and the time commands have
+	# spent waiting for a worker. Returns None if dispatchWorkers was not set before startup
+	#
+	def getDispatchMetrics( self):
+		if self._dispatcher == None:
+			return None
+			
+		return self._dispatcher.getMetrics()
+		
+		
+	#
+	#	D O   S H U T D O W N
+	#
+	#	called by the script when we want to be restarted by XTension, this basically
+	# 	just mimics the reception of the shutdown command and all events should trigger based
+	# 	on that and the script will quit, but XTension did not shut it down so it will restart
+	#	it in 5 seconds with the new settings or for whatever other reason.
+	# 	this handler does no logging, you should log the reason why this is happening or
+	#	necessary before you call this.
+	#
+	def doShutdown( self):
+
+		# make a command to pass to the handlers so there is no error
+		shutdownCommand = XTCommand( xtKeyCommand = xtCommandShutdown)
+		
+		if xtCommandShutdown in self._commandHandlers:
+			for workHandler in self._commandHandlers[ xtCommandShutdown]:
+				try:
+					workHandler( shutdownCommand)
+				except Exception as e:
+					XTension.writeLog( "error in doShutdown handler: " + str( e), xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+
+		# now that we are not closing the socket in the handler we registered we should also do it here
+		# paainf RDRW should send the meta data upstream that we are closing both the read and write paths
+		# and so the upstream device should send the appropriate error code that we have been disconnected.
+		# otherwise it can wait the entirety of the TCP timeout value which can be forever, or 2 minutes
+		# whichever comes first.
+		self._stopIOLoop()
+		self._stopScheduler()
+		self._stopWriter()
+		
+		try:
+			self.sock.shutdown( socket.SHUT_RDWR)
+			self.sock.close()
+		except:
+			pass
+			
+		self.ready = False
+
+		sys.exit()
+
+								
+				
+				
+	#
+	#
+	# 	R E C E I V E D   U N I T S 
+	#
+	#
+	#	called when we receive our initial dump of units from XTension 
+	# 	called when XTension sends us either an update to a unit or a new unit
 	# 	manages the loading of the new xtUnit object and placing it into the index
 	# 	will then call the Received New Units callback if any has been specified
 	#
@@ -877,6 +1634,31 @@ class cXTension:
 	
 	
 		myData = xtData(theCommand)	
+		
+		if not self.gotUnits:
+			self._startupMark( 'units parsed')
+			
+		isFullReply = self._unitsRequestId != None and theCommand.get( xtKeyUniqueId) == self._unitsRequestId
+		
+		if isFullReply:
+			self._unitsRequestId = None
+			
+		# only the full list is worth saving or can say which units are gone, until it arrives
+		# anything else is merged as usual
+		if isFullReply and self.useWarmStart and self._warmUnits == None:
+			self._warmUnits = theCommand.getBytes( xtKeyData)
+			self._saveWarmStartLater()
+			
+		if isFullReply and self._reconcilePending:
+			self._reconcilePending = False
+			self._reconcileUnits( myData)
+		else:
+			self._applyData( myData)
+			
+	#
+	# creates or merges the units, scripts and lists in myData
+	#
+	def _applyData( self, myData):
 		newUnits = myData.getAllContainers( "unit")
 				
 		for x in newUnits:
@@ -972,10 +1754,13 @@ class cXTension:
 		# if this is the first time we're being loaded then run the onGotUnits handler if any
 		#
 		if not self.gotUnits:
+			self._startupMark( 'units materialized')
 			self.gotUnits = True
 			
 			if self.onGotUnits != None:
 				self.onGotUnits()
+				
+			self._checkStarted()
 						
 	
 	#
@@ -1098,20 +1883,78 @@ class cXTension:
 	#
 	# sends a command to XTension
 	#
-	def sendCommand( self, theCommand):
+	# pass priority=True for replies that must not wait behind other traffic, like the ping
+	# response. Everything else has to get through the bulkWriteLock first so there is never
+	# more than one ordinary command ahead of a priority one waiting on the writeLock
+	#
+	def sendCommand( self, theCommand, priority=False):
 
 		# debug sends but do NOT do so if its a log command or we get stuck in a loop
 		# until we crash...
 		#if self.debugMode and theCommand.get( xtKeyCommand) != xtCommandWriteLog:
 		#	theCommand._debugLog()
 		
+		rawPacket = theCommand._encode()
+		
+		if rawPacket != None:
+			self._sendPacket( rawPacket, priority)
+			
+			
+	#
+	#	_ S E N D   P A C K E T
+	#
+	# writes an already encoded packet either by way of the writer thread or directly
+	# used by sendCommand and XTCommandTemplate.send. While useReconnect is reconnecting the
+	# packet is held or dropped instead, see _holdPacket
+	#
+	def _sendPacket( self, rawPacket, priority=False):
+	
+		if not self._hostConnected and self._holdPacket( rawPacket, priority):
+			return
+			
+		self._writePacket( rawPacket, priority)
+		
+	#
+	# returns False if the connection is back and the packet should be written after all
+	#
+	def _holdPacket( self, rawPacket, priority):
+		with self._reconnectLock:
+			if self._hostConnected:
+				return False
+				
+			if priority or self.reconnectPolicy == self.kDropPackets:
+				self.packetsDroppedWhileDisconnected += 1
+				return True
+				
+			self._heldPackets.append( rawPacket)
+			self._heldSize += len( rawPacket)
+			
+			while self._heldSize > self.reconnectHoldLimit:
+				self._heldSize -= len( self._heldPackets.popleft())
+				self.packetsDroppedWhileDisconnected += 1
+				
+			return True
+		
+	def _writePacket( self, rawPacket, priority=False):
+	
+		workWriter = self._writer
+		if workWriter != None:
+			workWriter.enqueue( rawPacket, priority)
+			return
+			
+		if not priority:
+			self.bulkWriteLock.acquire()
+			
 		try:
 			self.writeLock.acquire()
-			theCommand.send()
+			self._rawWrite( rawPacket)
 			self.writeLock.release()
 		except:
 			self.writeLock.release()
 			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+		if not priority:
+			self.bulkWriteLock.release()
 		
 		
 	
@@ -1141,7 +1984,6 @@ class cXTension:
 			pass # this just means the connection to XTension has been closed so ignore it
 	
 	
-	
 	#
 	#
 	#	S E T   R U N   S T A T E
@@ -1267,11 +2109,13 @@ class cXTension:
 	#
 	#	G E T   M Y   D A T A
 	#
-	# ask XTension to send us a dictionary for each of our units
+	# ask XTension to send us a dictionary for each of our units. The unique id is returned
+	# in the reply just like with xtCommandJSONRequest, see event_receivedData
 	#
 	def getMyData( self):
 	
-		self.sendCommand( XTCommand( xtKeyCommand=xtCommandGetMyUnits))	
+		self._unitsRequestId = str( uuid.uuid4())
+		self.sendCommand( XTCommand( xtKeyCommand=xtCommandGetMyUnits, xtKeyUniqueId=self._unitsRequestId))	
 	
 	
 	
@@ -1310,9 +2154,15 @@ class cXTension:
 			# right now you can only use the "all" object
 			return
 			
-		workData = xtData( theCommand)
+		if self.useWarmStart and self._warmSettings == None:
+			self._warmSettings = theCommand.getBytes( xtKeyData)
+			self._saveWarmStartLater()
 			
+		self._applySettings( xtData( theCommand))
+		
+	def _applySettings( self, workData):
 		if self.settings == None:
+			self._startupMark( 'settings received')
 			self.settings = workData
 			
 			self.settings.subscribeToChildren( self.settingChildCallback)
@@ -1330,6 +2180,7 @@ class cXTension:
 		self.interfaceId = self.settings.get( xtUnitKeyUniqueId) # in this case a simple string is returned with the value which is better
 		
 		self.gotSettings = True
+		self._checkStarted()
 		
 	
 	
@@ -1441,55 +2292,1147 @@ class cXTension:
 
 #
 #
-#	X T C O M M A N D
+#	X T   P A C K E T   B U F F E R
 #
 #
-# the class for all commands to and from XTension
+# the receive buffer for the pipe to XTension. Data is read straight into a preallocated
+# bytearray with recv_into and complete packets are handed out as memoryview slices of it
+# so a received byte is not copied again before XTCommand._parse gets to it. The read and
+# write offsets just move forward as packets are consumed. When the buffer is emptied they
+# go back to the start, and only the tail of a partial packet is ever moved down to make room.
 #
-# changed the constructor to take **kwds) so that we can setup all the commands from a single
-# instantiation is desired and moved the parsing to a separate command.
+# when the header of a packet says it is larger than the buffer the buffer is grown to fit
+# it and the reads are sized to the rest of that packet so that a large setUnits dump comes
+# in with a few large reads rather than thousands of small ones.
+#
+
+class XTPacketBuffer:
+
+	kHeaderJ = 0x4A # b"J" packet with a uint16 size
+	kHeaderK = 0x4B # b"K" packet with a uint32 size
+	
+	_sizeJ = Struct( "H")
+	_sizeK = Struct( "I")
+
+	def __init__( self, receiveSize=4028, maxReceiveSize=1048576):
+		self.receiveSize = receiveSize
+		self.maxReceiveSize = max( receiveSize, maxReceiveSize)
 		
+		# start with room for a handful of reads, we grow if a packet needs more
+		self.initialSize = max( 65536, receiveSize * 4)
+		self.buffer = bytearray( self.initialSize)
 		
-class XTCommand:
+		self.start = 0 # first byte not yet returned as a packet
+		self.end = 0 # one past the last byte received
+		self.pendingSize = 0 # size of the incomplete packet at self.start if we know it
+		
+	#
+	#	R E C E I V E
+	#
+	# reads whatever is available from the socket into the buffer. Returns the number of 
+	# bytes read which will be 0 when the socket has been closed just like recv
+	#
+	def receive( self, sock):
 	
-	def __init__(self, **kwds):
-		self.values = {}
-		self.isValid = False # will be set to true when we are parsed, ignored for outgoing commands
+		workView = self.getReceiveBuffer()
+		try:
+			count = sock.recv_into( workView, len( workView))
+		finally:
+			workView.release()
+			
+		self.received( count)
+		return count
 		
-		# add in any values sent through the kwds object
-		# optimization just ask for the gobals once and not every time through the loop
+	#
+	#	G E T   R E C E I V E   B U F F E R
+	#
+	# a memoryview of the space the next read should go into, for reading with something other
+	# than a socket like the asyncio BufferedProtocol in xtension_async. Call received with the
+	# number of bytes that were put into it
+	#
+	def getReceiveBuffer( self):
+	
+		readSize = self.receiveSize
 		
-		currentGlobals = globals()
-
-		for key in kwds:
-			workValue = kwds[ key]
-			# the constants for command are used for the kwrgs and so they will come through
-			# as the constant name, so we need to convert them back to the actual value and not the
-			# constant name.
-			
-			if key in currentGlobals:
-				key = currentGlobals[key]
-			#else:
-				#if anything is passed which is not in the globals then we either hard coded the string we want to use
-				# which is fine, or it is an error that will cause problems later so if in debug mode we should
-				# output that this happened though it may not actually be an error
-				#XTension.debugLog( "non-global key (%s) passed to XTComman Constructor" % key, xtLogRed)
-				# actually it seems that there are a lot of these being used, but we can at least verify that they are 4 chars?
+		# if we are in the middle of a large packet then ask for the rest of it at once
+		if self.pendingSize > 0:
+			readSize = min( max( readSize, self.pendingSize - (self.end - self.start)), self.maxReceiveSize)
 			
-			self.set( key, workValue)
+		self._makeRoom( readSize)
+		
+		return memoryview( self.buffer)[ self.end:self.end + readSize]
+		
+	def received( self, count):
+		self.end += count
 		
-
-	#
 	#
-	#	S E T
+	#	N E X T   P A C K E T
 	#
-	# add keyed data to the command
-	# note that all keys must be 4 characters or they will be truncated
-	# all values are converted to strings before sending
+	# returns a memoryview of the next complete packet including its header or None if there
+	# is not a complete packet in the buffer yet. The view is only valid until the next call
+	# to receive so parse it, or copy it, and release it before then.
 	#
+	def nextPacket( self):
+	
+		while True:
+			available = self.end - self.start
+			
+			if available < 3:
+				return None
 		
-	def set( self, key, value):
-
+			packetHeader = self.buffer[ self.start]
+			
+			if packetHeader == self.kHeaderJ:
+				packetSize = self._sizeJ.unpack_from( self.buffer, self.start + 1)[0]
+				headerSize = 3
+			elif packetHeader == self.kHeaderK:
+				if available < 5:
+					return None
+				packetSize = self._sizeK.unpack_from( self.buffer, self.start + 1)[0]
+				headerSize = 5
+			else:
+				packetSize = 0
+				headerSize = 0
+				
+			if packetSize <= headerSize:
+				# an unknown packet header or a size that cannot be right has been received
+				# assuming garbage in the buffer or a malformed packet skip a byte at a time
+				# until we find the next potentially valid header and try reading from there
+				self.start += 1
+				continue
+				
+			# if we do not have enough data to parse the packet yet then just return and wait
+			# for the next read, remembering how big it is so that the reads can be sized for it
+			if available < packetSize:
+				self.pendingSize = packetSize
+				return None
+				
+			self.pendingSize = 0
+			
+			packetStart = self.start
+			self.start += packetSize
+			
+			return memoryview( self.buffer)[ packetStart:packetStart + packetSize]
+			
+	#
+	#	_ M A K E   R O O M
+	#
+	# make sure there is room for readSize bytes after self.end
+	#
+	def _makeRoom( self, readSize):
+	
+		pending = self.end - self.start
+		
+		# everything received has been handed out so just start at the beginning again
+		# and drop any large buffer we grew for an earlier packet
+		if pending == 0:
+			self.start = 0
+			self.end = 0
+			
+			if len( self.buffer) > self.initialSize * 4 and self.pendingSize == 0:
+				self.buffer = bytearray( self.initialSize)
+				
+		if len( self.buffer) - self.end >= readSize:
+			return
+			
+		needed = max( pending + readSize, self.pendingSize)
+		
+		if needed > len( self.buffer):
+			# grow, copying just the partial packet into the new buffer
+			newBuffer = bytearray( max( needed, len( self.buffer) * 2))
+			newBuffer[ :pending] = self.buffer[ self.start:self.end]
+			self.buffer = newBuffer
+		else:
+			# move the partial packet down to the start to make room behind it
+			self.buffer[ :pending] = self.buffer[ self.start:self.end]
+			
+		self.start = 0
+		self.end = pending
+		
+		
+		
+		
+#
+#
+#	X T   C O M M A N D   D I S P A T C H E R
+#
+#
+# a small pool of worker threads that runs the handling of commands received from XTension
+# when cXTension.dispatchWorkers is set. Every command is submitted with a lane key and the
+# commands in a lane are handled one at a time in the order they were submitted, while other
+# lanes are handled in parallel by the other workers. A lane is only ever on one worker so 
+# there is no locking needed by the handlers for a single unit.
+#
+# submit blocks once maxQueued commands are waiting so that a backlog pushes back on the
+# reader, and so on XTension, rather than growing without limit.
+#
+
+class XTCommandDispatcher:
+
+	def __init__( self, handler, workers=4, maxQueued=1000, name='XTension Dispatch'):
+		self.handler = handler
+		self.maxQueued = max( 1, maxQueued)
+		
+		self.lock = threading.Lock()
+		self.workReady = threading.Condition( self.lock)
+		self.spaceReady = threading.Condition( self.lock)
+		self.idle = threading.Condition( self.lock)
+		
+		# lane key -> deque of (command, time queued). A lane is in here for as long as it
+		# has commands waiting or a worker handling one of them
+		self.lanes = {}
+		# lanes that have waiting commands and no worker
+		self.readyLanes = deque()
+		
+		self.stopped = False
+		
+		# metrics
+		self.queueDepth = 0
+		self.maxQueueDepth = 0
+		self.running = 0
+		self.dispatched = 0
+		self.totalWait = 0.0
+		self.maxWait = 0.0
+		self.submitWait = 0.0 # total time the reader spent blocked on a full queue
+		
+		self.threads = []
+		for i in range( workers):
+			workThread = Thread( target=self._worker, args=(), name='%s %s' % (name, i + 1))
+			workThread.daemon = True
+			workThread.start()
+			self.threads.append( workThread)
+	
+	#
+	#	S U B M I T
+	#
+	def submit( self, laneKey, theCommand):
+		with self.lock:
+			if self.queueDepth >= self.maxQueued:
+				startWait = _monotonic()
+				while self.queueDepth >= self.maxQueued and not self.stopped:
+					self.spaceReady.wait()
+					
+				self.submitWait += _monotonic() - startWait
+				
+			if self.stopped:
+				return False
+				
+			workLane = self.lanes.get( laneKey)
+			if workLane == None:
+				workLane = deque()
+				self.lanes[ laneKey] = workLane
+				self.readyLanes.append( laneKey)
+				self.workReady.notify()
+				
+			workLane.append( (theCommand, _monotonic()))
+			
+			self.queueDepth += 1
+			if self.queueDepth > self.maxQueueDepth:
+				self.maxQueueDepth = self.queueDepth
+				
+		return True
+	
+	#
+	#	D R A I N
+	#
+	# waits up to timeout seconds for everything queued so far to be handled
+	# returns True if the queue is empty
+	#
+	def drain( self, timeout=None):
+		endTime = None
+		if timeout != None:
+			endTime = _monotonic() + timeout
+			
+		with self.lock:
+			while self.queueDepth > 0 or self.running > 0:
+				if endTime == None:
+					self.idle.wait()
+				else:
+					remaining = endTime - _monotonic()
+					if remaining <= 0:
+						return False
+					self.idle.wait( remaining)
+					
+		return True
+		
+	#
+	#	S T O P
+	#
+	# workers exit once the work already queued has been handled
+	#
+	def stop( self):
+		with self.lock:
+			self.stopped = True
+			self.workReady.notify_all()
+			self.spaceReady.notify_all()
+			
+	#
+	#	G E T   M E T R I C S
+	#
+	def getMetrics( self):
+		with self.lock:
+			averageWait = 0.0
+			if self.dispatched > 0:
+				averageWait = self.totalWait / self.dispatched
+				
+			return {
+				'workers':			len( self.threads),
+				'queueDepth':		self.queueDepth,
+				'maxQueueDepth':	self.maxQueueDepth,
+				'queueLimit':		self.maxQueued,
+				'running':			self.running,
+				'lanes':			len( self.lanes),
+				'dispatched':		self.dispatched,
+				'averageWait':		averageWait,
+				'maxWait':			self.maxWait,
+				'submitWait':		self.submitWait}
+				
+	
+	def _worker( self):
+		while True:
+			with self.lock:
+				while len( self.readyLanes) == 0 and not self.stopped:
+					self.workReady.wait()
+					
+				if len( self.readyLanes) == 0:
+					# stopped and nothing left to do
+					return
+				
+				laneKey = self.readyLanes.popleft()
+				workLane = self.lanes[ laneKey]
+				theCommand, queuedTime = workLane.popleft()
+				
+				waitTime = _monotonic() - queuedTime
+				self.totalWait += waitTime
+				if waitTime > self.maxWait:
+					self.maxWait = waitTime
+					
+				self.queueDepth -= 1
+				self.running += 1
+				self.dispatched += 1
+				self.spaceReady.notify()
+				
+			try:
+				self.handler( theCommand)
+			except Exception as e:
+				XTension.writeLog( "error in XTCommandDispatcher handling (%s): %s" % (theCommand.get( xtKeyCommand, "no command"), e), xtLogRed)
+				XTension.writeLog( traceback.format_exc(), xtLogRed)
+				
+			with self.lock:
+				self.running -= 1
+				
+				# if more came in for this lane while we were busy then put it back at the end
+				# of the ready list so that one busy unit cannot starve the others
+				if len( workLane) > 0:
+					self.readyLanes.append( laneKey)
+					self.workReady.notify()
+				else:
+					del self.lanes[ laneKey]
+					
+				if self.queueDepth == 0 and self.running == 0:
+					self.idle.notify_all()
+					
+					
+					
+					
+#
+#
+#	X T   C O M M A N D   W R I T E R
+#
+#
+# the thread that writes to the pipe to XTension when cXTension.useWriterThread is set, which
+# it is by default. Commands are encoded in the thread that sends them and appended to one of 
+# two deques without taking any lock. Each time the writer wakes up it takes everything that is
+# waiting, priority packets first, and writes it with a single sendall rather than 3 writes for
+# every command. 
+#
+# flushDelay is how long the writer waits after being woken to let more packets collect before
+# writing. 0 writes as soon as possible and still batches whatever came in while the last write
+# was in progress. A packet is never held for more than flushDelay plus the time of one write.
+#
+# pass writeLock and the writer takes it for every write itself, writeFunc is then called with
+# it held. Whoever replaces the connection can then call discard with the lock held to throw
+# away everything queued for the old one, including a batch the writer has already taken.
+#
+
+class XTCommandWriter:
+
+	def __init__( self, writeFunc, flushDelay=0.0, maxBatch=262144, writeLock=None):
+		self.writeFunc = writeFunc
+		self.flushDelay = flushDelay
+		self.maxBatch = maxBatch
+		self.writeLock = writeLock
+		
+		self.priorityQueue = deque()
+		self.bulkQueue = deque()
+		self.wakeup = threading.Event()
+		
+		self.stopped = False
+		
+		# bumped by discard, a batch taken before that isn't written
+		self.generation = 0
+		
+		# metrics, only changed by the writer thread
+		self.packets = 0
+		self.writes = 0
+		self.bytesWritten = 0
+		self.maxBatchPackets = 0
+		self.packetsDiscarded = 0
+		
+		self.thread = Thread( target=self._writer, args=(), name='XTension Write Thread')
+		self.thread.daemon = True
+		self.thread.start()
+		
+	#
+	#	E N Q U E U E
+	#
+	# deque.append is atomic so any thread can call this without a lock. The event is only set
+	# if it is not already, the writer clears it before it empties the queues so nothing that is
+	# appended after the writer looked can be missed.
+	#
+	def enqueue( self, packet, priority=False):
+		if priority:
+			self.priorityQueue.append( packet)
+		else:
+			self.bulkQueue.append( packet)
+			
+		if not self.wakeup.is_set():
+			self.wakeup.set()
+			
+	#
+	#	F L U S H
+	#
+	# waits up to timeout seconds for everything enqueued so far to be written
+	# returns True if it was
+	#
+	def flush( self, timeout=None):
+		if not self.thread.is_alive():
+			return False
+			
+		flushed = threading.Event()
+		self.enqueue( flushed)
+		flushed.wait( timeout)
+		return flushed.is_set()
+		
+	#
+	#	D I S C A R D
+	#
+	# throws away everything enqueued so far, call with writeLock held. Anything enqueued after
+	# is written as usual. Flushes waiting on what was thrown away are let go
+	#
+	def discard( self):
+		self.generation += 1
+		
+		for workQueue in (self.priorityQueue, self.bulkQueue):
+			while True:
+				try:
+					packet = workQueue.popleft()
+				except IndexError:
+					break
+					
+				if isinstance( packet, bytes):
+					self.packetsDiscarded += 1
+				else:
+					packet.set()
+					
+	#
+	#	S T O P
+	#
+	# writes anything already enqueued and exits the thread
+	#
+	def stop( self, timeout=None):
+		self.stopped = True
+		self.wakeup.set()
+		self.thread.join( timeout)
+		
+	#
+	#	G E T   M E T R I C S
+	#
+	def getMetrics( self):
+		averageBatch = 0.0
+		if self.writes > 0:
+			averageBatch = float( self.packets) / self.writes
+			
+		return {
+			'packets':			self.packets,
+			'writes':			self.writes,
+			'bytes':			self.bytesWritten,
+			'averageBatch':		averageBatch,
+			'maxBatch':			self.maxBatchPackets,
+			'discarded':		self.packetsDiscarded,
+			'waiting':			len( self.priorityQueue) + len( self.bulkQueue)}
+			
+			
+	def _writer( self):
+		while True:
+			self.wakeup.wait()
+			self.wakeup.clear()
+			
+			if self.flushDelay > 0 and not self.stopped:
+				sleep( self.flushDelay)
+				
+			# the packets are taken and the generation noted together so that a discard is
+			# either before all of them or after
+			if self.writeLock != None:
+				with self.writeLock:
+					generation = self.generation
+					batches, flushEvents = self._takeBatches()
+			else:
+				generation = self.generation
+				batches, flushEvents = self._takeBatches()
+				
+			for batch in batches:
+				self._write( batch, generation)
+				
+			for workEvent in flushEvents:
+				workEvent.set()
+				
+			if self.stopped and len( self.priorityQueue) == 0 and len( self.bulkQueue) == 0:
+				return
+				
+	#
+	# everything waiting, priority packets first, in batches of up to maxBatch bytes and the
+	# flush markers that were among them
+	#
+	def _takeBatches( self):
+		batches = []
+		batch = []
+		batchSize = 0
+		flushEvents = []
+		
+		for workQueue in (self.priorityQueue, self.bulkQueue):
+			while True:
+				try:
+					packet = workQueue.popleft()
+				except IndexError:
+					break
+					
+				if not isinstance( packet, bytes):
+					# a flush marker, set it once everything before it is written
+					flushEvents.append( packet)
+					continue
+					
+				batch.append( packet)
+				batchSize += len( packet)
+				
+				if batchSize >= self.maxBatch:
+					batches.append( batch)
+					batch = []
+					batchSize = 0
+					
+		if len( batch) > 0:
+			batches.append( batch)
+			
+		return (batches, flushEvents)
+		
+	def _write( self, batch, generation):
+		if len( batch) == 1:
+			workData = batch[0]
+		else:
+			workData = b"".join( batch)
+			
+		if self.writeLock == None:
+			self._count( batch, workData)
+			self.writeFunc( workData)
+			return
+			
+		with self.writeLock:
+			if generation != self.generation:
+				self.packetsDiscarded += len( batch)
+				return
+				
+			self._count( batch, workData)
+			self.writeFunc( workData)
+			
+	def _count( self, batch, workData):
+		self.packets += len( batch)
+		self.writes += 1
+		if len( batch) > self.maxBatchPackets:
+			self.maxBatchPackets = len( batch)
+			
+		self.bytesWritten += len( workData)
+					
+					
+					
+					
+#
+#
+#	X T   S C H E D U L E R
+#
+#
+# one thread that runs every XTDoLater, XTTimer and anything else that needs to happen later.
+# Calls are kept in a heap ordered by when they are due on the monotonic clock so the thread 
+# only ever wakes for the next one due, or when something is scheduled ahead of it. Get the 
+# shared one from XTension.getScheduler(), it is stopped when XTension shuts us down.
+#
+# the calls are run one at a time by the scheduler thread so they should be quick, anything 
+# that has to wait on a device or the network should start its own thread or hand the work off
+# with callInWorker, which is what XTDoLater and XTTimer do with their actions.
+#
+# cancelled calls are left in the heap and skipped when they come up. A call that is pushed 
+# later with reschedule keeps its place in the heap and is moved when it comes up, so 
+# resetting a timeout over and over, which is what XTDoLater is for, doesn't grow the heap.
+#
+class XTScheduledCall( object):
+
+	__slots__ = ('when', 'callback', 'args', 'cancelled', 'done')
+	
+	def __init__( self, when, callback, args):
+		self.when = when
+		self.callback = callback
+		self.args = args
+		self.cancelled = False
+		self.done = False
+		
+	def isPending( self):
+		return not (self.cancelled or self.done)
+
+
+class XTScheduler:
+
+	def __init__( self, name='XTension Scheduler Thread', workers=2):
+		self._heap = []
+		self._sequence = 0
+		self._cancelledCount = 0
+		self._condition = threading.Condition()
+		self.running = True
+		
+		# the threads for callInWorker, not started until something is handed off
+		self.workers = workers
+		self._workerPool = None
+		
+		# metrics
+		self.callsRun = 0
+		self.maxLateness = 0.0
+		
+		self.thread = Thread( target=self._run, args=(), name=name)
+		self.thread.daemon = True
+		self.thread.start()
+		
+	#
+	#	C A L L   L A T E R
+	#
+	# runs callback( *args) in delay seconds, fractions are fine. Returns an XTScheduledCall
+	# that can be passed to cancel or reschedule
+	#
+	def callLater( self, delay, callback, *args):
+		return self.callAt( _monotonic() + delay, callback, *args)
+		
+	#
+	#	C A L L   A T
+	#
+	# when is a time from the same monotonic clock, see _monotonic
+	#
+	def callAt( self, when, callback, *args):
+		workCall = XTScheduledCall( when, callback, args)
+		
+		with self._condition:
+			if not self.running:
+				workCall.cancelled = True
+				return workCall
+				
+			self._push( workCall)
+			
+		return workCall
+		
+	#
+	#	R E S C H E D U L E
+	#
+	# moves a pending call to delay seconds from now, or schedules it again if it has already
+	# run or been cancelled. Returns the call, which may be a new one
+	#
+	def reschedule( self, workCall, delay):
+		when = _monotonic() + delay
+		
+		with self._condition:
+			if not self.running:
+				return workCall
+				
+			if not workCall.isPending():
+				workCall = XTScheduledCall( when, workCall.callback, workCall.args)
+				self._push( workCall)
+				return workCall
+				
+			if when >= workCall.when:
+				# later than it was, _run will move it when it comes up
+				workCall.when = when
+				return workCall
+				
+			# earlier, the old heap entry is left to be skipped
+			self._cancel( workCall)
+			workCall = XTScheduledCall( when, workCall.callback, workCall.args)
+			self._push( workCall)
+			return workCall
+			
+	#
+	#	C A N C E L
+	#
+	def cancel( self, workCall):
+		if workCall == None:
+			return
+			
+		with self._condition:
+			if workCall.isPending():
+				self._cancel( workCall)
+				
+	#
+	#	S T O P
+	#
+	# drops everything that hasn't run yet and exits the thread. If a call is running now
+	# it is waited for up to timeout seconds unless stop was called from that call.
+	#
+	def stop( self, timeout=None):
+		with self._condition:
+			self.running = False
+			
+			for entry in self._heap:
+				entry[2].cancelled = True
+				
+			self._heap = []
+			self._cancelledCount = 0
+			self._condition.notify()
+			workerPool = self._workerPool
+			
+		if workerPool != None:
+			workerPool.stop()
+			
+		if threading.current_thread() is not self.thread:
+			self.thread.join( timeout)
+			
+	#
+	#	C A L L   I N   W O R K E R
+	#
+	# runs callback() on one of the worker threads instead of the scheduler thread. Calls with
+	# the same laneKey are run one at a time in the order they were handed off, so an object
+	# passing itself never has two running at once. Runs it here if there are no workers
+	#
+	def callInWorker( self, laneKey, callback):
+		if self.workers <= 0:
+			self._runInWorker( callback)
+			return
+			
+		if self._workerPool == None:
+			with self._condition:
+				if not self.running:
+					return
+					
+				if self._workerPool == None:
+					self._workerPool = XTCommandDispatcher( self._runInWorker, self.workers, 10000, 'XTension Scheduler Worker')
+					
+		self._workerPool.submit( laneKey, callback)
+		
+	def _runInWorker( self, callback):
+		# anything still queued when we were stopped is dropped like the calls in the heap
+		if not self.running:
+			return
+			
+		try:
+			callback()
+		except Exception as e:
+			XTension.writeLog( "error in scheduled call %s: %s" % (callback, e), xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+	#
+	#	G E T   M E T R I C S
+	#
+	def getMetrics( self):
+		with self._condition:
+			workerPool = self._workerPool
+			workMetrics = {
+				'pending':			len( self._heap) - self._cancelledCount,
+				'heapSize':			len( self._heap),
+				'callsRun':			self.callsRun,
+				'maxLateness':		self.maxLateness}
+				
+		if workerPool != None:
+			workMetrics[ 'workerPool'] = workerPool.getMetrics()
+			
+		return workMetrics
+				
+				
+	# the lock is held by the caller for these two
+	def _push( self, workCall):
+		self._sequence += 1
+		heapq.heappush( self._heap, [workCall.when, self._sequence, workCall])
+		
+		# only wake the thread if this is now the next one due
+		if self._heap[0][2] is workCall:
+			self._condition.notify()
+			
+	def _cancel( self, workCall):
+		workCall.cancelled = True
+		self._cancelledCount += 1
+		
+		# if most of the heap is cancelled calls throw them out now
+		if self._cancelledCount > 64 and self._cancelledCount > len( self._heap) // 2:
+			self._heap = [x for x in self._heap if not x[2].cancelled]
+			heapq.heapify( self._heap)
+			self._cancelledCount = 0
+		
+		
+	def _run( self):
+		while True:
+			workCall = None
+			
+			with self._condition:
+				while self.running:
+					if len( self._heap) == 0:
+						self._condition.wait()
+						continue
+						
+					entry = self._heap[0]
+					workCall = entry[2]
+					
+					if workCall.cancelled:
+						heapq.heappop( self._heap)
+						self._cancelledCount -= 1
+						workCall = None
+						continue
+						
+					# pushed back by reschedule since it went into the heap
+					if workCall.when > entry[0]:
+						heapq.heapreplace( self._heap, [workCall.when, entry[1], workCall])
+						workCall = None
+						continue
+						
+					delay = workCall.when - _monotonic()
+					if delay > 0:
+						self._condition.wait( delay)
+						workCall = None
+						continue
+						
+					heapq.heappop( self._heap)
+					workCall.done = True
+					break
+					
+				if not self.running:
+					return
+					
+			lateness = -delay
+			if lateness > self.maxLateness:
+				self.maxLateness = lateness
+				
+			self.callsRun += 1
+			
+			try:
+				workCall.callback( *workCall.args)
+			except Exception as e:
+				XTension.writeLog( "error in scheduled call %s: %s" % (workCall.callback, e), xtLogRed)
+				XTension.writeLog( traceback.format_exc(), xtLogRed)
+					
+					
+#
+#
+#	X T   I O   L O O P
+#
+#
+# one thread that waits on every socket and serial port of the XTRemoteConnections and 
+# XTTCPServerConnections that have useIOLoop set, rather than a thread each that wakes up 
+# every second to check if it should quit. Get the shared one from XTension.getIOLoop(), it is
+# stopped when XTension shuts us down.
+#
+# register, modify and unregister must be called in the loop thread. From anywhere else pass
+# what needs doing to callSoon, which wakes the loop to run it. callLater waits on the 
+# XTension scheduler and then runs the call in the loop thread. Anything added with addTicker 
+# has its _ioTick method called about every tickInterval seconds, XTRemoteConnection uses that
+# for socketTimeout.
+#
+# all the callbacks are run one at a time by the loop thread, so like the scheduler they should
+# not block, a slow dataAvailable holds up every other connection.
+#
+class XTIOLoop:
+
+	def __init__( self, name='XTension IO Thread', tickInterval=1.0):
+		self.selector = selectors.DefaultSelector()
+		self.tickInterval = tickInterval
+		self.running = True
+		
+		self._callbacks = deque()
+		self._tickers = []
+		
+		# writing a byte to _wakeWrite wakes the select call to run callbacks
+		self._wakeRead, self._wakeWrite = socket.socketpair()
+		self._wakeRead.setblocking( False)
+		self._wakeWrite.setblocking( False)
+		self._wakePending = False
+		self.selector.register( self._wakeRead, selectors.EVENT_READ, self._drainWakeup)
+		
+		self.thread = Thread( target=self._run, args=(), name=name)
+		self.thread.daemon = True
+		self.thread.start()
+		
+	#
+	#	R E G I S T E R,   M O D I F Y,   U N R E G I S T E R
+	#
+	# callback( fileobj, mask) is called when the fileobj is ready. Only from the loop thread
+	#
+	def register( self, fileobj, events, callback):
+		self.selector.register( fileobj, events, callback)
+		
+	def modify( self, fileobj, events, callback):
+		self.selector.modify( fileobj, events, callback)
+		
+	def unregister( self, fileobj):
+		try:
+			self.selector.unregister( fileobj)
+		except (KeyError, ValueError):
+			pass
+			
+	#
+	#	C A L L   S O O N
+	#
+	# runs callback( *args) in the loop thread as soon as possible, safe from any thread
+	#
+	def callSoon( self, callback, *args):
+		self._callbacks.append( (callback, args))
+		
+		if not self._wakePending and threading.current_thread() is not self.thread:
+			self._wakePending = True
+			try:
+				self._wakeWrite.send( b'x')
+			except socket.error:
+				pass
+				
+	#
+	#	C A L L   L A T E R
+	#
+	# runs callback( *args) in the loop thread in delay seconds. Returns the XTScheduledCall
+	#
+	def callLater( self, delay, callback, *args):
+		return XTension.getScheduler().callLater( delay, self.callSoon, callback, *args)
+		
+	def addTicker( self, theObject):
+		if not theObject in self._tickers:
+			self._tickers.append( theObject)
+			
+	def removeTicker( self, theObject):
+		if theObject in self._tickers:
+			self._tickers.remove( theObject)
+			
+	def isLoopThread( self):
+		return threading.current_thread() is self.thread
+		
+	#
+	#	S T O P
+	#
+	# exits the loop thread. The sockets and ports registered are left for their owners to close
+	#
+	def stop( self, timeout=None):
+		self.running = False
+		self.callSoon( self._noOp)
+		
+		if threading.current_thread() is not self.thread:
+			self.thread.join( timeout)
+			
+	def _noOp( self):
+		pass
+		
+	def _drainWakeup( self, fileobj, mask):
+		try:
+			while self._wakeRead.recv( 4096):
+				pass
+		except socket.error:
+			pass
+			
+		
+	def _run( self):
+		nextTick = _monotonic() + self.tickInterval
+		
+		while self.running:
+			# calls added from the loop thread itself don't wake it so don't wait if there are any
+			if len( self._callbacks) > 0:
+				workTimeout = 0
+			else:
+				workTimeout = max( nextTick - _monotonic(), 0)
+				
+			try:
+				workEvents = self.selector.select( workTimeout)
+			except Exception as e:
+				XTension.writeLog( "error in XTIOLoop select: %s" % e, xtLogRed)
+				sleep( 0.1)
+				continue
+				
+			for key, mask in workEvents:
+				try:
+					key.data( key.fileobj, mask)
+				except Exception as e:
+					XTension.writeLog( "error in XTIOLoop callback %s: %s" % (key.data, e), xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+					
+			# anything that was waiting when we were woken, callbacks added by these
+			# callbacks wait for the next time around
+			self._wakePending = False
+			
+			for i in range( len( self._callbacks)):
+				callback, args = self._callbacks.popleft()
+				try:
+					callback( *args)
+				except Exception as e:
+					XTension.writeLog( "error in XTIOLoop call %s: %s" % (callback, e), xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+					
+			workNow = _monotonic()
+			if workNow >= nextTick:
+				nextTick = workNow + self.tickInterval
+				
+				for workTicker in list( self._tickers):
+					try:
+						workTicker._ioTick( workNow)
+					except Exception as e:
+						XTension.writeLog( "error in XTIOLoop tick %s: %s" % (workTicker, e), xtLogRed)
+						XTension.writeLog( traceback.format_exc(), xtLogRed)
+						
+		self.selector.close()
+		self._wakeRead.close()
+		self._wakeWrite.close()
+					
+					
+#
+#
+#	C O M M A N D   K E Y S   A N D   V A L U E S
+#
+#
+# the kwds passed to XTCommand and friends are usually the names of the constants, like
+# xtKeyCommand=xtCommandOn, and need to be turned back into the value of the constant. That
+# used to be a globals() lookup for every key of every command, now each name is looked up
+# once and remembered along with the padded 4 character key. Plugins can pass any key names
+# so no more than kMaxCommandKeys of them are remembered, the rest are just looked up each time
+#
+
+_commandKeyCache = {}
+kMaxCommandKeys = 1000
+
+def _resolveCommandKey( keyName):
+	try:
+		return _commandKeyCache[ keyName]
+	except KeyError:
+		pass
+		
+	key = globals().get( keyName, keyName)
+	
+	if isPy3 and type( key) == bytes:
+		key = key.decode()
+	
+	# if key is too short then add spaces to pad to 4 chars, too long will be truncated
+	if len( key) != 4:
+		key = (key + "    ")[:4]
+		
+	if len( _commandKeyCache) < kMaxCommandKeys:
+		_commandKeyCache[ keyName] = key
+		
+	return key
+	
+	
+#
+# converts a value to what gets sent to XTension. The common types are a single dictionary
+# lookup rather than working through a chain of type checks for every value
+#
+if isPy3:
+	_commandValueEncoders = {
+		bytes:		lambda value: value,
+		str:		lambda value: value.encode(),
+		int:		lambda value: str( value).encode(),
+		float:		lambda value: str( value).encode(),
+		bool:		lambda value: xtTrue.encode() if value else xtFalse.encode(),
+		tuple:		lambda value: XTension.encodeCommaSeparated( value).encode(),
+		list:		lambda value: XTension.encodeCommaSeparated( value).encode()}
+else:
+	_commandValueEncoders = {
+		str:		lambda value: value,
+		unicode:	lambda value: value.encode( 'utf-8'),
+		int:		lambda value: str( value),
+		long:		lambda value: str( value),
+		float:		lambda value: str( value),
+		bool:		lambda value: xtTrue if value else xtFalse,
+		tuple:		lambda value: XTension.encodeCommaSeparated( value),
+		list:		lambda value: XTension.encodeCommaSeparated( value)}
+	
+def _encodeCommandValue( value):
+	valueEncoder = _commandValueEncoders.get( type( value))
+	if valueEncoder != None:
+		return valueEncoder( value)
+	
+	# allow for passing in xtData objects
+	if type( value) == xtData:
+		return value.save()
+		
+	if isPy3:
+		return str( value).encode()
+	else:
+		return str( value)
+		
+		
+# the packet header, "K" then the uint32 length of the whole packet and the flag byte
+_packetHeaderStruct = Struct( "IB")
+_valueLengthStruct = Struct( "I")
+
+
+#
+#
+#	X T C O M M A N D
+#
+#
+# the class for all commands to and from XTension
+#
+# changed the constructor to take **kwds) so that we can setup all the commands from a single
+# instantiation is desired and moved the parsing to a separate command.
+		
+		
+class XTCommand:
+	
+	def __init__(self, **kwds):
+		self.values = {}
+		self.isValid = False # will be set to true when we are parsed, ignored for outgoing commands
+		
+		# add in any values sent through the kwds object
+
+		for key in kwds:
+			workValue = kwds[ key]
+			# the constants for command are used for the kwrgs and so they will come through
+			# as the constant name, so we need to convert them back to the actual value and not the
+			# constant name. _resolveCommandKey remembers that so it's only looked up once
+			
+			key = _resolveCommandKey( key)
+			#else:
+				#if anything is passed which is not in the globals then we either hard coded the string we want to use
+				# which is fine, or it is an error that will cause problems later so if in debug mode we should
+				# output that this happened though it may not actually be an error
+				#XTension.debugLog( "non-global key (%s) passed to XTComman Constructor" % key, xtLogRed)
+				# actually it seems that there are a lot of these being used, but we can at least verify that they are 4 chars?
+			
+			self.set( key, workValue)
+		
+
+	#
+	#
+	#	T E M P L A T E
+	#
+	# for commands that are sent over and over with the same keys. The key names are looked
+	# up and packed once and each command is then encoded straight into the outgoing packet
+	# without making an XTCommand at all. Pass the keys whose values change as arguments and
+	# any that are always the same as kwds in the same way as to the constructor:
+	#
+	#	myTemplate = XTCommand.template( xtKeyUniqueId, xtKeyValue, xtKeyCommand=xtCommandSetValue)
+	#	myTemplate.send( theUnit.uniqueId, 55)
+	#
+	# see XTCommandTemplate below
+	#
+	@staticmethod
+	def template( *keys, **fixedValues):
+		return XTCommandTemplate( keys, fixedValues)
+		
+		
+	#
+	#
+	#	S E T
+	#
+	# add keyed data to the command
+	# note that all keys must be 4 characters or they will be truncated
+	# all values are converted to strings before sending
+	#
+		
+	def set( self, key, value):
+
 		# if key is too short then add spaces to pad to 4 chars
 		# this should not happen but it will break the command if it does
 		# this will also fix things if the key is longer than 4 chars which would
@@ -1498,31 +3441,16 @@ class XTCommand:
 		if isPy3:
 				
 			# make sure is 4 chars 
-			if len( key) < 4:
+			if len( key) != 4:
 				key = (key + "    ")[:4]
 				
-			# look for a tuple and if that then encode it comma separated
-			
-			if type( value) == tuple or type( value) == list:
-				value = XTension.encodeCommaSeparated( value)
-				
-			if type( value) == bool:
-				if value:
-					value = xtTrue
-				else:
-					value = xtFalse
-			
-			# allow for passing in xtData objects
-			if type( value) == xtData:
-				value = value.save()
-
-
-			# values are always bytes in a command in python3
+			# values are always bytes in a command in python3. tuples and lists are comma
+			# separated, bools are xtTrue or xtFalse and xtData objects are saved
 			if type( value) != bytes:
-				value = str( value).encode()
+				value = _encodeCommandValue( value)
 
 			# but the byte like object into our dictionary
-			self.values[ key[:4]] = value
+			self.values[ key] = value
 			
 		else:	# python 2.7
 			if len( key) < 4:
@@ -1618,8 +3546,25 @@ class XTCommand:
 	def exists( self, key):
 		if isPy3 and type( key) == bytes:
 			key = key.decode()
-			
+
 		return( key in self.values)
+
+
+	#
+	#	G E T   V I E W
+	#
+	# like getBytes but returns a memoryview of the value or None if the key is not in the
+	# command. For a command received from XTension this is a view into the packet so large
+	# values, like the xtKeyData of a setUnits, can be handed to an xtData without a copy
+	#
+	def getView( self, key):
+		if isPy3 and type( key) == bytes:
+			key = key.decode()
+
+		if not key in self.values:
+			return None
+
+		return memoryview( self.values[ key])
 	
 	
 	
@@ -1668,8 +3613,22 @@ class XTCommand:
 	#
 	# called by the XTension.send( theCommand) routine, do not call yourself
 	# writes the raw data of the flattened command to the XTension pipe
+	# in one write rather than the header and the body separately
 	#
 	def send( self):
+		rawPacket = self._encode()
+		
+		if rawPacket != None:
+			XTension._rawWrite( rawPacket)
+			
+			
+	#
+	#	_ E N C O D E
+	#
+	# returns the complete packet, header and all, ready to be written to XTension
+	# or None if the command could not be encoded
+	#
+	def _encode( self):
 	
 		
 		try:
@@ -1736,113 +3695,493 @@ class XTCommand:
 			rawCommand = output.getvalue()
 			
 			
-			output.close()
-
+			output.close()
+
+			totalLen = pack( "IB", len( rawCommand) + 6, 128)
+			
+			return b"K" + totalLen + rawCommand
+
+			
+		except Exception as e:
+			# have to print here as if we are having command errors then we may be not be able to process
+			# another one to send the log message. Though this does mean that the errors may be out of order
+			# as processing from the 2 different queues will make things come in at different times.
+			print( "exception in XTCommand.send: %s" % str( e))
+			print( traceback.format_exc(), xtLogRed)
+			return None
+		
+	#
+	#
+	#	P A R S E
+	#
+	#
+	# parses the packet from the raw data from ThreadedRead
+	#
+	
+	#    Packet Format
+	#	first byte is header will be "J" if internal sizes are uint16 and "K" if internal sizes are uint32
+	# 	most packets will be uint16 unless they contain really large structures like images which wont be
+	# 	often received by the interface, mostly sent by interfaces that are also video sources
+	#
+	#	if type J the next 2 bytes are the total size of the packet as uint16
+	#	if type K the next 4 bytes are the total size of the packet as uint32
+	#
+	#   then begin key/value pairs, read to the end of the packet
+	#		keys are always 4 bytes
+	#		size of value string, if J is a uint16 if K then uint32
+	#		then the value data
+	#		repeat until you run out of data
+	#
+	
+	def _parse( self, rawData):
+
+		
+		if isPy3:
+			input = BytesIO( rawData)
+		else:
+			if isinstance( rawData, memoryview):
+				rawData = rawData.tobytes()
+				
+			input = io.BytesIO( rawData)
+		
+		packetHeader = input.read( 1)
+		if packetHeader == b"J":
+			packetSize = unpack( "H", input.read( 2))[0]
+		elif packetHeader == b"K":
+			packetSize = unpack( "I", input.read( 4))[0]
+		else:
+			print( "XTCommand._parse: unknown packet header (%s)" % packetHeader )
+			return False
+			
+
+		# the next bit is flags and technically tells us if the data in the packet is little endian or not
+		# this is left over from when we were supporting both PPC and Intel based macs. All data at the moment
+		# is from the same CPU so this should not ever be necessary
+		
+		packetFlag = input.read( 1)
+		
+		# now loop and get the key value 
+		
+		while True:
+			if isPy3:
+				# keys should always be strings, so decode to an str
+				thisKey = input.read( 4).decode()
+			else:
+				# python 2.7 will just use the str returned from the read method
+				thisKey = input.read( 4)
+			
+			# this will return an empty string upon EOF
+			if len( thisKey) == 0:
+				break
+			
+			
+			#
+			#	two different value headers for 2 different size fields
+			if packetHeader == b'J':
+				thisDataSize = unpack( "H", input.read( 2))[0]
+			elif packetHeader ==b'K':
+				thisDataSize = unpack( "I", input.read( 4))[0]
+			else:
+				# this should not happen as the header is pre-validated before calling this
+				return( False)
+			
+			#
+			# no post processing on values in either python type
+			# values are left as bytes like objects in py3 and raw str types in py2
+			self.values[ thisKey] = input.read( thisDataSize)
+				
+		
+		input.close()
+		self.isValid = True
+
+		
+		return True
+		
+	
+	
+	
+	
+	
+	
+	
+	
+#
+#
+#	X T   P A R S E D   C O M M A N D
+#
+#
+# the commands received from XTension. Rather than copying every value out of the packet
+# when it is read, _parse only makes a table of where each value is in the packet and the
+# values are sliced out the first time they are asked for. Most commands are only routed by
+# their tag and address or target and unique id and most of the rest of the values are never
+# looked at, or are only handed to an xtData by way of getView
+#
+
+class XTParsedCommand( XTCommand):
+
+	# the key and value size that start every value for the 2 packet types
+	# and where the first key starts
+	_packetTypes = {
+		b"J":	(Struct( "4sH"), 4),
+		b"K":	(Struct( "4sI"), 6)}
+		
+	# the raw 4 bytes of every key seen so far and the key as we use it
+	_keyNames = {}
+
+	#
+	#	_ P A R S E
+	#
+	# rawData is copied once if it's not already bytes, the receive buffer is reused
+	# as soon as the packet is parsed
+	#
+	def _parse( self, rawData):
+	
+		if isinstance( rawData, memoryview):
+			rawData = rawData.tobytes()
+		elif type( rawData) != bytes:
+			rawData = bytes( rawData)
+			
+		packetType = self._packetTypes.get( rawData[:1])
+		
+		if packetType == None:
+			print( "XTCommand._parse: unknown packet header (%s)" % rawData[:1])
+			return False
+			
+		keyStruct, keyStart = packetType
+		unpackKey = keyStruct.unpack_from
+		keyLength = keyStruct.size
+		keyNames = self._keyNames
+		
+		valueIndex = {}
+		packetEnd = len( rawData)
+		
+		while keyStart < packetEnd:
+		
+			valueStart = keyStart + keyLength
+			
+			if valueStart > packetEnd:
+				print( "XTCommand._parse: packet truncated in key header")
+				return False
+				
+			rawKey, valueSize = unpackKey( rawData, keyStart)
+			
+			thisKey = keyNames.get( rawKey)
+			if thisKey == None:
+				thisKey = rawKey
+				if isPy3:
+					thisKey = rawKey.decode()
+				keyNames[ rawKey] = thisKey
+				
+			valueEnd = valueStart + valueSize
+			
+			if valueEnd > packetEnd:
+				print( "XTCommand._parse: packet truncated in value for key (%s)" % thisKey)
+				return False
+				
+			valueIndex[ thisKey] = (valueStart, valueEnd)
+			keyStart = valueEnd
+			
+		self.values = XTCommandValues( rawData, valueIndex)
+		self.isValid = True
+		
+		return True
+		
+		
+	#
+	# the same as for XTCommand but with one lookup in the packet rather than
+	# checking for the key and then getting it
+	#
+	def get( self, key, defaultValue=None):
+		if not isPy3:
+			return XTCommand.get( self, key, defaultValue)
+			
+		if type( key) == bytes:
+			key = key.decode()
+			
+		workValue = self.values.lookup( key)
+		
+		if workValue == None:
+			return defaultValue
+			
+		return workValue.decode()
+		
+		
+	def getBytes( self, key, defaultValue=None):
+		if isPy3 and type( key) == bytes:
+			key = key.decode()
+			
+		workValue = self.values.lookup( key)
+		
+		if workValue == None:
+			return defaultValue
+			
+		return workValue
+		
+		
+	#
+	#	G E T   V I E W
+	#
+	# returns a view directly into the packet without copying the value
+	#
+	def getView( self, key):
+		if isPy3 and type( key) == bytes:
+			key = key.decode()
+			
+		return self.values.getView( key)
+		
+		
+		
+		
+#
+#
+#	X T   C O M M A N D   V A L U E S
+#
+#
+# stands in for the values dictionary of an XTParsedCommand. Looks like a dict to anything
+# that uses the values directly, but values are only sliced out of the packet when they are
+# asked for. Anything that changes the values or wants all of them at once turns it into a
+# regular dict first.
+#
+
+class XTCommandValues:
+
+	def __init__( self, packet, valueIndex):
+		self.packet = packet
+		self.valueIndex = valueIndex
+		self.loaded = {}
+		
+	#
+	# returns the value or None if it's not in the command
+	#
+	def lookup( self, key):
+		workValue = self.loaded.get( key)
+		
+		if workValue == None and self.valueIndex != None:
+			valueRange = self.valueIndex.get( key)
+			
+			if valueRange != None:
+				workValue = self.packet[ valueRange[0]:valueRange[1]]
+				self.loaded[ key] = workValue
+				
+		return workValue
+		
+	def _materialize( self):
+		if self.valueIndex != None:
+			for key in self.valueIndex:
+				if not key in self.loaded:
+					valueStart, valueEnd = self.valueIndex[ key]
+					self.loaded[ key] = self.packet[ valueStart:valueEnd]
+					
+			self.valueIndex = None
+			self.packet = None
+			
+		return self.loaded
+		
+	def getView( self, key):
+		if self.valueIndex != None and key in self.valueIndex:
+			valueStart, valueEnd = self.valueIndex[ key]
+			return memoryview( self.packet)[ valueStart:valueEnd]
+			
+		if key in self.loaded:
+			return memoryview( self.loaded[ key])
+			
+		return None
+		
+	def __contains__( self, key):
+		if key in self.loaded:
+			return True
+			
+		return self.valueIndex != None and key in self.valueIndex
+		
+	def __getitem__( self, key):
+		workValue = self.lookup( key)
+		
+		if workValue == None:
+			raise KeyError( key)
+			
+		return workValue
+		
+	def get( self, key, defaultValue=None):
+		workValue = self.lookup( key)
+		
+		if workValue == None:
+			return defaultValue
+			
+		return workValue
+		
+	def __setitem__( self, key, value):
+		self._materialize()[ key] = value
+		
+	def __delitem__( self, key):
+		del self._materialize()[ key]
+		
+	def pop( self, key, *args):
+		return self._materialize().pop( key, *args)
+		
+	def __len__( self):
+		if self.valueIndex != None:
+			return len( self.valueIndex)
 			
-			XTension._rawWrite( b"K")
-			totalLen = pack( "IB", len( rawCommand) + 6, 128)
-			XTension._rawWrite( totalLen)
+		return len( self.loaded)
+		
+	def __iter__( self):
+		return iter( self._materialize())
+		
+	def keys( self):
+		return self._materialize().keys()
+		
+	def items( self):
+		return self._materialize().items()
+		
+	def values( self):
+		return self._materialize().values()
+		
+		
+		
+		
+#
+#
+#	X T   C O M M A N D   T E M P L A T E
+#
+#
+# made by XTCommand.template( ...). Holds the already packed fixed part of the command and the 
+# packed keys for the values that change. encode( *values, **extraValues) returns the finished
+# packet ready to be written to XTension, send( ...) sends it and command( ...) returns a regular
+# XTCommand with the same values if you need one.
+#
+# extraValues are added the same as kwds to the XTCommand constructor. A key already in the
+# template is not sent twice, the value given to the template wins.
+#
 
-			XTension._rawWrite( rawCommand)
+class XTCommandTemplate:
 
+	def __init__( self, keys, fixedValues):
+		self.keys = tuple( _resolveCommandKey( key) for key in keys)
+		self.fixedValues = {}
+		
+		fixedPart = []
+		
+		for keyName in fixedValues:
+			key = _resolveCommandKey( keyName)
+			value = _encodeCommandValue( fixedValues[ keyName])
+			self.fixedValues[ key] = value
 			
-		except Exception as e:
-			# have to print here as if we are having command errors then we may be not be able to process
-			# another one to send the log message. Though this does mean that the errors may be out of order
-			# as processing from the 2 different queues will make things come in at different times.
-			print( "exception in XTCommand.send: %s" % str( e))
-			print( traceback.format_exc(), xtLogRed)
+			fixedPart.append( self._packKey( key))
+			fixedPart.append( _valueLengthStruct.pack( len( value)))
+			fixedPart.append( value)
+			
+		self.fixedPart = b"".join( fixedPart)
+		self.packedKeys = tuple( self._packKey( key) for key in self.keys)
+		
+		# keys that are not added again from the extraValues
+		self.templateKeys = frozenset( self.keys) | frozenset( self.fixedValues)
+		
+		
+	def _packKey( self, key):
+		if isPy3:
+			return key.encode()
+		return key
+		
 		
 	#
+	#	E N C O D E
 	#
-	#	P A R S E
+	def encode( self, *values, **extraValues):
+		if len( values) != len( self.keys):
+			raise TypeError( "XTCommandTemplate expected %s values, got %s" % (len( self.keys), len( values)))
+			
+		# leave room for the header which is filled in below once the size is known
+		output = bytearray( 6)
+		output[0] = 0x4B # K
+		output += self.fixedPart
+		
+		lengthPack = _valueLengthStruct.pack
+		
+		for packedKey, value in zip( self.packedKeys, values):
+			if type( value) != bytes:
+				value = _encodeCommandValue( value)
+				
+			output += packedKey
+			output += lengthPack( len( value))
+			output += value
+			
+		if extraValues:
+			extraKeys = {}
+			for keyName in extraValues:
+				key = _resolveCommandKey( keyName)
+				if not key in self.templateKeys:
+					extraKeys[ key] = extraValues[ keyName]
+					
+			for key in extraKeys:
+				value = extraKeys[ key]
+				if type( value) != bytes:
+					value = _encodeCommandValue( value)
+					
+				output += self._packKey( key)
+				output += lengthPack( len( value))
+				output += value
+				
+		_packetHeaderStruct.pack_into( output, 1, len( output), 128)
+		
+		return bytes( output)
+		
+		
 	#
+	#	S E N D
 	#
-	# parses the packet from the raw data from ThreadedRead
+	# encodes and sends the command to XTension, pass priority=True the same as
+	# to XTension.sendCommand to have it written ahead of other waiting commands
 	#
-	
-	#    Packet Format
-	#	first byte is header will be "J" if internal sizes are uint16 and "K" if internal sizes are uint32
-	# 	most packets will be uint16 unless they contain really large structures like images which wont be
-	# 	often received by the interface, mostly sent by interfaces that are also video sources
+	def send( self, *values, **extraValues):
+		priority = extraValues.pop( 'priority', False)
+		
+		try:
+			rawPacket = self.encode( *values, **extraValues)
+		except Exception as e:
+			XTension.writeLog( "error encoding XTCommandTemplate: %s" % e, xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			return
+			
+		XTension._sendPacket( rawPacket, priority)
+		
+		
 	#
-	#	if type J the next 2 bytes are the total size of the packet as uint16
-	#	if type K the next 4 bytes are the total size of the packet as uint32
+	#	C O M M A N D
 	#
-	#   then begin key/value pairs, read to the end of the packet
-	#		keys are always 4 bytes
-	#		size of value string, if J is a uint16 if K then uint32
-	#		then the value data
-	#		repeat until you run out of data
+	# returns an XTCommand with the same values that encode would send
 	#
-	
-	def _parse( self, rawData):
-
-		
-		if isPy3:
-			input = BytesIO( rawData)
-		else:
-			input = io.BytesIO( rawData)
+	def command( self, *values, **extraValues):
+		workCommand = XTCommand( **extraValues)
 		
-		packetHeader = input.read( 1)
-		if packetHeader == b"J":
-			packetSize = unpack( "H", input.read( 2))[0]
-		elif packetHeader == b"K":
-			packetSize = unpack( "I", input.read( 4))[0]
-		else:
-			print( "XTCommand._parse: unknown packet header (%s)" % packetHeader )
-			return False
+		for key in self.fixedValues:
+			workCommand.values[ key] = self.fixedValues[ key]
 			
-
-		# the next bit is flags and technically tells us if the data in the packet is little endian or not
-		# this is left over from when we were supporting both PPC and Intel based macs. All data at the moment
-		# is from the same CPU so this should not ever be necessary
+		for key, value in zip( self.keys, values):
+			workCommand.set( key, value)
+			
+		return workCommand
 		
-		packetFlag = input.read( 1)
 		
-		# now loop and get the key value 
 		
-		while True:
-			if isPy3:
-				# keys should always be strings, so decode to an str
-				thisKey = input.read( 4).decode()
-			else:
-				# python 2.7 will just use the str returned from the read method
-				thisKey = input.read( 4)
-			
-			# this will return an empty string upon EOF
-			if len( thisKey) == 0:
-				break
-			
-			
-			#
-			#	two different value headers for 2 different size fields
-			if packetHeader == b'J':
-				thisDataSize = unpack( "H", input.read( 2))[0]
-			elif packetHeader ==b'K':
-				thisDataSize = unpack( "I", input.read( 4))[0]
-			else:
-				# this should not happen as the header is pre-validated before calling this
-				return( False)
-			
-			#
-			# no post processing on values in either python type
-			# values are left as bytes like objects in py3 and raw str types in py2
-			self.values[ thisKey] = input.read( thisDataSize)
-				
 		
-		input.close()
-		self.isValid = True
+		
+# all the sizes in an xtData are uint32
+_xtDataSizeStruct = Struct( "I")
 
+# values and names in an xtData are utf-8 bytes
+def _xtDataBytes( value):
+	if type( value) == bytearray:
+		return bytes( value)
 		
-		return True
+	if isPy3:
+		if type( value) != str:
+			value = str( value)
+		return value.encode( 'utf-8')
 		
-	
-	
-	
-	
-	
-	
+	if type( value) == unicode:
+		return value.encode( 'utf-8')
+		
+	return str( value)
 	
 	
 	#
@@ -1856,7 +4195,16 @@ class XTCommand:
 	
 	
 		
-class xtData:
+class xtData( object):
+
+	# there can be tens of thousands of these in a plugin with access to the whole database
+	# so they have a fixed layout rather than a dict each. __dict__ is still included so that
+	# anything setting it's own attributes on one keeps working, it isn't created unless it is used.
+	# __weakref__ is there so that they can still be weakly referenced like any other object
+	__slots__ = ('containers', 'hasChanges', '_name', 'uuid', 'values', 'parent',
+		'_subscribedToAll', '_subscribers', '_subscribedToChildren', '_subscribedByList',
+		'_containersByName', '_containersByUUID', '_indexedCount', '_decodeCache', '_floatCache',
+		'__dict__', '__weakref__')
 	
 	kTrue = 'True'
 	kFalse = 'False'
@@ -1871,6 +4219,21 @@ class xtData:
 	kNamedTypePrefix = '_typ_'
 	kNamedTypeUUID = '_typeuuid_'
 	
+	# the header at the start of every object, the label, version, byte order and 2 spare bytes
+	kBinaryFileHeader = kBinaryHeaderLabel + kBinaryStringVersion + pack( "B", 76) + b'  '
+	
+	# the raw key bytes to key, key to value header and key to type key for every key seen so far
+	# no more than kMaxCachedKeys of each are remembered
+	_keyNames = {}
+	_keyHeaders = {}
+	_typeKeys = {}
+	kMaxCachedKeys = 10000
+	
+	# short values, the type tags and things like True, False and 0, are shared by every object
+	# that has them rather than each unit holding it's own copy. See _decode
+	_sharedValues = {}
+	kMaxSharedValueLength = 8
+	
 
 	kNamedTypeBinary = b'bin'
 	kNamedTypeBoolean = b'boo'
@@ -1895,14 +4258,28 @@ class xtData:
 	def __init__(self, initialData=None):
 		self.containers = []
 		self.hasChanges = False
-		self.name = ''
-		self.subscribedToAll = []
-		self.subscribers = {}
-		self.subscribedToChildren = {}
+		self._name = ''
 		self.uuid = 0
 		self.values = {}
 		self.parent = None
 		
+		# the subscription lists and dicts are not created until someone subscribes, most
+		# objects never have any. See the subscribers property and friends below
+		self._subscribedToAll = None
+		self._subscribers = None
+		self._subscribedToChildren = None
+		self._subscribedByList = None
+		
+		# see _containerIndexes
+		self._containersByName = None
+		self._containersByUUID = None
+		self._indexedCount = 0
+		
+		# key:(raw value, value as returned by get) see get and getFloat
+		# these are also not created until the first get
+		self._decodeCache = None
+		self._floatCache = None
+		
 		# added ability to send all the changes to a subscriber as one list
 		# so that you dont have to do hacks like creating a callback thread to see what
 		# all the values are and so forth. So in these cases all the changes that are received will
@@ -1914,19 +4291,50 @@ class xtData:
 		# if you make local changes though. Those are still strictly handled by the original 
 		# hooks into get/set
 		
-		self.subscribedByList = {}
-		
 		
 		
-		if initialData:
-			workData = ''
-			if isinstance( initialData, str):
+		if initialData != None:
+			workData = None
+			if isinstance( initialData, (bytes, bytearray, memoryview)):
 				workData = initialData
 			elif isinstance( initialData, XTCommand):
-				workData = initialData.getBytes( xtKeyData) # use get bytes to parse the non-converted data, not utf8!
+				workData = initialData.getView( xtKeyData) # use the raw data, not utf8! and without copying it
 		
-			if not workData == '':
+			if workData != None and len( workData) > 0:
 				self._parse( workData)
+				
+	#
+	#	SUBSCRIBERS, SUBSCRIBED TO ALL, SUBSCRIBED TO CHILDREN, SUBSCRIBED BY LIST
+	#
+	# these used to be created for every object in __init__ but with thousands of units almost
+	# all of them stay empty. They are created the first time they are asked for so existing code
+	# that uses them directly still works, anything here that only needs to look at them checks
+	# the underscore version for None first so that looking doesn't create them.
+	#
+	@property
+	def subscribers( self):
+		if self._subscribers == None:
+			self._subscribers = {}
+		return self._subscribers
+		
+	@property
+	def subscribedToAll( self):
+		if self._subscribedToAll == None:
+			self._subscribedToAll = []
+		return self._subscribedToAll
+		
+	@property
+	def subscribedToChildren( self):
+		if self._subscribedToChildren == None:
+			self._subscribedToChildren = {}
+		return self._subscribedToChildren
+		
+	@property
+	def subscribedByList( self):
+		if self._subscribedByList == None:
+			self._subscribedByList = {}
+		return self._subscribedByList
+		
 	#
 	#	string conversion handler provides the raw encoded data for setting to 
 	# 	a command object.
@@ -2017,24 +4425,100 @@ class xtData:
 		
 
 		# return default if the key is not in our values object
-		if key not in self.values:
+		rawValue = self.values.get( key)
+		if rawValue == None:
 			return( default)
 
-
+		# the value is only converted the first time it is asked for, after that it
+		# comes from the _decodeCache for as long as the raw value is the same object.
+		# set, remove and merge also drop it from the cache when they change it
+		# the cache itself isn't created until something is read
+		decodeCache = self._decodeCache
+		if decodeCache == None:
+			decodeCache = self._decodeCache = {}
+			
+		cachedValue = decodeCache.get( key)
+		
+		if cachedValue == None or cachedValue[0] is not rawValue:
+			cachedValue = (rawValue, self._decodeValue( key, rawValue))
+			decodeCache[ key] = cachedValue
+			
+		# colors are returned as a list, don't let the caller change the one in the cache
+		if type( cachedValue[1]) == list:
+			return list( cachedValue[1])
+			
+		return cachedValue[1]
+		
+		
+	#
+	#	GET FLOAT
+	#
+	# the same as xtFloat( self.get( key, default)) but the float is cached the same
+	# way as the value in get so that repeated calls for an unchanged value, like XTUnit.getValue
+	# in a tight loop, don't convert it again every time
+	#
+	def getFloat( self, key, default=0.0):
+		rawValue = self.values.get( key)
+		if rawValue == None:
+			return xtFloat( default)
+			
+		floatCache = self._floatCache
+		if floatCache == None:
+			floatCache = self._floatCache = {}
+			
+		cachedValue = floatCache.get( key)
+		
+		if cachedValue == None or cachedValue[0] is not rawValue:
+			cachedValue = (rawValue, xtFloat( self.get( key, default)))
+			floatCache[ key] = cachedValue
+			
+		return cachedValue[1]
+		
+		
+	#
+	# drops any cached conversions for the key, call this whenever the value or its type are changed
+	#
+	def _invalidate( self, key):
+		if self._decodeCache != None:
+			self._decodeCache.pop( key, None)
+			
+		if self._floatCache != None:
+			self._floatCache.pop( key, None)
+		
+		
+	#
+	# the name of the entry that holds the type for the key
+	#
+	def _typeKey( self, key):
+		typeKey = self._typeKeys.get( key)
+		
+		if typeKey == None:
+			typeKey = self.kNamedTypePrefix + key
+			if len( self._typeKeys) < self.kMaxCachedKeys:
+				self._typeKeys[ key] = typeKey
+				
+		return typeKey
+		
+		
+	#
+	# converts the raw value to its type for get
+	#
+	def _decodeValue( self, key, rawValue):
 		
 		# if requesting the uniqueID then always return it as a string
 		if key == xtUnitKeyUniqueId:
 			if isPy3:
-				return self.values[ xtUnitKeyUniqueId].decode()
+				return rawValue.decode()
 			else:
-				return self.values[ xtUnitKeyUniqueId]
+				return rawValue
 			
 		
 		intType = None # for converting to the proper type
 		
-		if (self.kNamedTypePrefix + key) in self.values:
+		typeKey = self._typeKey( key)
+		if typeKey in self.values:
 			#we have a type stored in the value dict so use that to type it and return the correct type
-			intType = self.values[ self.kNamedTypePrefix + key]
+			intType = self.values[ typeKey]
 			
 			if isPy3 and type( intType) == bytes:
 				intType = intType.decode()
@@ -2050,10 +4534,10 @@ class xtData:
 		#
 		
 		if intType == self.kNamedTypeBinary:
-			return( self.values[ key])
+			return( rawValue)
 			
 		# get the value and convert to str type for python 3
-		workValue = self.values[ key]		
+		workValue = rawValue		
 		try:
 			workValue = workValue.decode()
 		except:
@@ -2071,7 +4555,7 @@ class xtData:
 			# py2.7 need to return a unicode string
 			#return( self.values[ key].encode( 'utf-8'))
 			
-			workValue = self.values[ key]
+			workValue = rawValue
 			
 			if type( workValue) != unicode:
 				return unicode( workValue, 'utf-8')
@@ -2160,7 +4644,7 @@ class xtData:
 	#
 	def set( self, key, value, **kwargs):
 		
-		typeKey = self.kNamedTypePrefix + key
+		typeKey = self._typeKey( key)
 		typeVal = self.kNamedTypeString
 		adjustedVal = value		
 
@@ -2284,6 +4768,7 @@ class xtData:
 		
 		# finally put the value into our dictionary object
 		self.values[ key] = adjustedVal
+		self._invalidate( key)
 	
 	
 	
@@ -2314,17 +4799,106 @@ class xtData:
 			
 		newContainer.parent = self
 		self.containers.append( newContainer)
+		
+		# keep the indexes up to date if they were before this one was added, removeContainer
+		# and renaming a container throw them away so a remove and insert rebuilds them
+		if self._containersByName != None and self._indexedCount == len( self.containers) - 1:
+			self._indexContainer( newContainer)
+			self._indexedCount += 1
+			
 		#self.subscribersNotify( newContainer.name, newContainer)
 		self.notifyChildrenSubscribers( newContainer, False)
 				
 	
+	#
+	#	REMOVE CONTAINER
+	#
+	def removeContainer( self, theContainer):
+		for i in range( len( self.containers)):
+			if self.containers[ i] is theContainer:
+				del( self.containers[ i])
+				theContainer.parent = None
+				self.containersChanged()
+				return True
+				
+		return False
+		
+	#
+	#	CONTAINERS CHANGED
+	#
+	# if you change self.containers yourself rather than with insertContainer and removeContainer
+	# call this after so the indexes below are rebuilt the next time they're used
+	#
+	def containersChanged( self):
+		self._containersByName = None
+		self._containersByUUID = None
+		
+	#
+	#	NAME
+	#
+	# renaming a container moves it in it's parent's name index so the parent's indexes are
+	# thrown away when it changes
+	#
+	@property
+	def name( self):
+		return self._name
+		
+	@name.setter
+	def name( self, newName):
+		if self.parent != None and self.parent._containersByName != None and newName != self._name:
+			self.parent.containersChanged()
+			
+		self._name = newName
+		
+	#
+	#	CONTAINER INDEXES
+	#
+	# containers are indexed by name, as a list in the same order as self.containers, and
+	# by uuid. The indexes are built the first time they are needed after a _parse and kept
+	# up to date by insertContainer after that. removeContainer, renaming a container and
+	# containersChanged throw them away to be rebuilt. A container appended to self.containers
+	# directly is still caught by the count not matching. Objects that are never searched, like
+	# the units themselves, never have them at all.
+	#
+	def _containerIndexes( self):
+		if self._containersByName == None or self._indexedCount != len( self.containers):
+			self._containersByName = {}
+			self._containersByUUID = {}
+			
+			for x in self.containers:
+				self._indexContainer( x)
+				
+			self._indexedCount = len( self.containers)
+			
+	def _indexContainer( self, theContainer):
+		workList = self._containersByName.get( theContainer.name)
+		if workList == None:
+			self._containersByName[ theContainer.name] = [theContainer]
+		else:
+			workList.append( theContainer)
+			
+		# the first one with the uuid is the one that's found, the same as searching the list
+		if not theContainer.uuid in self._containersByUUID:
+			self._containersByUUID[ theContainer.uuid] = theContainer
+	
 	
 	#
 	#	GET CONTAINER
 	#
-	
+	# index starts at 1 for the first container with the name
+	#
 	def getContainer( self, key, index):
+	
+		if index >= 1:
+			self._containerIndexes()
+			workList = self._containersByName.get( key)
+			
+			if workList == None or index > len( workList):
+				return( None)
+				
+			return( workList[ index - 1])
 		
+		# this is how index 0 has always worked
 		count = 0
 		for x in self.containers:
 			if x.name == key:
@@ -2340,12 +4914,8 @@ class xtData:
 	#
 		
 	def getContainerCount( self, key):
-		count = 0
-		for x in self.containers:
-			if x.name == key:
-				count += 1
-			
-		return( count)
+		self._containerIndexes()
+		return( len( self._containersByName.get( key, ())))
 	
 	
 	#
@@ -2354,12 +4924,8 @@ class xtData:
 	#	that contain a specific key
 	#
 	def getAllContainers( self, key):
-		work = []
-		for x in self.containers:
-			if x.name == key:
-				work.append( x)
-			
-		return( work)
+		self._containerIndexes()
+		return( list( self._containersByName.get( key, ())))
 	
 	#
 	#	CONTAINERS WITH VALUE
@@ -2367,11 +4933,16 @@ class xtData:
 	#	all the containers where a specific key is equal to a specific value
 	#
 	def containersWithValue( self, containerKey, keyToCompare, value):
+		if containerKey == "*":
+			searchList = self.containers
+		else:
+			self._containerIndexes()
+			searchList = self._containersByName.get( containerKey, ())
+			
 		work = []
-		for x in self.containers:
-			if x.name == containerKey or containerKey == "*":
-				if x.get( keyToCompare) == value:
-					work.append( x)
+		for x in searchList:
+			if x.get( keyToCompare) == value:
+				work.append( x)
 					
 		return( work)
 		
@@ -2382,11 +4953,8 @@ class xtData:
 	# the merge data is for.
 	#
 	def containerByUUID( self, theUUID):
-		for x in self.containers:
-			if x.uuid == theUUID:
-
-
-				return x
+		self._containerIndexes()
+		return self._containersByUUID.get( theUUID)
 	
 	
 	#
@@ -2404,8 +4972,8 @@ class xtData:
 	#	see above
 	#
 	def unsubscribeToChildren( self, subscriber):
-		if subscriber in self.subscribedToChildren:
-			del( self.subscribedToChildren)
+		if self._subscribedToChildren != None and subscriber in self._subscribedToChildren:
+			del( self._subscribedToChildren[ subscriber])
 			
 	#
 	#	HAS CHILD SUBSCRIBERS
@@ -2419,7 +4987,7 @@ class xtData:
 	
 	def hasChildrenSubscribers( self):
 		# if we have child subscribers then return true
-		if len( self.subscribedToChildren) > 0:
+		if self._subscribedToChildren:
 			return True
 		
 		# if we do not have a parent and no subscribers then false
@@ -2427,7 +4995,7 @@ class xtData:
 			return False
 		
 		# if we do have a parent, but no subscribers ourselves then pass it downstream
-		return self.parent.hasChildSubscribers()
+		return self.parent.hasChildrenSubscribers()
 		
 			
 	
@@ -2451,7 +5019,7 @@ class xtData:
 			if not thisKey in self.subscribedByList:
 				self.subscribedByList[ thisKey] = [(subscriber, tag)]
 			else:
-				current = self.subscribeByList[ thisKey]
+				current = self.subscribedByList[ thisKey]
 				currentIndex = self.leftIndexOf( current, subscriber)
 				
 				if currentIndex == -1:
@@ -2465,14 +5033,17 @@ class xtData:
 	
 	def unsubscribeForList( self, keys, subscriber):
 		if type( keys) != list and type( keys) != tuple:
-			key = [keys]
+			keys = [keys]
+			
+		if self._subscribedByList == None:
+			return
 			
 		for thisKey in keys:
-			if not thisKey in self.subscribedByList:
+			if not thisKey in self._subscribedByList:
 				# no one is subscribed for that key
 				continue
 			
-			current = self.subscribedByList
+			current = self._subscribedByList[ thisKey]
 			currentIndex = self.leftIndexOf( current, subscriber)
 			
 			if currentIndex == -1:
@@ -2483,7 +5054,7 @@ class xtData:
 			# and if that is the last person subscribed to this key
 			# then also remove the entire key entry
 			if len( current) == 0:
-				del( self.subscribedByList)
+				del( self._subscribedByList[ thisKey])
 
 
 	#
@@ -2502,12 +5073,15 @@ class xtData:
 			keys = [keys]
 		
 		
+		if self._subscribers == None:
+			return
+			
 		for thisKey in keys:
-			if not thisKey in self.subscribers:
+			if not thisKey in self._subscribers:
 				# nothing actually subscribed for this
 				continue
 			
-			current = self.subscribers[ thisKey]
+			current = self._subscribers[ thisKey]
 			currentIndex = self.leftIndexOf( current, subscriber)
 			
 			if currentIndex > -1:
@@ -2515,7 +5089,7 @@ class xtData:
 				# and if there are no more subscribers to this key then remove it from our 
 				# higher subscribers index
 				if len( current) == 0:
-					del( self.subscribers[ thisKey])
+					del( self._subscribers[ thisKey])
 				
 		
 		
@@ -2573,10 +5147,13 @@ class xtData:
 	#	UNSUBSCRIBE FROM ALL
 	#
 	def unsubscribeFromAll( self, subscriber):
-		index = self.leftIndexOf( self.subscribedToAll, subscriber)
+		if self._subscribedToAll == None:
+			return
+			
+		index = self.leftIndexOf( self._subscribedToAll, subscriber)
 		
 		if index > -1:
-			del( self.subscribedToAll[ index])
+			del( self._subscribedToAll[ index])
 	
 	#
 	#	SUBSCRIBERS FORCE
@@ -2584,7 +5161,7 @@ class xtData:
 	#	updates all subscribers even if the value hasn't changed
 	#
 	def subscribersForce( self, theKey):
-		if theKey in self.subscribers:
+		if self._subscribers != None and theKey in self._subscribers:
 			self.subscribersNotify( theKey, self.values[ theKey])
 	
 	
@@ -2594,36 +5171,52 @@ class xtData:
 	# where theData is a reference to this object that is calling it
 	#
 	def subscribersNotify( self, theKey, theValue):
-		for x in self.subscribedToAll:
-			theCallback, theTag = x
-			theCallback( theKey, theValue, theTag, self)
+		self._notifySubscribers( theKey, theValue)
+		
+		# now look for any children subscribers if we are not the root of the thing			
+		# a new container is passed up by insertContainer itself
+			
+		if self.parent != None and not isinstance( theValue, xtData) and self.hasChildrenSubscribers():
+			newData = self._makeSyncData()
+			
+			# if we are removed then theValue will be None and we need to add instead
+			# the special removed command in order to sync
+			
+			if theValue == None:
+				newData.values[ theKey] = b"_del_"
+			else:
+				newData.set( theKey, theValue)
+				
+			self.parent.notifyChildrenSubscribers( newData, False)
+			
+	#
+	# just the subscribers to this key and to all keys
+	#
+	def _notifySubscribers( self, theKey, theValue):
+		if self._subscribedToAll:
+			for x in self._subscribedToAll:
+				theCallback, theTag = x
+				theCallback( theKey, theValue, theTag, self)
 			
-		if theKey in self.subscribers:
-			work = self.subscribers[ theKey]
+		if self._subscribers and theKey in self._subscribers:
+			work = self._subscribers[ theKey]
 			for x in work:
 				theCallback, theTag = x
 				theCallback( theKey, theValue, theTag, self)
-		
-		# now look for any children subscribers if we are not the root of the thing			
-			
-		if self.parent != None and self.hasChildrenSubscribers:
-			newData = xtData()
-			newData.uuid = self.uuid
-			newData.values[ self.kNamedTypeUUID] = self.uuid
-			
-			# if we are removed then theValue will be None and we need to add instead
-			# the special removed command in order to sync
-			
-			if not theValue:
-				theValue = b"_del_"
-			
-			newData.set( theKey, theValue)
-			self.parent.notifyChildrenSubscribers( newData, False)
+				
+	#
+	# an empty object with our uuid to send changes to the children subscribers of our parents
+	#
+	def _makeSyncData( self):
+		newData = xtData()
+		newData.uuid = self.uuid
+		newData.values[ self.kNamedTypeUUID] = self.uuid
+		return newData
 			
 				
 	def notifyChildrenSubscribers( self, newData, isRemoved):
 	
-		if len( self.subscribedToChildren) == 0 and self.parent == None:
+		if not self._subscribedToChildren and self.parent == None:
 			# nobody subscribed and no parent to pass it down to, nothing to do
 			return
 			
@@ -2633,8 +5226,9 @@ class xtData:
 		x.set( self.kNamedTypeUUID, self.uuid)
 		x.insertContainer( newData)
 		
-		for p in self.subscribedToChildren:
-			p( x, isRemoved)
+		if self._subscribedToChildren:
+			for p in self._subscribedToChildren:
+				p( x, isRemoved)
 		
 		if self.parent != None:
 			self.parent.notifyChildrenSubscribers( x, False)
@@ -2669,9 +5263,11 @@ class xtData:
 			
 			# also remove the type string
 			
-			workType = self.kNamedTypePrefix + key
+			workType = self._typeKey( key)
 			if workType in self.values:
 				del( self.values[ workType])
+				
+			self._invalidate( key)
 
 			self.subscribersNotify( key, None)
 	
@@ -2690,83 +5286,130 @@ class xtData:
 		#if the item has been removed then we will send the value will be
 		# "_del_" and we can remove that item and send the update with the
 		# value being None
-		#XTension.debugLog( "begin data merge")
-		# first merge or add any key=value pairs
-		
-		# added sending all the changes as one list
-		# structure of this item is keyed by subscriber which will then
-		# build up a list of items so like:
-		# { callback:[ (key, value, tag), (key, value, tag), ...], ...}
-		
-		# then below processing they will all be sent after the changes are applied
-		changesAsList = {}
-		# should we actually add the value or not
-
 		
-		for key, value in newData.values.items():
-			#XTension.writeLog( "MERGE: key=%s(%s) value=%s(%s)" % ( key, str( type( key)), value, str( type( value))))
-			valueHasChanged = False		
+		# the values are compared as the raw bytes and type as they came from XTension first,
+		# only when those differ are both converted with get to see if the value really changed,
+		# the same comparison as it always made, so a change to just the raw form is not a change.
+		# The changes are collected first and then:
+		#	subscribers to the key and to all keys are called for each change and then it is
+		#		applied, the same as set, so the object they are passed still has the old value
+		#		for that key to compare against. Changes before it in the merge are applied already
+		#	subscribers for a list get all the changes they asked for in one call with the
+		#		raw values, or None if removed
+		#	and if our parents have children subscribers they get one xtData with all the changes
+		
+		typePrefix = self.kNamedTypePrefix
+		typeKeys = self._typeKeys
+		currentValues = self.values
+		newValues = newData.values
+		
+		# (key, raw value or None if removed, type or None to leave it alone)
+		changedValues = []
+		
+		for key, value in newValues.items():
 			#look for deleted values
-			try:
-				if value == b"_del_":
-					if key in self.values:
-						del( self.values[ key])
-						value = None
-						self.subscribersNotify( key, None)
-						valueHasChanged = True
-				else:		
-					#only do this if it's not a type entry
-					if key[:len( self.kNamedTypePrefix)] != self.kNamedTypePrefix:
-						# XTension 1005 changed this to use the cast or properly typed objects
-						# from the get commands rather than try to compare the root strings
-						# as sometimes they may contain non ascii chars if they are unicode in which
-						# case we would get an error below
-						# by comparing the return from the .get method we make sure that they are cast to 
-						# unicode strings in that case
-						currentValue = self.get( key)
-						newValue = newData.get( key)
-						
-						if (not key in self.values) or (currentValue != newValue):
-							self.set( key, newData.get( key)) #use the get so that the type is set and carried forward
-							valueHasChanged = True
+			if value == b"_del_":
+				if key in currentValues:
+					changedValues.append( (key, None, None))
+				continue
+				
+			#only do this if it's not a type entry, those are handled with their value
+			if key.startswith( typePrefix):
+				continue
+				
+			typeKey = typeKeys.get( key)
+			if typeKey == None:
+				typeKey = self._typeKey( key)
+				
+			newType = newValues.get( typeKey)
+			currentValue = currentValues.get( key)
+			
+			if currentValue == None:
+				# set would have stored a new value without a type as a string
+				if newType == None:
+					newType = self.kNamedTypeString
+					
+			elif currentValue == value and (newType == None or newType == currentValues.get( typeKey)):
+				continue
+				
+			elif self.get( key) == newData.get( key):
+				continue
+				
+			changedValues.append( (key, value, newType))
+			
+			
+		if len( changedValues) > 0:
 		
-# 						elif currentValue != newValue:
-# 							self.set( key, newData.get( key)) #use the get so that the type is set and carried forward	self.set( key, value)
-# 							#self.set( key, newValue) #use the get so that the type is set and carried forward	self.set( key, value)
-							
-				# now build the structure for subscribedByList
-				# using the changesAsList object to hold all the references as described above
+			# subscribers get the value as returned by get, the same as from set
+			subscribedToAll = self._subscribedToAll
+			subscribers = self._subscribers
+			
+			for key, value, newType in changedValues:
+				if subscribedToAll or (subscribers and key in subscribers):
+					try:
+						if value == None:
+							self._notifySubscribers( key, None)
+						else:
+							self._notifySubscribers( key, newData.get( key))
+					except Exception as e:
+						XTension.writeLog( "error in data.merge key=%s value=%s error=%s" % (key, value, e), xtLogRed)
+						# the format command can insert a bytes like object no problem
+						# though it will be in the output format of b'thing' which is fine and gives more debugging info anyway
+						XTension.writeLog( traceback.format_exc(), xtLogRed)
+						
+				if value == None:
+					self.values.pop( key, None)
+				else:
+					self.values[ key] = value
+					if newType != None:
+						self.values[ self._typeKey( key)] = newType
+						
+				self._invalidate( key)
+				
 				
+			# now build the structure for subscribedByList
+			# structure of this item is keyed by subscriber which will then
+			# build up a list of items so like:
+			# { callback:[ (key, value, tag), (key, value, tag), ...], ...}
+			
+			subscribedByList = self._subscribedByList
+			
+			if subscribedByList:
+				changesAsList = {}
 				
-				if valueHasChanged and (key in self.subscribedByList):
-					workArray = self.subscribedByList[ key]
-					for x in workArray:
-						(thisCallback, thisTag) = x
+				for key, value, newType in changedValues:
+					if key in subscribedByList:
+						for x in subscribedByList[ key]:
+							(thisCallback, thisTag) = x
+							
+							if not thisCallback in changesAsList:
+								changesAsList[ thisCallback] = [(key, value, thisTag)]
+							else:
+								changesAsList[ thisCallback].append( (key, value, thisTag))
+								
+				# walk the index we created and call them all in one go
+				for workCallback in changesAsList:
+					workList = changesAsList[ workCallback]
+					try:
+						workCallback( workList, self)
+					except Exception as e:
+						XTension.writeLog( "Error in changesAsList callback handling: %s" % e, xtLogRed)
+						XTension.writeLog( "debug: changes as list=%s" % changesAsList, xtLogRed)
 						
-						if not thisCallback in changesAsList:
-							changesAsList[ thisCallback] = [(key, value, thisTag)]
-						else:
-							changesAsList[ thisCallback].append( (key, value, thisTag))
-
-
-			except Exception as e:
-				XTension.writeLog( "error in data.merge key=%s value=%s error=%s" % (key, value, e), xtLogRed)
-				#XTension.writeLog( "error in data.merge key=" +  key + " value=" + value + " error=" + str( e), xtLogRed)
-				# above line removed because it cannot concatenate if it is a bytes like object, but the format command can insert it no problem.
-				# though it will be in the output format of b'thing' which is fine and gives more debugging info anyway
-				XTension.writeLog( traceback.format_exc(), xtLogRed)
-
-
-		# now outside the loop of processing the merge we send any subscribedAsList people that might be there
-		# walk the index we created and call them all in one go
-		
-		for workCallback in changesAsList:
-			workList = changesAsList[ workCallback]
-			try:
-				workCallback( workList, self)
-			except Exception as e:
-				XTension.writeLog( "Error in changesAsList callback handling: %s" % e, xtLogRed)
-				XTension.writeLog( "debug: changes as list=%s" % changesAsList, xtLogRed)
+						
+			# one sync object with all the changes for any children subscribers upstream
+			if self.parent != None and self.hasChildrenSubscribers():
+				syncData = self._makeSyncData()
+				
+				for key, value, newType in changedValues:
+					if value == None:
+						syncData.values[ key] = b"_del_"
+					else:
+						syncData.values[ key] = value
+						if newType != None:
+							syncData.values[ self._typeKey( key)] = newType
+							
+				self.parent.notifyChildrenSubscribers( syncData, False)
 
 		
 		# now merge any embedded objects
@@ -2821,14 +5464,12 @@ class xtData:
 	#
 	#	SAVE
 	#
-	# saves the data object to a BytesIO stream and returns it
+	# returns the data object in the binary format to send to XTension
 	#
 	def save( self):
-		output = io.BytesIO()
-		self._saveToString( output)
-		finished = output.getvalue()
-		output.close()
-		return finished
+		output = bytearray()
+		self._encode( output)
+		return bytes( output)
 	
 	#
 	#	_SAVE TO STRING
@@ -2838,34 +5479,50 @@ class xtData:
 	# so for my own sanity I called it the same thing.
 	#
 	def _saveToString( self, output):
-		output.write( self.kBinaryHeaderLabel)
-		output.write( self.kBinaryStringVersion)
-		output.write( pack( "B", 76))
-		output.write( b'  ')
+		output.write( self.save())
 		
-		for key in self.values.keys():
-			value = self.values[ key]
-			output.write( self.kBinaryValueHeader)
-			output.write( pack( "I", len( key)))
-			output.write( bytearray( key, "utf-8"))
-			output.write( pack( "I", len( value)))
-
-			if type( value) == str:
-				value = bytearray( value, "utf-8")
+	#
+	#	_ENCODE
+	#
+	# appends the binary format to the bytearray output. The "V", length and key that start every
+	# value are made once for each key and remembered in _keyHeaders. Lengths are of the utf-8 bytes
+	# and not of the characters.
+	#
+	def _encode( self, output):
+		output += self.kBinaryFileHeader
+		
+		keyHeaders = self._keyHeaders
+		packSize = _xtDataSizeStruct.pack
+		
+		for key, value in self.values.items():
+			keyHeader = keyHeaders.get( key)
+			if keyHeader == None:
+				keyHeader = self._makeHeader( self.kBinaryValueHeader, key, keyHeaders)
+				
+			if type( value) != bytes:
+				value = _xtDataBytes( value)
 				
-			output.write( value)
+			output += keyHeader
+			output += packSize( len( value))
+			output += value
 			
 		for container in self.containers:
-			output.write( self.kBinaryObjectHeader)
-			output.write( pack( "I", len( container.name)))
-			if type( container.name) in [bytes, bytearray]:
-				output.write( container.name)
-			else:
-				output.write( bytearray( container.name, 'utf-8'))
-				
-			container._saveToString( output)
+			output += self._makeHeader( self.kBinaryObjectHeader, container.name)
+			container._encode( output)
+			
+		output += self.kBinaryDoneHeader
+		
+	def _makeHeader( self, header, name, headerCache=None):
+		originalName = name
+		if type( name) != bytes and type( name) != bytearray:
+			name = _xtDataBytes( name)
+			
+		workHeader = header + _xtDataSizeStruct.pack( len( name)) + name
+		
+		if headerCache != None and len( headerCache) < self.kMaxCachedKeys:
+			headerCache[ originalName] = workHeader
 			
-		output.write( self.kBinaryDoneHeader)
+		return workHeader
 		
 		
 	#
@@ -3047,88 +5704,197 @@ class xtData:
 	#
 	#	_PARSE
 	#
-	# parses either a string or an existing BytesIO object containing the binary
-	# data representation as it's send from XTension
+	# parses either bytes, a bytearray or memoryview or an existing BytesIO object containing 
+	# the binary data representation as it's send from XTension. A BytesIO is left positioned
+	# after the end of this object the same as when it was read a piece at a time.
 	#
 	def _parse( self, rawinput):
-
+	
+		self._decodeCache = None
+		self._floatCache = None
 
 		if isinstance( rawinput, io.BytesIO):
-			input = rawinput
-		else:
-			input = io.BytesIO( rawinput)
+			success, endPosition = self._decode( rawinput.getvalue(), rawinput.tell())
+			rawinput.seek( endPosition)
+			return success
 			
+		return self._decode( rawinput, 0)[0]
 		
-		if input.read( 4) != self.kBinaryHeaderLabel:
-			XTension.writeLog( "unable to parse xtData object, bad header", xtLogRed)
-			return( False)
-			
-		protocolVersion = input.read( 1) #unpack( "B", input.read( 1))[0]
-				
-		if protocolVersion != self.kBinaryStringVersion:
-			XTension.writeLog( "protocol version incompatible with xtData class version", xtLogRed)
-			return( False)
 		
-		#
-		# this is leftover from when we were supporting talking between PPC and Intel machines
-		# it will now just always be the CPU format which is the same everywhere we run right now
-		#
-		byteOrder = unpack( "B", input.read( 1))
+	#
+	#	_DECODE
+	#
+	# walks the data from position in a single pass with unpack_from rather than reading it
+	# a piece at a time through a stream. Embedded xtData objects are kept on a list of parents
+	# rather than recursing. Returns a tuple of success and the position after this object.
+	#
+	# a memoryview or bytearray, like the xtKeyData view from XTCommand.getView, is not copied
+	# as a whole, only the keys and values are copied out of it as they're kept. bytes are
+	# just sliced.
+	#
+	# a value or container that runs off the end of the data stops the parse and is logged,
+	# anything before it is kept. Running out of data between values is the same as the
+	# end of the object
+	#
+	def _decode( self, workData, position):
+	
+		isView = False
+		
+		if isPy3:
+			valueHeader, objectHeader, doneHeader = 0x56, 0x4F, 0x45 # V O E
+			if type( workData) != bytes:
+				workData = memoryview( workData)
+				if workData.format != 'B' or workData.ndim != 1:
+					workData = workData.cast( 'B')
+					
+				isView = True
+		else:
+			valueHeader, objectHeader, doneHeader = 'V', 'O', 'E'
+			if isinstance( workData, memoryview):
+				workData = workData.tobytes()
+			elif type( workData) != str:
+				workData = str( workData)
+		
+		dataEnd = len( workData)
+		
+		if not self._checkFileHeader( workData, position):
+			return (False, position)
 			
-		# skip 2 bytes for future expansion
-		input.read( 2)
+		position += 8
 		
-		while True:
-			thisHeader = input.read( 1)
-			if thisHeader == '':
-				#EOF
-				return( True)
-				
-			#
-			# this object is done loading return the stream to the parent object, if any
-			#
-			elif thisHeader == self.kBinaryDoneHeader:
-				return( True)
-				
-			#
-			# the next structure is a key=value pair
-			#
-			elif thisHeader == self.kBinaryValueHeader:
-				thisKey = input.read( unpack( "I", input.read( 4))[0])
-				
-				# keys are strings always
-				if isPy3 and type( thisKey) == bytes:
-					thisKey = thisKey.decode()
-				
-				#XTension.writeLog( "about to read value for key %s" % thisKey)
-				thisValue = input.read( unpack( "I", input.read( 4))[0])
-				#XTension.writeLog( "read value of %s" % thisValue)
-				
-				if thisValue == '':
-					continue
+		unpackSize = _xtDataSizeStruct.unpack_from
+		keyNames = self._keyNames
+		uuidKey = self.kNamedTypeUUID
+		sharedValues = self._sharedValues
+		sharedLength = self.kMaxSharedValueLength + 4
+		
+		thisObject = self
+		thisValues = self.values
+		parentObjects = []
+		
+		try:
+			while position < dataEnd:
+				thisHeader = workData[ position]
 				
+				#
+				# the next structure is a key=value pair
+				# unpack_from raises if a length runs off the end of the data
+				#
+				if thisHeader == valueHeader:
+					keyEnd = position + 5 + unpackSize( workData, position + 1)[0]
+					valueEnd = keyEnd + 4 + unpackSize( workData, keyEnd)[0]
 					
-				if thisKey == self.kNamedTypeUUID:
-					self.uuid = thisValue.decode()
+					if valueEnd > dataEnd:
+						return self._truncated( position)
+						
+					rawKey = workData[ position + 5:keyEnd]
+					thisValue = workData[ keyEnd + 4:valueEnd]
+					position = valueEnd
 					
-				self.values[ thisKey] = thisValue
+					if isView:
+						rawKey = rawKey.tobytes()
+						thisValue = thisValue.tobytes()
 					
-			#
-			# the next structure is an embedded named xtData object
-			#
-			elif thisHeader == self.kBinaryObjectHeader:
-			
-				newData = xtData()
-				newData.name = input.read( unpack( "I", input.read( 4))[0])
-				
-				if isPy3 and type( newData.name) == bytes:
-					newData.name = newData.name.decode()
-				
-				newData.parent = self
-				self.containers.append( newData)
-				newData._parse( input)
+					# keys are strings always
+					thisKey = keyNames.get( rawKey)
+					if thisKey == None:
+						thisKey = rawKey
+						if isPy3:
+							thisKey = rawKey.decode()
+							
+						if len( keyNames) < self.kMaxCachedKeys:
+							keyNames[ rawKey] = thisKey
+						
+					# python 2 has always skipped empty values
+					if not isPy3 and thisValue == '':
+						continue
+						
+					if thisKey == uuidKey:
+						thisObject.uuid = thisValue.decode()
+						
+					elif valueEnd - keyEnd <= sharedLength:
+						sharedValue = sharedValues.get( thisValue)
+						if sharedValue != None:
+							thisValue = sharedValue
+						elif len( sharedValues) < self.kMaxCachedKeys:
+							sharedValues[ thisValue] = thisValue
+						
+					thisValues[ thisKey] = thisValue
+					
+				#
+				# the next structure is an embedded named xtData object
+				#
+				elif thisHeader == objectHeader:
+					nameEnd = position + 5 + unpackSize( workData, position + 1)[0]
+					
+					if nameEnd > dataEnd:
+						return self._truncated( position)
+						
+					newName = workData[ position + 5:nameEnd]
+					if isView:
+						newName = newName.tobytes()
+						
+					if isPy3:
+						newName = newName.decode()
+						
+					if not self._checkFileHeader( workData, nameEnd):
+						return (False, position)
+						
+					position = nameEnd + 8
+					
+					newData = xtData()
+					newData.name = newName
+					newData.parent = thisObject
+					thisObject.containers.append( newData)
+					
+					parentObjects.append( thisObject)
+					thisObject = newData
+					thisValues = newData.values
+					
+				#
+				# this object is done loading, go back to the parent object if any
+				#
+				elif thisHeader == doneHeader:
+					position += 1
+					
+					if len( parentObjects) == 0:
+						return (True, position)
+						
+					thisObject = parentObjects.pop()
+					thisValues = thisObject.values
+					
+				else:
+					position += 1
+					
+		except error:
+			return self._truncated( position)
 				
-
+		#EOF
+		return (True, position)
+		
+		
+	def _checkFileHeader( self, workData, position):
+		if position + 8 > len( workData):
+			self._truncated( position)
+			return False
+			
+		if workData[ position:position + 4] != self.kBinaryHeaderLabel:
+			XTension.writeLog( "unable to parse xtData object, bad header", xtLogRed)
+			return False
+			
+		if workData[ position + 4:position + 5] != self.kBinaryStringVersion:
+			XTension.writeLog( "protocol version incompatible with xtData class version", xtLogRed)
+			return False
+			
+		return True
+		
+		
+	def _truncated( self, position):
+		XTension.writeLog( "xtData object truncated at byte %s" % position, xtLogRed)
+		return (False, position)
+		
+		
+		
 
 	
 
@@ -3139,7 +5905,13 @@ class xtData:
 # provides basic functionality for handling events and subscribing
 #
 
-class XTSharedObject:
+class XTSharedObject( object):
+
+	# fixed slots for the things every unit and script has, see xtData. Subclasses and plugins
+	# can still add whatever attributes they like, those go into __dict__ as before. __weakref__
+	# is only needed here, XTUnit and XTScript get it from this
+	__slots__ = ('data', 'name', 'uniqueId', '_commandHandlers', '_scriptHandlers', '__dict__', '__weakref__')
+	
 	def __init__( self, theData):
 		self.data = theData
 		
@@ -3148,8 +5920,9 @@ class XTSharedObject:
 		# the .get for an xtUnitKeyUniqueId forces it to just be returned as a string
 		self.uniqueId = theData.get( xtUnitKeyUniqueId)
 	
-		self._commandHandlers = {}
-		self._scriptHandlers = {}
+		# not created until a handler is added, most objects never have any
+		self._commandHandlers = None
+		self._scriptHandlers = None
 		
 		
 	#
@@ -3165,6 +5938,9 @@ class XTSharedObject:
 		if type( commandCode) != list:
 			commandCode = [commandCode]
 			
+		if self._commandHandlers == None:
+			self._commandHandlers = {}
+			
 		for thisCode in commandCode:
 			if not thisCode in self._commandHandlers:
 				self._commandHandlers[ thisCode] = [theCallback]
@@ -3182,6 +5958,9 @@ class XTSharedObject:
 		if type( commandCode) != list:
 			commandCode = [commandCode]
 			
+		if self._commandHandlers == None:
+			return
+			
 		for thisCode in commandCode:	
 			if thisCode in self._commandHandlers:
 				self._commandHandlers[ thisCode].remove( theCallback)
@@ -3203,6 +5982,9 @@ class XTSharedObject:
 	#
 	def addScriptHandler( self, scriptName, theCallback):
 		
+		if self._scriptHandlers == None:
+			self._scriptHandlers = {}
+			
 		if not scriptName in self._scriptHandlers:
 			self._scriptHandlers[ scriptName] = [theCallback]
 		else:
@@ -3212,8 +5994,8 @@ class XTSharedObject:
 	#	REMOVE SCRIPT HANDLER
 	#
 	def removeScriptHandler( self, scriptName, theCallback):
-		if scriptName in self._scriptHandlers:
-			self._commandHandlers[ scriptName].remove[ theCallback]
+		if self._scriptHandlers != None and scriptName in self._scriptHandlers:
+			self._scriptHandlers[ scriptName].remove( theCallback)
 
 	#
 	#	HANDLE COMMAND FROM XTENSION
@@ -3229,7 +6011,12 @@ class XTSharedObject:
 		#	self.writeLog( '%s: handling command from XTension:' % self.name)
 		#	theCommand.debugLog()
 		
-		if commandCode in self._commandHandlers:
+		# the internal handler that keeps the indexes straight always runs first. This used to be
+		# registered as a command handler by every unit and script but that was a dict and a list each
+		if commandCode == xtCommandUnitDeleted:
+			self._objectRemoved( theCommand)
+		
+		if self._commandHandlers != None and commandCode in self._commandHandlers:
 			#self.debugLog( "a command handler was found")
 			
 			handlerList = self._commandHandlers[ commandCode]
@@ -3237,7 +6024,9 @@ class XTSharedObject:
 				# make sure that the handling continues even if the plugin code being called
 				# causes an error, there may be others that can function properly in the list
 				try:
-					handler( theCommand)
+					workResult = handler( theCommand)
+					if workResult != None:
+						XTension._handlerReturned( workResult)
 				except Exception as e:
 					self.writeLog( "XTUnit.handleCommandFromXTension( command=%s, error=%s)" % (commandCode, str( e)), xtLogRed)
 					self.writeLog( traceback.format_exc(), xtLogRed)
@@ -3246,6 +6035,13 @@ class XTSharedObject:
  
 # 			if XTension.debugMode:
 # 				print( self._commandHandlers)
+
+	#
+	# called before any handlers for xtCommandUnitDeleted, units and scripts use this to take
+	# themselves out of the indexes
+	#
+	def _objectRemoved( self, theCommand):
+		pass
 			
 	
 	
@@ -3267,11 +6063,13 @@ class XTSharedObject:
 	# callbacks for it.
 	#
 	def _runScriptCommand( self, commandName, positionalParms, dataParms):
-		if commandName in self._scriptHandlers:
+		if self._scriptHandlers != None and commandName in self._scriptHandlers:
 			handlerList = self._scriptHandlers[ commandName]
 			
 			for handler in handlerList:		
-				handler( commandName, positionalParms, dataParms)
+				workResult = handler( commandName, positionalParms, dataParms)
+				if workResult != None:
+					XTension._handlerReturned( workResult)
 		else:
 			self.debugLog( "there was no handler for script call (%s)" % commandName)
 			
@@ -3321,6 +6119,9 @@ class XTList( XTSharedObject):
 
 
 class XTScript( XTSharedObject):
+
+	__slots__ = ()
+	
 	def __init__( self, theData):
 		if isPy3:
 			super().__init__( theData)
@@ -3333,7 +6134,9 @@ class XTScript( XTSharedObject):
 		# subscribe to the name in the data so that if the name is changed that we can change our index
 		
 		self.data.subscribe( [xtUnitKeyName], self.nameChanged, None)
-		self.addCommandHandler( xtCommandUnitDeleted, self._scriptRemoved) #always run this internal handler
+		
+	def _objectRemoved( self, theCommand):
+		self._scriptRemoved( theCommand)
 		
 	def _scriptRemoved( self, theCommand):
 		if self.uniqueId in XTension.scriptIndexById:
@@ -3406,6 +6209,26 @@ class xtScript( XTScript):
 
 						
 	
+#
+# the unitIndexByBareAddress and unitIndexByTag indexes can have more than one unit for
+# a key so they hold lists, in the order the units were indexed. The key is removed with
+# the last unit.
+#
+def _addToMultiIndex( theIndex, key, theUnit):
+	workList = theIndex.get( key)
+	if workList == None:
+		theIndex[ key] = [theUnit]
+	elif not theUnit in workList:
+		workList.append( theUnit)
+		
+def _removeFromMultiIndex( theIndex, key, theUnit):
+	workList = theIndex.get( key)
+	if workList != None and theUnit in workList:
+		workList.remove( theUnit)
+		if len( workList) == 0:
+			del theIndex[ key]
+	
+
 #
 #	X T U N I T
 #
@@ -3416,6 +6239,17 @@ class xtScript( XTScript):
 
 class XTUnit( XTSharedObject):
 
+	__slots__ = ('tag', 'address')
+	
+	#
+	# the commands sent most often, sensors can send hundreds of these a second so they are
+	# packed from templates rather than building an XTCommand every time. See XTCommand.template
+	#
+	_turnOnTemplate = XTCommand.template( xtKeyUniqueId, xtKeyCommand=xtCommandOn, xtKeyCommandTarget=xtTargetUnit)
+	_turnOffTemplate = XTCommand.template( xtKeyUniqueId, xtKeyCommand=xtCommandOff, xtKeyCommandTarget=xtTargetUnit)
+	_setValueTemplate = XTCommand.template( xtKeyUniqueId, xtKeyValue, xtKeyCommand=xtCommandSetValue, xtKeyCommandTarget=xtTargetUnit)
+	_noOpTemplate = XTCommand.template( xtKeyUniqueId, xtKeyCommand=xtCommandNoOp, xtKeyCommandTarget=xtTargetUnit)
+
 	def __init__(self, theData):
 		
 		if isPy3:
@@ -3427,50 +6261,93 @@ class XTUnit( XTSharedObject):
 		# verify that theData actually contains both a tag and an address before we can index it
 		# no, thats OK, without that we just can't index by address and thats OK
 		
-		doAddressIndex = True
-		
 		if not theData.exists( xtUnitKeyTag):
-			doAddressIndex = False
 			self.tag = None
 		else:
 			self.tag = theData.get( xtUnitKeyTag)
 
 		if not theData.exists( xtUnitKeyAddress):
-			doAddressIndex = False
 			self.address = None
 		else:
 			self.address = theData.get( xtUnitKeyAddress).upper()
 
-			
-		if doAddressIndex:
-			XTension.unitIndexByAddress[ self.tag + self.address] = self
+		self._indexUnit()
 		
-		XTension.unitIndexByName[ self.name] = self
-		XTension.unitIndexById[ theData.get( xtUnitKeyUniqueId)] = self
+		# if any of these values change we need to update our indexes for this unit
+		self.data.subscribe( [xtUnitKeyName, xtUnitKeyAddress, xtUnitKeyTag], self._indexChanged, None)
 		
-		self.addCommandHandler( xtCommandUnitDeleted, self._unitRemoved) #always run this internal handler
 		
-		# if any of these values change we need to update our indexes for this unit
-		self.data.subscribe( [xtUnitKeyName, xtUnitKeyAddress, xtKeyTag], self._indexChanged, None)
+	#
+	#	I N D E X   U N I T
+	#
+	# places the unit into all of the cXTension unit indexes under it's current name, id, tag and 
+	# address. _unindexUnit takes it back out of them. Everything that changes any of those
+	# goes through these so that the indexes can't disagree with each other.
+	#
+	def _indexUnit( self):
+		self._indexAddress()
+		
+		if self.name != None:
+			XTension.unitIndexByName[ self.name] = self
+		XTension.unitIndexById[ self.uniqueId] = self
+		
+	#
+	# only removes the entries that still point to this unit, another unit may have been
+	# given the same name or address since
+	#
+	def _unindexUnit( self):
+		self._unindexAddress()
+		
+		if XTension.unitIndexByName.get( self.name) is self:
+			del XTension.unitIndexByName[ self.name]
+			
+		if XTension.unitIndexById.get( self.uniqueId) is self:
+			del XTension.unitIndexById[ self.uniqueId]
+			
+	#
+	# the three indexes that depend on the tag and address
+	#
+	def _indexAddress( self):
+		if self.tag != None and self.address != None:
+			XTension.unitIndexByAddress[ self.tag + self.address] = self
+			
+			unitKey = (self.tag, self.address)
+			XTension.unitIndexByKey[ unitKey] = self
+			XTension._forgetUnitLookupMiss( unitKey)
+			
+		if self.address != None:
+			_addToMultiIndex( XTension.unitIndexByBareAddress, self.address, self)
+			
+		if self.tag != None:
+			_addToMultiIndex( XTension.unitIndexByTag, self.tag, self)
+			
+	def _unindexAddress( self):
+		if self.tag != None and self.address != None:
+			addressPath = self.tag + self.address
+			if XTension.unitIndexByAddress.get( addressPath) is self:
+				del XTension.unitIndexByAddress[ addressPath]
+				
+			unitKey = (self.tag, self.address)
+			if XTension.unitIndexByKey.get( unitKey) is self:
+				del XTension.unitIndexByKey[ unitKey]
+				
+		if self.address != None:
+			_removeFromMultiIndex( XTension.unitIndexByBareAddress, self.address, self)
+			
+		if self.tag != None:
+			_removeFromMultiIndex( XTension.unitIndexByTag, self.tag, self)
 		
 		
 	# we have been removed either by deletion or by assigning to a different interface in XTension
 	# this method must be called to manage the indexes you can subsclass the non underscore version
+	# it is always run first by handleCommandFromXTension, see _objectRemoved
 	
-	def _unitRemoved( self, theCommand):	
-		
-		addressPath = self.data.get( xtUnitKeyTag, "notag") + self.data.get( xtUnitKeyAddress, "noaddress")	
-		if addressPath in XTension.unitIndexByAddress:
-			del XTension.unitIndexByAddress[ addressPath]
+	def _objectRemoved( self, theCommand):
+		self._unitRemoved( theCommand)
 		
-		myName = self.data.get( xtUnitKeyName)
-		if myName in XTension.unitIndexByName:
-			del XTension.unitIndexByName[ myName]
-			
-		myId = self.data.get( xtUnitKeyUniqueId)
-		if myId in XTension.unitIndexById:
-			del XTension.unitIndexById[ myId]
+	def _unitRemoved( self, theCommand):	
 		
+		self._unindexUnit()
 		self.unitRemoved()
 			
 		
@@ -3478,57 +6355,47 @@ class XTUnit( XTSharedObject):
 		# called if the unit name, address or Tag is changed by editing in XTension
 		# these are the values that we index ourselves by so it may be necessary to fix 
 		# the indexes.
-		# since the event is called before the data is updated we can look at the old values
-		# and remove them from the index before re-adding the new one.
+		# since the event is called before the data is updated we take ourselves out of the
+		# indexes under the old values and put ourselves back under the new one. A value of
+		# None means that it was removed from the unit.
 	def _indexChanged( self, theKey, theValue, theTag, theData):
 	
 		#maintain the local class variables that hold these things too
-	
-		if theKey == xtUnitKeyName:
-			
-			oldName = theData.get( xtUnitKeyName)
-			
-			if oldName in XTension.unitIndexByName:
-				del XTension.unitIndexByName[ oldName]
-							
-			self.name = theValue
-				
-			XTension.unitIndexByName[ theValue] = self
-
-			
-			if XTension.debugMode:
-				XTension.writeLog( "changing name in index from (" + oldName + ") to (" + theValue + ")")
-			
-			
-		elif theKey == xtUnitKeyAddress:
-			# addresses are a path consisting of the tag and the address
-			# so we have to handle a potential change to both
-			try:
-				oldAddress = theData.get( xtUnitKeyTag, '') + theData.get( xtUnitKeyAddress, '')
-				if oldAddress in XTension.unitIndexByAddress:
-					del XTension.unitIndexByAddress[ oldAddress]
-							
-				self.address = theValue
+		
+		try:
+			if theKey == xtUnitKeyName:
 				
-				XTension.unitIndexByAddress[ theData.get( xtUnitKeyTag, '') + self.address] = self
+				if XTension.unitIndexByName.get( self.name) is self:
+					del XTension.unitIndexByName[ self.name]
+					
+				if XTension.debugMode:
+					XTension.writeLog( "changing name in index from (%s) to (%s)" % (self.name, theValue))
+					
+				self.name = theValue
 				
-			except Exception as e:
-				XTension.debugLog( "error changing address " + str( e))
-				XTension.writeLog( traceback.format_exc(), xtLogRed)
-			
-		
+				# a removed name has nothing to index
+				if theValue != None:
+					XTension.unitIndexByName[ theValue] = self
 				
-		elif theKey == xtUnitKeyTag:
-						
-			oldAddress = theValue + theData.get( xtUnitKeyAddress)
-			
-			if oldAddress in XTension.unitIndexByAddress:
-				del XTension.unitIndexByAddress[ oldAddress]
+			elif theKey == xtUnitKeyAddress:
+				# addresses are a path consisting of the tag and the address
+				self._unindexAddress()
 				
+				if theValue == None:
+					self.address = None
+				else:
+					self.address = str( theValue).upper()
+					
+				self._indexAddress()
+					
+			elif theKey == xtUnitKeyTag:
+				self._unindexAddress()
+				self.tag = theValue
+				self._indexAddress()
 			
-			self.tag = theValue
-				
-			XTension.unitIndexByAddress[ theValue + theData.get( xtUnitKeyAddress)] = self
+		except Exception as e:
+			XTension.writeLog( "error changing unit index for %s: %s" % (theKey, e), xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
 			
 	
 	#	U N I T   R E M O V E D
@@ -3573,6 +6440,18 @@ class XTUnit( XTSharedObject):
 # 		
 # 		XTension.sendCommand( x)
 # 		
+
+	#
+	#	_ C A N   S E N D   T E M P L A T E
+	#
+	# turnOn, turnOff, setValue and sendNoOp only use the templates above if sendCommand is
+	# this one. A subclass that overrides sendCommand to log or filter or add to the commands
+	# still has every command go through it the way it always did
+	#
+	def _canSendTemplate( self):
+		workSend = type( self).sendCommand
+		return getattr( workSend, '__func__', workSend) is XTUnit.__dict__[ 'sendCommand']
+		
 	#
 	#	S E T   B A T T E R Y   L E V E L
 	#
@@ -3599,14 +6478,17 @@ class XTUnit( XTSharedObject):
 	def turnOn( self, updateOnly = False, defaultLabel = None, **kwds):
 		# by passing the kwargs we are allowed to do the above mentioned xtKeyColor= stuff
 		
-		kwds[ xtKeyCommand] = xtCommandOn
 		if updateOnly:
 			kwds[ xtKeyUpdateOnly] = xtTrue
 			
 		if defaultLabel != None:
 			kwds[ xtKeyDefaultLabel] = defaultLabel
 			
-		self.sendCommand( **kwds)
+		if self._canSendTemplate():
+			self._turnOnTemplate.send( self.uniqueId, **kwds)
+		else:
+			kwds[ xtKeyCommand] = xtCommandOn
+			self.sendCommand( **kwds)
 # 		
 # 		
 # 		x = XTCommand( **kwds)
@@ -3629,15 +6511,17 @@ class XTUnit( XTSharedObject):
 		# by passing the kwargs we are allowed to do the above mentioned xtKeycolor stuff
 		# though you can't pass a color with an OFF command, it will be ignored.
 		
-		kwds[ xtKeyCommand] = xtCommandOff
-
 		if updateOnly:
 			kwds[ xtKeyUpdateOnly] = xtTrue
 		
 		if defaultLabel != None:
 			kwds[ xtKeyDefaultLabel] = defaultLabel
 			
-		self.sendCommand( **kwds)
+		if self._canSendTemplate():
+			self._turnOffTemplate.send( self.uniqueId, **kwds)
+		else:
+			kwds[ xtKeyCommand] = xtCommandOff
+			self.sendCommand( **kwds)
 
 
 
@@ -3670,16 +6554,18 @@ class XTUnit( XTSharedObject):
 	def setValue( self, newValue, updateOnly = False, defaultLabel = None, **kwds):
 		# by passing the kwargs we can do things like the above mentioned xtKeyColor=
 		
-		kwds[ xtKeyCommand] = xtCommandSetValue
-		kwds[ xtKeyValue] = newValue
-		
 		if updateOnly:
 			kwds[ xtKeyUpdateOnly] = xtTrue
 		
 		if defaultLabel != None:
 			kwds[ xtKeyDefaultLabel] = defaultLabel
 			
-		self.sendCommand( **kwds)
+		if self._canSendTemplate():
+			self._setValueTemplate.send( self.uniqueId, newValue, **kwds)
+		else:
+			kwds[ xtKeyCommand] = xtCommandSetValue
+			kwds[ xtKeyValue] = newValue
+			self.sendCommand( **kwds)
 # 		
 # 		
 # 		x = XTCommand( **kwds)
@@ -3709,8 +6595,11 @@ class XTUnit( XTSharedObject):
 	
 	def sendNoOp( self, **kwds):
 	
-		kwds[ xtKeyCommand] = xtCommandNoOp
-		self.sendCommand( **kwds)
+		if self._canSendTemplate():
+			self._noOpTemplate.send( self.uniqueId, **kwds)
+		else:
+			kwds[ xtKeyCommand] = xtCommandNoOp
+			self.sendCommand( **kwds)
 # 		
 # 		x = XTCommand( **kwds)
 # 		x.set( xtKeyUniqueId, self.uniqueId)
@@ -3872,380 +6761,1243 @@ class XTUnit( XTSharedObject):
 	def getProperties( self):
 		return( self.data.getContainer( xtUnitKeyProperties, 1))
 		
-
+
+	#
+	#	G E T   C O L O R   A S   H T M L
+	#
+	#	internal color format in XTension database is RGB as decimal separated by commas
+	#	this returns a standard HTML color string but without the preceding "#"
+	#
+	def getColorAsHTML( self):
+		workColor = self.data.get( xtUnitKeyColor, None)
+		if workColor == None:
+			return None
+			
+		return "{:02x}{:02x}{:02x}".format( int( workColor[0]), int( workColor[1]), int( workColor[2]))
+
+	#
+	#	S E T   E R R O R
+	#
+	# called to set or clear a unit error
+	# pass a 0 as the number to clear an error with an empty message
+	# the two keys for error number and error message can also be included in any other
+	# command going to the unit, but this will generate a separate NoOp command that
+	# only includes this information
+	# compares the new values with the current values and no update is sent if they are the same
+	# so it's not necessary to check for that every time in your own code
+	#
+	
+	def setError( self, errorNum, errorMessage, **kwargs):
+
+		# if sent the same error number then just send nothing
+		if int( self.data.get( xtUnitKeyErrorLevel, 0)) == int( errorNum):
+			return
+
+		kwargs[ xtKeyCommand] 		= xtCommandNoOp
+		kwargs[ xtKeyCommError]		= errorNum
+		kwargs[ xtKeyErrorMessage] 	= errorMessage
+
+		self.sendCommand( **kwargs)
+
+
+		
+	#
+	#	W R I T E   L O G
+	#
+	# used to send a log with the properties of the unit in it rather than just a global log
+	# this way you can filter on the unit in XTension and see just log lines that came from
+	# this unit. 
+	#
+	
+	def writeLog( self, msg, color="2"):
+		
+		self.sendCommand(
+			xtKeyCommand 		= xtCommandWriteLog,
+			xtKeyValue 			= color,
+			xtKeyData 			= msg)
+# 		
+# 		XTension.sendCommand( XTCommand(
+# 			xtKeyCommand		= xtCommandWriteLog,
+# 			xtKeyValue			= color,
+# 			xtKeyData			= msg,
+# 			xtKeyUniqueId		= self.uniqueId,
+# 			xtKeyCommandTarget	= xtTargetUnit))
+
+	#
+	#	W R I T E   D E B U G   L O G
+	#
+	# same as write log, but only goes through if we're in debug more
+	#
+	
+	def debugLog( self, msg, color="2"):
+		if XTension.debugMode:
+			self.writeLog( msg, color)
+
+	#
+	#	G E T   S T A T U S
+	#	G E T   S T A T E
+	#
+	# status really is different than state, but I have used them interchangeably so continue to allow that here
+	#
+	def getStatus( self):
+		return (self.data.getFloat( xtUnitKeyValue, 0.0) != 0.0)
+	
+	def getState( self):
+		return (self.data.getFloat( xtUnitKeyValue, 0.0) != 0.0)
+		
+	#
+	#	G E T   V A L U E
+	#
+	
+	def getValue( self):
+		return self.data.getFloat( xtUnitKeyValue, 0)
+		
+	#
+	#	G E T   P R E S E T
+	#
+	#	return the preset level that we would return to with the next simple on command
+	#
+	def getPreset( self):
+		return self.data.getFloat( xtUnitKeyPresetLevel, 100)
+		
+	#
+	#	S E T   P R E S E T
+	#
+	# set the preset level in XTension for this unit to the new value
+	# compares against the current value to make sure it is not sending commands 
+	# unnecessarily
+	def setPreset( self, newPreset):
+		if self.getPreset() == newPreset:
+			return
+		
+		self.setXTensionData( xtUnitKeyPresetLevel, newPreset)
+		
+	#
+	#	E X E C U T E   H A N D L E R
+	#
+	# runs a handler in the on script with the passed data
+	#
+	#	TODO abandon this stupid comma separated value list and instead switch to a
+	#	JSON data string so that we can actually use typed values properly on both ends
+	#
+	
+	def executeHandler( self, handlerName, paramDataList = []):
+	
+		self.sendCommand(
+			xtKeyCommand 		= xtCommandScriptHandler,
+			xtKeyName 			= handlerName,
+			xtKeyData 			= XTension.encodeCommaSeparated( paramDataList))
+# 		
+# 		XTension.sendCommand( XTCommand( 
+# 			xtKeyUniqueId = self.uniqueId,
+# 			xtKeyCommand = xtCommandScriptHandler,
+# 			xtKeyCommandTarget = xtTargetUnit,
+# 			xtKeyName = handlerName,
+# 			xtKeyData = XTension.encodeCommaSeparated( paramDataList)))
+
+
+#
+# this is a catcher subclass so I don't have to rebuild all the 
+# classes I used in other plugins that I used the capitalization wrong
+class xtUnit( XTUnit):
+	def __init__( self, theData):
+		if isPy3:
+			super().__init__( theData)
+		else:
+			XTUnit.__init__( self, theData)
+		
+
+
+#
+#	x t D O L A T E R
+#
+# waits a certain number of seconds to do something and can be delayed
+# by resetting the timeout. Good for sending a status update after a certain time or
+# something similar. Repeated calls to setTimeout will just push back the time.
+#
+# this used to be a thread for every one counting down a second at a time, now they are all
+# run by the XTension.getScheduler() thread so the timeout can be a fraction of a second. The
+# action is handed off to the scheduler's worker threads so it can take as long as it needs to
+# without holding up any other timer, and it is never run twice at the same time.
+#
+class XTDoLater:
+
+	# set to True in a subclass whose action is quick to run it on the scheduler thread itself
+	runInline = False
+	
+	def __init__( self):
+		self._scheduled = None
+		self.threadName = 'XTDoLater' # no longer used, there is no thread of our own anymore
+		
+		
+	def setTimeout( self, newTimeout):
+		# if we are already counting down this just moves the time
+		workScheduler = XTension.getScheduler()
+		
+		if self._scheduled == None:
+			self._scheduled = workScheduler.callLater( newTimeout, self._runAction)
+		else:
+			self._scheduled = workScheduler.reschedule( self._scheduled, newTimeout)
+			
+	#
+	#	C A N C E L
+	#
+	# stops the countdown without running the action
+	#
+	def cancel( self):
+		if self._scheduled != None:
+			XTension.getScheduler().cancel( self._scheduled)
+			self._scheduled = None
+			
+	#
+	#	I S   P E N D I N G
+	#
+	# True if the action is waiting to run
+	#
+	def isPending( self):
+		return self._scheduled != None and self._scheduled.isPending()
+		
+		
+	def _runAction( self):
+		# unless setTimeout was called again since this one started
+		if self._scheduled != None and not self._scheduled.isPending():
+			self._scheduled = None
+			
+		if self.runInline:
+			self.action()
+		else:
+			XTension.getScheduler().callInWorker( self, self.action)
+		
+			
+		
+		
+	#
+	#	A C T I O N
+	#
+	# subclass to add custom code to this method
+	#
+	def action( self):
+		XTension.writeLog( "subclass the action method to add your own event")
+		
+	
+
+		
+		
+		
+
+#
+#	x t T I M E R
+#
+# used to create a repeating callback to it's subclassed action() handler
+# subclass this class and add your own action( self) handler that will be called
+# when the period expires.
+#
+# use the start() and stop() handlers to start and stop the timer. Note that just letting
+# the class go out of scope will not stop the timer.
+# if you wish to be able to stop the timer you must keep a reference to the timer so you 
+# can call stop, or have some mechanism to call stop from the action event.
+#
+# any timer that tries to fire once the XTension class is shutting down will be cancelled
+#
+# You can't create any timers until after the connection to XTension is established
+# as the callback relies on the global XTension to be set and pointing to the cXTension object
+#
+#	the inPeriod for the constructor and the setPeriod is in seconds
+#
+# this used to start a new Timer thread for every period and was deprecated because of it.
+# Timers are now run by the XTension.getScheduler() thread. Each time is counted from when 
+# the last one was due rather than when it ran so they don't drift, if the action takes
+# longer than the period the missed ones are skipped rather than run back to back.
+#
+# the action is run by the scheduler's worker threads so a slow one doesn't hold up any
+# other timer. Set runInline for one that is quick enough to run on the scheduler thread.
+#		
+
+
+class XTTimer:
+
+	# set to True in a subclass whose action is quick to run it on the scheduler thread itself
+	runInline = False
+	
+	def __init__( self, inPeriod):
+		self.isRunning = False
+		self.period = inPeriod
+		self._scheduled = None
+		self._nextTime = 0.0
+		self._actionBusy = False # handed to a worker and not finished yet
+	
+		
+	#
+	# 	A C T I O N
+	#	
+	# subclass this class and add your own action handler
+	# it will be called regularly every interval that is set
+	# until you call the stop() action on the class
+	# note that just letting the class go out of scope will not
+	# stop the timer, you must call stop() to stop the timer first
+	# keep a reference to the subclass so that you can stop it.
+	# 	
+	#
+	
+	def action( self):
+		print( "subclass me to make event")
+		
+
+	#
+	# 	S T A R T
+	# 
+	# called to start the timer
+	# the period must have already been passed to the constructor
+	# or changed by a call to setPeriod
+	# calling start multiple times is equivalent to calling 
+	# setPeriod with the same interval it cancels any currently outstanding
+	# timer and resets it to the current period. So calling start will reset the timer
+	# good for timeouts and such.
+	#
+	
+	def start( self):
+		workScheduler = XTension.getScheduler()
+		
+		if self._scheduled != None:
+			# just in case a timer is already waiting go ahead and cancel it
+			workScheduler.cancel( self._scheduled)
+			
+		self.isRunning = True
+		self._nextTime = _monotonic() + self.period
+		self._scheduled = workScheduler.callAt( self._nextTime, self._action)
+		
 	#
-	#	G E T   C O L O R   A S   H T M L
+	# 	S T O P
 	#
-	#	internal color format in XTension database is RGB as decimal separated by commas
-	#	this returns a standard HTML color string but without the preceding "#"
+	# stops any outstanding timer and sets isRunning to false
+	# so that if called from inside the action event it won't be scheduled again
 	#
-	def getColorAsHTML( self):
-		workColor = self.data.get( xtUnitKeyColor, None)
-		if workColor == None:
-			return None
+	
+	def stop( self):
+		self.isRunning = False
+		
+		if self._scheduled != None:
+			XTension.getScheduler().cancel( self._scheduled)
+			self._scheduled = None
 			
-		return "{:02x}{:02x}{:02x}".format( int( workColor[0]), int( workColor[1]), int( workColor[2]))
 
 	#
-	#	S E T   E R R O R
+	# 	S E T   P E R I O D
 	#
-	# called to set or clear a unit error
-	# pass a 0 as the number to clear an error with an empty message
-	# the two keys for error number and error message can also be included in any other
-	# command going to the unit, but this will generate a separate NoOp command that
-	# only includes this information
-	# compares the new values with the current values and no update is sent if they are the same
-	# so it's not necessary to check for that every time in your own code
+	# changes the period of an already created timer
+	# works if the timer is currently running or currently stopped
+	# changing the period or just setting it to the same value resets the
+	# timer and the new period begins counting from then if the timer is running
+	# if the timer is stopped then nothing happens, you must call start again
+	#
+	def setPeriod( self, newPeriod):
+		self.period = newPeriod
+		
+		# if we were running then restart us
+		if self.isRunning:
+			self.start()
+	
+		
+	#
+	# internal action handler, this is the actual callback from the scheduler
+	# this handles making sure that you should actually be firing, hands your
+	# subclassed action handler to a worker, or runs it here with runInline, and
+	# schedules the next one unless you called stop() in the action.
 	#
+		
+	def _action( self):
+		#internal action handler that restarts the timer
 	
-	def setError( self, errorNum, errorMessage, **kwargs):
-
-		# if sent the same error number then just send nothing
-		if int( self.data.get( xtUnitKeyErrorLevel, 0)) == int( errorNum):
+		if not self.isRunning:
+			#if XTension.debugMode:
+			XTension.writeLog( "xtTimer.action after having stopped", xtLogRed)
+				
+			# we should not be firing we should just return
+			return
+	
+		if XTension.isShuttingDown:
+			self.isRunning = False
+			return
+			
+		if self.runInline:
+			self._runAction()
+			self._scheduleNext()
 			return
+			
+		# the next one is scheduled first so that a start() or stop() from the action in
+		# the worker always sees it. If the last action is still running this one is skipped
+		# just like one missed by a slow action inline
+		self._scheduleNext()
+		
+		if not self._actionBusy:
+			self._actionBusy = True
+			XTension.getScheduler().callInWorker( self, self._workerAction)
+			
+	def _workerAction( self):
+		try:
+			if self.isRunning and not XTension.isShuttingDown:
+				self._runAction()
+		finally:
+			self._actionBusy = False
+			
+	def _runAction( self):
+		# so that an error in the subclassed action handler won't result in 
+		# the entire thing falling out here and stopping we will handle any
+		# otherwise unhandled errors and log them so we can keep going
+		try:
+			self.action()
+		except:
+			(theType, theValue, theTraceback) = sys.exc_info()
+			XTension.writeLog( "Error in xtTimer.action: type=%s value=%s" % (theType, theValue))
+			theType = None
+			theValue = None
+			theTraceback = None
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+	def _scheduleNext( self):
+		# if you called to stop() inside the action event then
+		# isRunning will have become false here. If you called start() or setPeriod
+		# it has already been scheduled again
+		# if isRunning is still True then schedule the next one a period after this one 
+		# was due, skipping any that we are already past
 
-		kwargs[ xtKeyCommand] 		= xtCommandNoOp
-		kwargs[ xtKeyCommError]		= errorNum
-		kwargs[ xtKeyErrorMessage] 	= errorMessage
+		if self.isRunning and self._scheduled != None and not self._scheduled.isPending():
+			workNow = _monotonic()
+			self._nextTime += self.period
+			
+			if self._nextTime <= workNow:
+				if self.period > 0:
+					self._nextTime += (int( (workNow - self._nextTime) / self.period) + 1) * self.period
+				else:
+					self._nextTime = workNow
+					
+			self._scheduled = XTension.getScheduler().callAt( self._nextTime, self._action)
+	
+	#
+	# 	X T E N S I O N   S H U T D O W N
+	#
+	# the scheduler is stopped when XTension shuts us down so this is no longer needed to
+	# keep the plugin from quitting, it just stops the timer
+	#
+	def xtensionShutdown( self, theCommand):
+		self.stop()
+		
+# and just this because I was sloppy in my naming conventions at the beginning and some
+# of the original plugins built with this may call it xtTimer instead of XTTimer
+class xtTimer( XTTimer):
+	def __init__( self, inPeriod):
+		XTTimer.__init__( self, inPeriod)
 
-		self.sendCommand( **kwargs)
+	
+			
+		
+			
+			
+				
+		
+#
+#
+#	X T   F R A M E R S
+#
+#
+# splitting a stream into messages is something every plugin that talks to a device ends up
+# writing for itself, usually by adding to self.buffer and then splitting and re-slicing it
+# which copies the whole buffer for every message and every read. Give a framer to an
+# XTRemoteConnection or XTTCPServerConnection with setFramer, or the framer keyword, and 
+# the complete frames are passed to frameReceived( frame) one at a time instead of calling 
+# dataAvailable.
+#
+# the framers keep the data in a bytearray and only move a start offset forward as frames are
+# taken from it, the consumed bytes at the front are dropped in one go once there are enough
+# of them to be worth it. Frames are handed out as bytes. The connections call frames() after
+# every read which takes all the complete frames at once, for the delimiter framer that is a 
+# single split, so there is little more per frame than calling frameReceived.
+#
+#	XTDelimiterFramer( b'\r')			frames ending in a delimiter such as a CR or CRLF
+#	XTFixedFramer( 8)					frames that are all the same length
+#	XTLengthPrefixFramer( 2)			frames that start with a 1, 2 or 4 byte length
+#	XTRegexFramer( rb'\$[^*]*\*..')		frames matching a regular expression
+#
+# a framer is only used by one connection and from its reading thread, there is no locking.
+#
 
+class XTFramer( object):
 
+	# once this many bytes at the front of the buffer have been consumed they are removed
+	kCompactSize = 65536
+	
+	def __init__( self, maxFrameSize=65536):
+		# if this much data is waiting without a complete frame it is thrown away, it's either
+		# garbage or the framer doesn't match what the device is sending
+		self.maxFrameSize = maxFrameSize
+		self.buffer = bytearray()
+		self.start = 0
+		self.discarded = 0 # count of the bytes thrown away as not part of any frame
 		
 	#
-	#	W R I T E   L O G
+	#	F E E D
 	#
-	# used to send a log with the properties of the unit in it rather than just a global log
-	# this way you can filter on the unit in XTension and see just log lines that came from
-	# this unit. 
+	# adds newly received data to the end of the buffer
 	#
-	
-	def writeLog( self, msg, color="2"):
+	def feed( self, newData):
+		workStart = self.start
+		
+		if workStart > 0 and (workStart == len( self.buffer) or workStart >= self.kCompactSize):
+			del self.buffer[ :workStart]
+			self.start = 0
+			self._compacted( workStart)
+				
+		self.buffer += newData
 		
-		self.sendCommand(
-			xtKeyCommand 		= xtCommandWriteLog,
-			xtKeyValue 			= color,
-			xtKeyData 			= msg)
-# 		
-# 		XTension.sendCommand( XTCommand(
-# 			xtKeyCommand		= xtCommandWriteLog,
-# 			xtKeyValue			= color,
-# 			xtKeyData			= msg,
-# 			xtKeyUniqueId		= self.uniqueId,
-# 			xtKeyCommandTarget	= xtTargetUnit))
-
 	#
-	#	W R I T E   D E B U G   L O G
+	#	N E X T   F R A M E
 	#
-	# same as write log, but only goes through if we're in debug more
+	# returns the next complete frame or None if there isn't one yet. Subclasses implement this
 	#
-	
-	def debugLog( self, msg, color="2"):
-		if XTension.debugMode:
-			self.writeLog( msg, color)
-
+	def nextFrame( self):
+		return None
+		
 	#
-	#	G E T   S T A T U S
-	#	G E T   S T A T E
+	#	F R A M E S
 	#
-	# status really is different than state, but I have used them interchangeably so continue to allow that here
+	# returns a list of all the complete frames in the buffer. Subclasses can do this faster
+	# than a frame at a time
 	#
-	def getStatus( self):
-		return (xtFloat(self.get( xtUnitKeyValue, 0.0)) != 0.0)
-	
-	def getState( self):
-		return (xtFloat( self.get( xtUnitKeyValue, 0.0)) != 0.0)
+	def frames( self):
+		workFrames = []
+		
+		while True:
+			workFrame = self.nextFrame()
+			
+			if workFrame == None:
+				return workFrames
+				
+			workFrames.append( workFrame)
 		
 	#
-	#	G E T   V A L U E
+	#	F L U S H
 	#
-	
-	def getValue( self):
-		return xtFloat(self.get( xtUnitKeyValue, 0))
+	# returns whatever is waiting as a frame even though it isn't complete, or None if there
+	# is nothing waiting. Used for the timeout of XTRemoteConnection.setParsingParams
+	#
+	def flush( self):
+		if self.pending() == 0:
+			return None
+			
+		return self._take( self.start, len( self.buffer))
 		
 	#
-	#	G E T   P R E S E T
+	#	R E S E T
 	#
-	#	return the preset level that we would return to with the next simple on command
+	# throws away any partial frame, called when a connection is made again
 	#
-	def getPreset( self):
-		return xtFloat( self.get( xtUnitKeyPresetLevel, 100))
+	def reset( self):
+		del self.buffer[:]
+		self.start = 0
+		self._compacted( 0)
 		
 	#
-	#	S E T   P R E S E T
+	# the number of bytes waiting that are not part of a complete frame yet
 	#
-	# set the preset level in XTension for this unit to the new value
-	# compares against the current value to make sure it is not sending commands 
-	# unnecessarily
-	def setPreset( self, newPreset):
-		if self.getPreset() == newPreset:
-			return
+	def pending( self):
+		return len( self.buffer) - self.start
 		
-		self.setXTensionData( xtUnitKeyPresetLevel, newPreset)
+	#
+	# takes the bytes from start to end as the frame and moves past them plus skip more bytes
+	#
+	def _take( self, frameStart, frameEnd, skip=0):
+		frame = bytes( self.buffer[ frameStart:frameEnd])
+		self.start = frameEnd + skip
+		return frame
 		
 	#
-	#	E X E C U T E   H A N D L E R
+	# called when there is too much waiting without a complete frame
 	#
-	# runs a handler in the on script with the passed data
+	def _discard( self, count):
+		self.start += count
+		self._discarded( count)
+		
+	def _discarded( self, count):
+		self.discarded += count
+		XTension.writeLog( "%s discarded %s bytes without a complete frame" % (self.__class__.__name__, count), xtLogRed)
+		
 	#
-	#	TODO abandon this stupid comma separated value list and instead switch to a
-	#	JSON data string so that we can actually use typed values properly on both ends
+	# the buffer has moved down by count bytes, for framers that remember positions in it
 	#
-	
-	def executeHandler( self, handlerName, paramDataList = []):
-	
-		self.sendCommand(
-			xtKeyCommand 		= xtCommandScriptHandler,
-			xtKeyName 			= handlerName,
-			xtKeyData 			= XTension.encodeCommaSeparated( paramDataList))
-# 		
-# 		XTension.sendCommand( XTCommand( 
-# 			xtKeyUniqueId = self.uniqueId,
-# 			xtKeyCommand = xtCommandScriptHandler,
-# 			xtKeyCommandTarget = xtTargetUnit,
-# 			xtKeyName = handlerName,
-# 			xtKeyData = XTension.encodeCommaSeparated( paramDataList)))
+	def _compacted( self, count):
+		pass
+		
+		
+#
+#	X T   D E L I M I T E R   F R A M E R
+#
+# frames end with the delimiter which is not included in the frame unless keepDelimiter is
+# True. Where the search for the delimiter got to is remembered so that a frame arriving a 
+# few bytes at a time is only searched once. Empty frames, such as the LF of a CRLF when 
+# the delimiter is just the CR, are skipped unless skipEmpty is False.
+#
+class XTDelimiterFramer( XTFramer):
 
+	def __init__( self, delimiter=b'\r', keepDelimiter=False, skipEmpty=True, maxFrameSize=65536):
+		XTFramer.__init__( self, maxFrameSize)
+		
+		if isPy3 and isinstance( delimiter, str):
+			delimiter = delimiter.encode( 'utf-8')
+			
+		self.delimiter = delimiter
+		self.keepDelimiter = keepDelimiter
+		self.skipEmpty = skipEmpty
+		self._searched = 0 # the buffer before this has been searched and does not hold a delimiter
+		
+	def nextFrame( self):
+		delimiterSize = len( self.delimiter)
+		
+		while True:
+			searchFrom = max( self.start, self._searched)
+			frameEnd = self.buffer.find( self.delimiter, searchFrom)
+			
+			if frameEnd == -1:
+				# the end of the buffer may be the start of the delimiter so search that again
+				self._searched = max( self.start, len( self.buffer) - delimiterSize + 1)
+				
+				if self.pending() > self.maxFrameSize:
+					self._discard( self.pending())
+				return None
+				
+			if frameEnd == self.start and self.skipEmpty:
+				self.start += delimiterSize
+				continue
+				
+			if self.keepDelimiter:
+				return self._take( self.start, frameEnd + delimiterSize)
+			else:
+				return self._take( self.start, frameEnd, delimiterSize)
+				
+	def frames( self):
+		workBuffer = self.buffer
+		delimiter = self.delimiter
+		
+		# everything up to the last delimiter is complete frames which split can do in one go
+		lastEnd = workBuffer.rfind( delimiter, max( self.start, self._searched))
+		
+		if lastEnd == -1 or lastEnd < self.start:
+			self.nextFrame()	# to remember the search and discard if too much is waiting
+			return []
+			
+		workFrames = bytes( workBuffer[ self.start:lastEnd]).split( delimiter)
+		self.start = lastEnd + len( delimiter)
+		self._searched = self.start
+		
+		if self.skipEmpty and b'' in workFrames:
+			workFrames = [workFrame for workFrame in workFrames if workFrame]
+			
+		if self.keepDelimiter:
+			workFrames = [workFrame + delimiter for workFrame in workFrames]
+			
+		return workFrames
+		
+	def reset( self):
+		XTFramer.reset( self)
+		self._searched = 0
+				
+	def _compacted( self, count):
+		self._searched = max( 0, self._searched - count)
+		
+		
+#
+#	X T   F I X E D   F R A M E R
+#
+# every frame is frameSize bytes long
+#
+class XTFixedFramer( XTFramer):
 
+	def __init__( self, frameSize):
+		XTFramer.__init__( self, frameSize)
+		self.frameSize = frameSize
+		
+	def nextFrame( self):
+		if self.pending() < self.frameSize:
+			return None
+			
+		return self._take( self.start, self.start + self.frameSize)
+		
+	def frames( self):
+		frameSize = self.frameSize
+		workSize = self.pending() - (self.pending() % frameSize)
+		
+		if workSize == 0:
+			return []
+			
+		workData = bytes( self.buffer[ self.start:self.start + workSize])
+		self.start += workSize
+		
+		return [workData[ i:i + frameSize] for i in range( 0, workSize, frameSize)]
+		
+		
 #
-# this is a catcher subclass so I don't have to rebuild all the 
-# classes I used in other plugins that I used the capitalization wrong
-class xtUnit( XTUnit):
-	def __init__( self, theData):
-		if isPy3:
-			super().__init__( theData)
+#	X T   L E N G T H   P R E F I X   F R A M E R
+#
+# every frame starts with its length in a 1, 2 or 4 byte unsigned int, big endian unless 
+# bigEndian is False. By default the length counts only the bytes after the prefix, set 
+# lengthIncludesPrefix if the device counts the prefix too. The prefix is left off of the frame
+# passed to frameReceived unless keepPrefix is True.
+#
+class XTLengthPrefixFramer( XTFramer):
+
+	_prefixFormats = {1:'B', 2:'H', 4:'I'}
+	
+	def __init__( self, prefixSize=2, bigEndian=True, lengthIncludesPrefix=False, keepPrefix=False, maxFrameSize=65536):
+		XTFramer.__init__( self, maxFrameSize)
+		
+		if prefixSize not in self._prefixFormats:
+			raise ValueError( "XTLengthPrefixFramer prefixSize must be 1, 2 or 4 not %s" % prefixSize)
+			
+		self.prefixSize = prefixSize
+		self.lengthIncludesPrefix = lengthIncludesPrefix
+		self.keepPrefix = keepPrefix
+		self._prefix = Struct( ('>' if bigEndian else '<') + self._prefixFormats[ prefixSize])
+		
+	def nextFrame( self):
+		skipped = 0
+		
+		while True:
+			if self.pending() < self.prefixSize:
+				frameSize = None
+				break
+			
+			frameSize = self._prefix.unpack_from( self.buffer, self.start)[0]
+		
+			if self.lengthIncludesPrefix:
+				frameSize -= self.prefixSize
+			
+			if frameSize >= 0 and frameSize <= self.maxFrameSize:
+				break
+				
+			# the length cannot be right so we've lost our place in the stream, skip a byte at
+			# a time until we find something that looks like a length again
+			self.start += 1
+			skipped += 1
+			
+		if skipped > 0:
+			self._discarded( skipped)
+			
+		if frameSize == None:
+			return None
+			
+		frameEnd = self.start + self.prefixSize + frameSize
+		
+		if frameEnd > len( self.buffer):
+			return None
+			
+		if self.keepPrefix:
+			return self._take( self.start, frameEnd)
 		else:
-			XTUnit.__init__( self, theData)
+			return self._take( self.start + self.prefixSize, frameEnd)
+			
+	def frames( self):
+		workBuffer = self.buffer
+		bufferEnd = len( workBuffer)
+		unpackPrefix = self._prefix.unpack_from
+		prefixSize = self.prefixSize
+		maxFrameSize = self.maxFrameSize
+		sizeAdjust = prefixSize if self.lengthIncludesPrefix else 0
+		frameOffset = 0 if self.keepPrefix else prefixSize
+		
+		# find where all the complete frames are first and then copy them out of the buffer
+		# in one go, a bad length stops this and nextFrame finds our place again
+		firstStart = self.start
+		workStart = firstStart
+		frameRanges = []
+		badLength = False
+		
+		while bufferEnd - workStart >= prefixSize:
+			frameSize = unpackPrefix( workBuffer, workStart)[0] - sizeAdjust
+			
+			if frameSize < 0 or frameSize > maxFrameSize:
+				badLength = True
+				break
+				
+			frameEnd = workStart + prefixSize + frameSize
+			
+			if frameEnd > bufferEnd:
+				break
+				
+			frameRanges.append( (workStart + frameOffset - firstStart, frameEnd - firstStart))
+			workStart = frameEnd
+			
+		workFrames = []
 		
-
-
+		if frameRanges:
+			workData = bytes( workBuffer[ firstStart:workStart])
+			workFrames = [workData[ a:b] for (a, b) in frameRanges]
+			self.start = workStart
+			
+		if badLength:
+			workFrames += XTFramer.frames( self)
+			
+		return workFrames
+			
+			
 #
-#	x t D O L A T E R
+#	X T   R E G E X   F R A M E R
 #
-# a thread that waits a certain number of seconds to do something and can be delayed
-# by resetting the timeout. Good for sending a status update after a certain time or
-# something similar. Repeated calls to setTimeout will just push back the time.
+# a frame is whatever the regular expression matches, anything before the match is thrown
+# away. The pattern must not be able to match part of a frame that hasn't all arrived yet, so 
+# give it something at both ends to match on. The buffer is searched from the start of the
+# waiting data every time more is received, so maxFrameSize limits how much that can be.
 #
-class XTDoLater:
-	def __init__( self):
-		self._timeLeft = -1 # -1 means our time has expired and we've already run our handler
-		self._thread = None
-		self.threadName = 'XTDoLater' # you can set this in your own subclassed init method if you like
+class XTRegexFramer( XTFramer):
+
+	def __init__( self, pattern, flags=0, maxFrameSize=65536):
+		XTFramer.__init__( self, maxFrameSize)
 		
+		if isPy3 and isinstance( pattern, str):
+			pattern = pattern.encode( 'utf-8')
+			
+		self.pattern = re.compile( pattern, flags)
 		
-	def setTimeout( self, newTimeout):
-		self._timeLeft = newTimeout
-		# if the thread already exists then it's already counting down
-		if self._thread == None:
-			self._thread = Thread( target=self._threadedTimer, args=(), name=self.threadName)
-			self._thread.start()
+		# an empty match would never move past anything
+		if self.pattern.match( b'') != None:
+			raise ValueError( "XTRegexFramer pattern must not match an empty frame")
 		
+	def nextFrame( self):
+		workMatch = self.pattern.search( self.buffer, self.start)
 		
-	def _threadedTimer( self):
-		while self._timeLeft > -1 and not XTension.isShuttingDown:
-
-			sleep( 1)
-
-			self._timeLeft -=1 
+		if workMatch == None:
+			if self.pending() > self.maxFrameSize:
+				self._discard( self.pending())
+			return None
+			
+		if workMatch.start() > self.start:
+			self.discarded += workMatch.start() - self.start
 			
-		self.action()
-		self._thread = None
+		return self._take( workMatch.start(), workMatch.end())
 		
+	def frames( self):
+		workData = bytes( self.buffer[ self.start:])
+		workFrames = []
+		lastEnd = 0
+		
+		for workMatch in self.pattern.finditer( workData):
+			workFrames.append( workMatch.group())
+			self.discarded += workMatch.start() - lastEnd
+			lastEnd = workMatch.end()
 			
+		self.start += lastEnd
 		
+		if self.pending() > self.maxFrameSize:
+			self._discard( self.pending())
+			
+		return workFrames
 		
-	#
-	#	A C T I O N
-	#
-	# subclass to add custom code to this method
-	#
-	def action( self):
-		XTension.writeLog( "subclass the action method to add your own event")
 		
-	
+#
+#	X T   P A R S I N G   F R A M E R
+#
+# the framer for XTRemoteConnection.setParsingParams and the set parsing params verb. A frame
+# ends at the terminator, which is not included, or after length bytes whichever comes first.
+# Either may be left out. With neither the frames are only cut by the parsing timeout.
+#
+# with both a frame isn't cut at length until there are enough bytes after it to see a
+# terminator that starts inside it, so the frames are the same however the data was split
+# up by the reads. A terminator right after the cut is skipped at the start of the next one.
+# flush, for the timeout, still cuts at length so call it until it returns None.
+#
+class XTParsingFramer( XTDelimiterFramer):
 
+	def __init__( self, terminator=b'', length=0, maxFrameSize=65536):
+		XTDelimiterFramer.__init__( self, terminator, maxFrameSize=max( maxFrameSize, length + len( terminator)))
+		self.length = length
+		
+	def nextFrame( self):
+		delimiter = self.delimiter
+		delimiterSize = len( delimiter)
+		
+		while True:
+			if delimiterSize > 0:
+				# only look as far as the end of a frame of the maximum length
+				searchEnd = len( self.buffer)
+				
+				if self.length > 0:
+					searchEnd = min( searchEnd, self.start + self.length + delimiterSize)
+					
+				frameEnd = self.buffer.find( delimiter, max( self.start, self._searched), searchEnd)
+				
+				if frameEnd == self.start:
+					self.start += delimiterSize
+					continue
+					
+				if frameEnd != -1:
+					return self._take( self.start, frameEnd, delimiterSize)
+					
+				self._searched = max( self.start, searchEnd - delimiterSize + 1)
+				
+			if self.length > 0 and self.pending() >= self.length + max( delimiterSize - 1, 0):
+				return self._take( self.start, self.start + self.length)
+				
+			if self.pending() > self.maxFrameSize:
+				self._discard( self.pending())
+				
+			return None
+			
+	def flush( self):
+		if self.length > 0 and self.pending() > self.length:
+			return self._take( self.start, self.start + self.length)
+			
+		return XTDelimiterFramer.flush( self)
 		
+	def frames( self):
+		# with only a terminator the delimiter framer can split everything at once
+		if self.length == 0 and len( self.delimiter) > 0:
+			return XTDelimiterFramer.frames( self)
+			
+		return XTFramer.frames( self)
 		
 		
-
-#
-#	x t T I M E R
-#
-#	THIS IS DEPRECATED do not use this class in new plugins it is not reliable
-#	please just use a regular thread and sleep on it, or use the XTDoLater class above
 #
-# used to create a repeating callback to it's subclassed action() handler
-# subclass this class and add your own action( self) handler that will be called
-# when the period expires.
+#	X T   W R I T E   Q U E U E
 #
-# use the start() and stop() handlers to start and stop the timer. Note that just letting
-# the class go out of scope will not stop the timer.
-# if you wish to be able to stop the timer you must keep a reference to the timer so you 
-# can call stop, or have some mechanism to call stop from the action event.
+# the outgoing queue for an XTRemoteConnection with useWriteQueue set. write appends to the
+# queue and returns straight away so a device that has stopped reading, and filled the socket
+# buffers, blocks only the queue and not whichever thread called write, which may be the
+# thread reading from XTension. The queue is emptied by a thread of its own or by the XTIOLoop
+# when the connection is run by it.
 #
-# any timer that tries to fire once the XTension class is shutting down will be cancelled
+# sendFunc( data, toAddress) sends what it can and returns how many bytes it sent. When coalesce
+# is set everything waiting to go to the same place is joined into one send of up to 
+# maxCoalesce bytes. Datagrams, anything with a toAddress, are always sent one at a time.
 #
-# You can't create any timers until after the connection to XTension is established
-# as the callback relies on the global XTension to be set and pointing to the cXTension object
+# nothing is ever thrown away for being over highWater, instead onFull is called when the
+# bytes waiting reach it and onDrained when they are back down to lowWater so the plugin can
+# stop and start sending, or a thread that is allowed to wait can call waitForRoom.
 #
-#	the inPeriod for the constructor and the setPeriod is in seconds
-#		
 
-
-class XTTimer:
-	def __init__( self, inPeriod):
-		self.isRunning = False
-		self.period = inPeriod
+class XTWriteQueue:
+
+	def __init__( self, sendFunc, highWater=65536, lowWater=None, coalesce=True, maxCoalesce=65536, onFull=None, onDrained=None, onError=None, onWakeup=None, name='XTension Connection Write Thread'):
+		self.sendFunc = sendFunc
+		self.highWater = highWater
+		self.lowWater = lowWater if lowWater != None else highWater // 2
+		self.coalesce = coalesce
+		self.maxCoalesce = maxCoalesce
+		self.onFull = onFull
+		self.onDrained = onDrained
+		self.onError = onError
+		self.name = name
+		
+		# when set this is called after every put instead of using a thread, the XTIOLoop sets
+		# it to start watching the socket for room to write
+		self.onWakeup = onWakeup
+		
+		self.condition = threading.Condition()
+		self.queue = deque() # [data, toAddress, time queued]
+		self.bytesPending = 0
+		self.full = False
+		self.stopped = False
 		self.thread = None
-	
+		
+		# what is being sent now, the data and offset and the times the packets in it were queued
+		self._sending = None
+		self._sendingOffset = 0
+		self._sendingTimes = None
+		self._sendingAddress = None
+		
+		# metrics
+		self.packets = 0
+		self.sends = 0
+		self.bytesWritten = 0
+		self.bytesDropped = 0
+		self.maxBytesPending = 0
+		self.fullCount = 0
+		self.drainedPackets = 0
+		self.totalDrainLatency = 0.0
+		self.maxDrainLatency = 0.0
 		
 	#
-	# 	A C T I O N
-	#	
-	# subclass this class and add your own action handler
-	# it will be called regularly every interval that is set
-	# until you call the stop() action on the class
-	# note that just letting the class go out of scope will not
-	# stop the timer, you must call stop() to stop the timer first
-	# keep a reference to the subclass so that you can stop it.
-	# 	
+	#	P U T
 	#
-	
-	def action( self):
-		print( "subclass me to make event")
+	# returns False only if the queue has been stopped
+	#
+	def put( self, theData, toAddress=None):
+		reachedFull = False
+		
+		with self.condition:
+			if self.stopped:
+				return False
+				
+			self.queue.append( [theData, toAddress, _monotonic()])
+			self.bytesPending += len( theData)
+			self.packets += 1
+			
+			if self.bytesPending > self.maxBytesPending:
+				self.maxBytesPending = self.bytesPending
+				
+			if not self.full and self.bytesPending >= self.highWater:
+				self.full = True
+				self.fullCount += 1
+				reachedFull = True
+				
+			if self.onWakeup == None and self.thread == None:
+				self.thread = Thread( target=self._writer, args=(), name=self.name)
+				self.thread.daemon = True
+				self.thread.start()
+				
+			self.condition.notify_all()
+			
+		if reachedFull:
+			self._callEvent( self.onFull)
+			
+		if self.onWakeup != None:
+			self.onWakeup()
+			
+		return True
 		
-
 	#
-	# 	S T A R T
-	# 
-	# called to start the timer
-	# the period must have already been passed to the constructor
-	# or changed by a call to setPeriod
-	# calling start multiple times is equivalent to calling 
-	# setPeriod with the same interval it cancels any currently outstanding
-	# timer and resets it to the current period. So calling start will reset the timer
-	# good for timeouts and such.
+	#	I S   F U L L
 	#
-	
-	def start( self):
-		if self.thread != None:
-			# just in case a timer thread is already waiting go ahead and cancel it
-			self.thread.cancel()
+	def isFull( self):
+		return self.full
+		
+	def hasPending( self):
+		return self._sending != None or len( self.queue) > 0
+		
+	#
+	#	W A I T   F O R   R O O M
+	#
+	# for threads that can afford to wait, blocks until the queue is below highWater or the
+	# timeout has passed. Returns True if there is room
+	#
+	def waitForRoom( self, timeout=None):
+		return self._waitUntil( lambda: self.bytesPending < self.highWater, timeout)
+		
+	#
+	#	F L U S H
+	#
+	# waits until everything queued so far has been sent, returns True if it was
+	#
+	def flush( self, timeout=None):
+		return self._waitUntil( lambda: not self.hasPending(), timeout)
+		
+	#
+	#	C L E A R
+	#
+	# throws away everything waiting, called when the connection is lost
+	#
+	def clear( self):
+		with self.condition:
+			wasFull = self._clear()
+			self.condition.notify_all()
 			
-		# subscribe to the XTension shutdown command so that we will be stopped and ready to quit properly
-		XTension.addCommandHandler( xtCommandShutdown, self.xtensionShutdown)
-
+		if wasFull:
+			self._callEvent( self.onDrained)
 			
-		self.isRunning = True
-		self.thread = Timer( self.period, self._action)
-		self.thread.start()
-		
 	#
-	# 	S T O P
+	#	S T O P
 	#
-	# stops any currently outstanding timer threads and sets isRunning to false
-	# so that if called from inside the action event no new thread will be created
+	# throws away anything still waiting and ends the thread
 	#
-	
 	def stop( self):
-		self.isRunning = False
-		
-		if self.thread != None:
-			self.thread.cancel()
-			self.thread = None
+		with self.condition:
+			self.stopped = True
+			self._clear()
+			self.condition.notify_all()
 			
-		XTension.removeCommandHandler( self.xtensionShutdown, None)
-
 	#
-	# 	S E T   P E R I O D
+	#	G E T   M E T R I C S
 	#
-	# changes the period of an already created timer
-	# works if the timer is currently running or currently stopped
-	# changing the period or just setting it to the same value resets the
-	# timer and the new period begins counting from then if the timer is running
-	# if the timer is stopped then nothing happens, you must call start again
+	def getMetrics( self):
+		averageDrainLatency = 0.0
+		if self.drainedPackets > 0:
+			averageDrainLatency = self.totalDrainLatency / self.drainedPackets
+			
+		averageSend = 0.0
+		if self.sends > 0:
+			averageSend = float( self.bytesWritten) / self.sends
+			
+		return {
+			'bytesPending':			self.bytesPending,
+			'maxBytesPending':		self.maxBytesPending,
+			'packets':				self.packets,
+			'sends':				self.sends,
+			'averageSend':			averageSend,
+			'bytesWritten':			self.bytesWritten,
+			'bytesDropped':			self.bytesDropped,
+			'full':					self.full,
+			'fullCount':			self.fullCount,
+			'averageDrainLatency':	averageDrainLatency,
+			'maxDrainLatency':		self.maxDrainLatency}
+			
 	#
-	def setPeriod( self, newPeriod):
-	
-		# is running cannot be true if there is no self.thread so
-		# there is no need to check against none
-		if self.isRunning:
-			self.thread.cancel()
+	#	S E N D   A V A I L A B L E
+	#
+	# sends until everything is sent or sendFunc sends less than it was given, which for a non
+	# blocking socket means it's full. Returns True if there is still something waiting. This 
+	# is what the XTIOLoop calls when the socket has room, the thread calls it in a loop.
+	#
+	def sendAvailable( self):
+		while True:
+			with self.condition:
+				if not self._nextSend():
+					return False
+					
+				workData = self._sending
+				workOffset = self._sendingOffset
+				workAddress = self._sendingAddress
+				
+			try:
+				if workOffset == 0:
+					sentCount = self.sendFunc( workData, workAddress)
+				else:
+					sentCount = self.sendFunc( memoryview( workData)[ workOffset:], workAddress)
+					
+			except socket.timeout:
+				# the socket buffer stayed full for the whole socket timeout, just try again
+				return True
+				
+			except Exception as e:
+				self.clear()
+				self._callEvent( self.onError, e)
+				return False
+				
+			if not self._sent( workData, sentCount):
+				return True
+			
+	def _writer( self):
+		while True:
+			with self.condition:
+				while not self.stopped and not self.hasPending():
+					self.condition.wait()
+					
+				if self.stopped:
+					self.thread = None
+					return
+					
+			self.sendAvailable()
 			
-		self.period = newPeriod
-		
-		# if we were running then restart us
-		if self.isRunning:
-			self.start()
-	
-		
 	#
-	# internal action handler, this is the actual callback from the Timer thread
-	# this handles making sure that you should actually be firing, executes your
-	# subclassed action handler and then if you haven't called stop() in the action
-	# then creates the next timer thread.
+	# takes the next packet, or packets if coalescing, to send if nothing is being sent now.
+	# Returns False if there is nothing to send. Called with the condition held
 	#
+	def _nextSend( self):
+		if self._sending != None:
+			return True
+			
+		if len( self.queue) == 0:
+			return False
+			
+		workEntry = self.queue.popleft()
+		workData = workEntry[0]
+		workTimes = [workEntry[2]]
 		
-	def _action( self):
-		#internal action handler that restarts the timer
-	
-		if not self.isRunning:
-			#if XTension.debugMode:
-			XTension.writeLog( "xtTimer.action after having stopped", xtLogRed)
+		if self.coalesce and workEntry[1] == None and len( self.queue) > 0 and self.queue[0][1] == None:
+			workParts = [workData]
+			workSize = len( workData)
+			
+			while len( self.queue) > 0 and self.queue[0][1] == None and workSize + len( self.queue[0][0]) <= self.maxCoalesce:
+				workEntry = self.queue.popleft()
+				workParts.append( workEntry[0])
+				workTimes.append( workEntry[2])
+				workSize += len( workEntry[0])
 				
-			# we should not be firing we should just return
-			return
-	
-		if not XTension.isShuttingDown:
-		
-			# so that an error in the subclassed action handler won't result in 
-			# the entire thing falling out here and stopping we will handle any
-			# otherwise unhandled errors and log them so we can keep going
-			try:
-				self.action()
-			except:
-				(theType, theValue, theTraceback) = sys.exc_info()
-				XTension.writeLog( "Error in xtTimer.action: type=%s value=%s" % (theType, theValue))
-				#XTension.writeLog( "Error in xtTimer.action: type=" + str( theType) + " value=" + str( theValue), xtLogRed)
-				theType = None
-				theValue = None
-				theTraceback = None
-				XTension.writeLog( traceback.format_exc(), xtLogRed)
+			if len( workParts) > 1:
+				workData = b''.join( workParts)
+				
+		self._sending = workData
+		self._sendingOffset = 0
+		self._sendingTimes = workTimes
+		self._sendingAddress = workEntry[1]
+		return True
 		
-			# if you called to stop() inside the action event then
-			# isrunning will have become false here
-			# if isRunning is still True then we must create a new
-			# Timer thread and start it up
-
-			if self.isRunning:
-				self.thread = Timer( self.period, self._action)
-				self.thread.start()
-		else:
-			self.isRunning = False
-	
-	#
-	# 	X T E N S I O N   S H U T D O W N
 	#
-	# subscribed to the shutdown command so that we can stop any outstanding threads
-	# here and not keep the plugin from quitting, or have to force it to wait for the 
-	# action to run so that it will find that XTension is shutting down
+	# records sentCount bytes of workData as sent. Returns True if all of it has been
 	#
-	def xtensionShutdown( self, theCommand):
-		self.stop()
+	def _sent( self, workData, sentCount):
+		reachedLow = False
 		
-# and just this because I was sloppy in my naming conventions at the beginning and some
-# of the original plugins built with this may call it xtTimer instead of XTTimer
-class xtTimer( XTTimer):
-	def __init__( self, inPeriod):
-		XTTimer.__init__( self, inPeriod)
-
-	
+		with self.condition:
+			# cleared or stopped while we were sending
+			if self._sending is not workData:
+				return True
+				
+			self.sends += 1
+			self.bytesWritten += sentCount
+			self.bytesPending -= sentCount
+			self._sendingOffset += sentCount
+			
+			finished = self._sendingOffset >= len( workData)
+			
+			if finished:
+				workNow = _monotonic()
+				
+				for workTime in self._sendingTimes:
+					workLatency = workNow - workTime
+					self.totalDrainLatency += workLatency
+					
+					if workLatency > self.maxDrainLatency:
+						self.maxDrainLatency = workLatency
+						
+				self.drainedPackets += len( self._sendingTimes)
+				self._sending = None
+				
+			if self.full and self.bytesPending <= self.lowWater:
+				self.full = False
+				reachedLow = True
+				
+			self.condition.notify_all()
+			
+		if reachedLow:
+			self._callEvent( self.onDrained)
 			
+		return finished
 		
+	def _clear( self):
+		if self._sending != None:
+			self.bytesDropped += len( self._sending) - self._sendingOffset
+			self._sending = None
 			
+		for workEntry in self.queue:
+			self.bytesDropped += len( workEntry[0])
 			
-				
+		self.queue.clear()
+		self.bytesPending = 0
 		
+		wasFull = self.full
+		self.full = False
+		return wasFull
+		
+	def _waitUntil( self, condition, timeout):
+		endTime = None
+		if timeout != None:
+			endTime = _monotonic() + timeout
+			
+		with self.condition:
+			while not condition():
+				if self.stopped:
+					return False
+					
+				if endTime == None:
+					self.condition.wait()
+				else:
+					remaining = endTime - _monotonic()
+					
+					if remaining <= 0:
+						return False
+						
+					self.condition.wait( remaining)
+					
+			return True
+			
+	def _callEvent( self, callback, *args):
+		if callback == None:
+			return
+			
+		try:
+			callback( *args)
+		except Exception as e:
+			XTension.writeLog( "error in XTWriteQueue event %s: %s" % (callback, e), xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+			
 #
 #	class 	X T   R E M O T E   C O N N E C T I O N
 #
@@ -4265,11 +8017,46 @@ class xtTimer( XTTimer):
 # then use the kwds to send specific keys overriding the xtension.settings object
 # and if you need to listen or send to UDP then you need to send those keys too as there
 # is no (wow premature end of comment...)
+#
+# set useIOLoop to True in your subclass, or pass useIOLoop=True, to have the connection run by 
+# the shared XTension.getIOLoop() thread rather than a thread of its own. All the same events are 
+# called, but from the loop thread, so they must not block. Accepted connections of a listening
+# TCP server are run by the loop too rather than starting a thread for each.
+#
+# to have the data split into messages for you pass a framer=XTDelimiterFramer( b'\r') or similar
+# or call setFramer before any data arrives, then frameReceived( frame) is called for every 
+# complete message instead of dataAvailable and self.buffer is not used. See XTFramer
+#
+# set useParsingParams, or pass useParsingParams=True, to let the user control that from XTension
+# with the set parsing params verb. The terminator, length and timeout it sends are applied to 
+# the connection as they arrive, see setParsingParams. 
+#
+# the serial thread normally reads a byte and then whatever else is waiting, which for a fast
+# device is a few bytes at a time and so a dataAvailable for every few bytes. Set serialReadSize
+# to read bursts instead, into a buffer of that size, until there has been serialInterByteTimeout
+# seconds of quiet or the data ends with the delimiter of the framer. Both can be kwds too.
+#
+# set useWriteQueue, or pass useWriteQueue=True, and write only queues the data and returns. It
+# is sent by a thread of the connection's own, or by the loop with useIOLoop, see XTWriteQueue.
+# writeQueueFull and writeQueueDrained are called as the data waiting passes writeHighWater and
+# comes back down to half of it. Call flushWrites before close if what was written must go out.
 
 class XTRemoteConnection:
 
+	useIOLoop = False
+	useParsingParams = False
+	framer = None
+	
+	serialReadSize = 0 # 0 for the byte then in_waiting reads
+	serialInterByteTimeout = 0.005 # seconds of quiet that end a burst when serialReadSize is set
+	
+	useWriteQueue = False
+	writeHighWater = 65536 # bytes waiting to be sent before writeQueueFull is called
+	writeCoalesce = True # join the writes that are waiting into one send
+
 	def __init__( self, **kwds):
 		self.sock = None
+		self.serialPort = None
 		self.closed = False
 		self.errorSent = False # keeps from logging errors constantly
 		self.buffer = b''
@@ -4284,17 +8071,71 @@ class XTRemoteConnection:
 			# a subclass is not necessary for the UDP server as it's not a stream and so is not threaded.
 		self.lastRead = b''
 		
-		self.connectedThreads = [] # an array to hold a reference to the connected threads so that they don't get removed before we're done with them
-
+		self.connectedThreads = [] # an array to hold a reference to the connected threads so that they don't get removed before we're done with them
+
+		
+		self.connectionMethod = xtPortNameNone
+		
+		# the XTIOLoop if we are being run by it rather than the workThread and the last
+		# time data was received, see _ioTick
+		self._ioLoop = None
+		self._lastActivity = _monotonic()
+		
+		if 'useIOLoop' in kwds:
+			self.useIOLoop = kwds.pop( 'useIOLoop')
+			
+		if 'serialReadSize' in kwds:
+			self.serialReadSize = kwds.pop( 'serialReadSize')
+			
+		if 'serialInterByteTimeout' in kwds:
+			self.serialInterByteTimeout = kwds.pop( 'serialInterByteTimeout')
+			
+		for workKey in ('useWriteQueue', 'writeHighWater', 'writeCoalesce'):
+			if workKey in kwds:
+				setattr( self, workKey, kwds.pop( workKey))
+				
+		self._writeQueue = None
+		
+		if self.useWriteQueue:
+			self._writeQueue = XTWriteQueue( self._sendSome, 
+				highWater = self.writeHighWater, 
+				coalesce = self.writeCoalesce,
+				onFull = self.writeQueueFull,
+				onDrained = self.writeQueueDrained,
+				onError = self.error)
+			
+		# the framer is used from the reading thread and the parsing timeout on the scheduler
+		self._frameLock = threading.RLock()
+		self._parsingTimeout = 0
+		self._parsingFlush = None
+		self._parsingHandler = False
+		
+		if 'framer' in kwds:
+			self.setFramer( kwds.pop( 'framer'))
+			
+		if 'useParsingParams' in kwds:
+			self.useParsingParams = kwds.pop( 'useParsingParams')
+			
+		if self.useParsingParams:
+			XTension.addCommandHandler( xtCommandSetParsingParams, self.event_setParsingParams)
+			self._parsingHandler = True
+			
+			# the last ones sent may also be in the settings or passed in the kwds
+			if self.getParm( xtKeyTerminator, None) != None or self.getParm( xtKeyLength, None) != None or self.getParm( xtKeyTimeout, None) != None:
+				self.setParsingParams( self.getParm( xtKeyTerminator, None), self.getParm( xtKeyLength, 0), self.getParm( xtKeyTimeout, 0))
 		
-		self.connectionMethod = xtPortNameNone
+		self._startConnection()
 		
 		
-		# create the proper connection method based on the users preferences
-		# TODO: also support incoming connections
+	#
+	#	_ S T A R T   C O N N E C T I O N
+	#
+	# create the proper connection method based on the users preferences, AsyncXTRemoteConnection
+	# in xtension_async replaces this with its own
+	#
+	def _startConnection( self):
 		# TODO: add thread protection with locks in the write methods
 		
-
 		portName = self.getParm( xtKeyPortName, None)
 		
 		if portName == None or portName == xtPortNameNone:
@@ -4306,8 +8147,9 @@ class XTRemoteConnection:
 			XTension.debugLog( "opening outgoing TCP connection")
 			self.connectionMethod = xtPortNameOutgoingTCP
 			
-			self.workThread = Thread( target=self.TCPSocketThread, args=())
-			self.workThread.start()
+			if not self._ioStart( self._ioConnectTCP):
+				self.workThread = Thread( target=self.TCPSocketThread, args=())
+				self.workThread.start()
 			
 		elif portName == xtPortNameListen:
 
@@ -4317,14 +8159,16 @@ class XTRemoteConnection:
 			if self.listenType == xtKeyListenTypeTCP:		
 				XTension.debugLog( "starting TCP listening server")
 				
-				self.workThread = Thread( target=self.TCPServerThread, args=())
-				self.workThread.start()
+				if not self._ioStart( self._ioListenTCP):
+					self.workThread = Thread( target=self.TCPServerThread, args=())
+					self.workThread.start()
 				
-			elif self.listenType == xtKeyListTypeUDP:
+			elif self.listenType == xtKeyListenTypeUDP:
 				XTension.debugLog( "starting UDP listening server")
 				
-				self.workThread = Thread( target=self.UDPServerThread, args=())
-				self.workThread.start()
+				if not self._ioStart( self._ioListenUDP):
+					self.workThread = Thread( target=self.UDPServerThread, args=())
+					self.workThread.start()
 				
 			else:
 				XTension.debugLog( "unknkown listen type requested (%s)" % self.listenType)
@@ -4337,8 +8181,9 @@ class XTRemoteConnection:
 			# so... I never implemented the serial connection here? I definitely meant to do that...
 			# well I guess I'll do that now so I don't have to keep doing it later
 			
-			self.workThread = Thread( target=self.serialThread, args=())
-			self.workThread.start()
+			if not self._ioStart( self._ioOpenSerial):
+				self.workThread = Thread( target=self.serialThread, args=())
+				self.workThread.start()
 			
 			
 	#
@@ -4349,23 +8194,60 @@ class XTRemoteConnection:
 	
 	def close( self):
 		self.isConnected = False
-		self.buffer = b''
+		self._resetBuffer()
+		
+		if self._parsingHandler:
+			self._parsingHandler = False
+			XTension.removeCommandHandler( xtCommandSetParsingParams, self.event_setParsingParams)
+			
+		if self._parsingFlush != None:
+			XTension.getScheduler().cancel( self._parsingFlush)
+			self._parsingFlush = None
+			
+		if self._writeQueue != None:
+			self._writeQueue.stop()
+			
 		self.connected = False
 		self.closed = True # this keeps it from reconnecting upon the closed error
 		
+		workSock = self.sock
+		workPort = self.serialPort
+		self.sock = None
+		self.serialPort = None
 		
-		if self.sock != None:
+		# the loop may be waiting on them so they are closed in the loop thread
+		if self._ioLoop != None and not self._ioLoop.isLoopThread():
+			self._ioLoop.callSoon( self._ioRelease, workSock, workPort)
+		else:
+			self._ioRelease( workSock, workPort)
+			
+	#
+	# closes the socket and or port and stops the loop watching them
+	#
+	def _ioRelease( self, workSock, workPort):
+		if self._ioLoop != None:
+			self._ioLoop.removeTicker( self)
+			
+		if workSock != None:
+			if self._ioLoop != None:
+				self._ioLoop.unregister( workSock)
+				
 			try:
-				self.sock.shutdown( socket.SHUT_RDWR)
-				self.sock.close()
-				self.sock = None
+				workSock.shutdown( socket.SHUT_RDWR)
+			except Exception as e:
+				pass
+				
+			try:
+				workSock.close()
 			except Exception as e:
 				pass
 		
-		if self.serialPort != None:
+		if workPort != None:
+			if self._ioLoop != None:
+				self._ioLoop.unregister( workPort)
+				
 			try:
-				self.serialPort.close()
-				self.serialPort = NOne
+				workPort.close()
 			except:
 				pass
 	
@@ -4378,12 +8260,8 @@ class XTRemoteConnection:
 	def serialThread( self):
 	
 		self.serialPort = None
-		errorSent = False # dont log constantly, just when we have an error
 		self.closed = False
 		
-		# need this outside of the loop so we can log errors properly
-		portPath = '/dev/tty.notset'
-	
 		# if XTension is shutting down we should stop restarting the connection
 		# also if we have specifically had our close call above called then we should
 		# also close and release the port
@@ -4392,68 +8270,10 @@ class XTRemoteConnection:
 		while not XTension.isShuttingDown and not self.closed:
 			# if we dont have a port, or if we lost it due to error then try to create it again
 			if self.serialPort == None:
-				try:
-					portPath = '/dev/tty.' + XTension.settings.get( xtKeyPortName, 'none')
-
-
-					XTension.writeLog( "baud: %s bits: %s parity: %s stopBits: %s" % (self.getParm( xtKeyBaud, 9600), self.getByteSize(), self.getParity(), self.getStopBits()))
-					
-					self.serialPort = serial.Serial( 
-						port 			= portPath,
-						baudrate 		= self.getParm( xtKeyBaud, 9600),
-						bytesize 		= self.getByteSize(),
-						parity 			= self.getParity(),
-						stopbits 		= self.getStopBits(),
-						timeout 		= 1,	# we want the timeout so it can drive timers and be the same as the socket implementation
-						xonxoff 		= self.getParm( xtKeyHandshakeXONXOFF, False),
-						rtscts 			= self.getParm( xtKeyHandshakeRTSCTS, False),
-						dsrdtr 			= self.getParm( xtKeyHandshakeDSRDTR, False))
-
-					# if requested turn on the rts and or dtr pins
-					# note that this will be either ignored or break things or behave strangely
-					# if any hardware flow control is turned on as well.
-					self.serialPort.rts = self.getParm( xtKeyRTSOn, False)
-					self.serialPort.dtr = self.getParm( xtKeyDTROn, False)
-					
-					# flush the buffer. Not sure this will actually do anything in this case if the 
-					# interface itself is doing the buffering and not the system level part of it
-					# but still anything to avoid a bolus of stale data at connection should be attempted
-					self.serialPort.reset_input_buffer()
-					
-
-					XTension.setRunState( xtRunStateOK, "Port Opened: %s" % portPath)
-					errorSent = False
-					self.connected = True
-					
-					try:
-						self.eventConnected()
-					except Exception as e:
-						XTension.writeLog( "Error in serial port connected event: %s" % e, xtLogRed)
-						
-					
-					
-				except Exception as e:
-					self.serialPort = None
-
-					XTension.setRunState( xtRunStateError, "error opening port: %s" % portPath)
-					if not errorSent:
-						errorSent = True
-						XTension.writeLog( "Unable to open serial port: %s  %s" % (portPath, e))
-						
-					try:
-						# return true from the handler to make this not log it's own error
-						if not self.error( e):
-							XTension.writeLog( "Error opening port: %s" % e, xtLogRed)
-							XTension.writeLog( traceback.format_exc(), xtLogRed)
-							
-					except Exception as e:
-						XTension.writeLog( "error in error handler itself: XTRemoteConnection.serialThread.error( %s)" % e, xtLogRed)
-						XTension.writeLog( traceback.format_exc(), xtLogRed)
-					
+				if not self._openSerialPort():
 					# sleep and try again in case the port shows up or is able to be opened later
 					sleep( 1)
 					continue
-					
 				
 				
 				
@@ -4462,7 +8282,10 @@ class XTRemoteConnection:
 				# block until we get a single character
 				# then read as many as are available, then call the dataAvailable event
 				# the read will be empty if there was a timeout it seems
-				self.lastRead = self.serialPort.read( 1)
+				if self.serialReadSize > 0:
+					self.lastRead = self._readSerialBurst()
+				else:
+					self.lastRead = self.serialPort.read( 1)
 
 				if self.lastRead == b'':
 					# normal timeout? should just loop and check again for if we are closed on purpose
@@ -4477,32 +8300,22 @@ class XTRemoteConnection:
 					
 					continue
 				
-				#self.buffer += firstChar
-				available = self.serialPort.in_waiting
-				while available > 0:
-					self.lastRead += self.serialPort.read( available)
+				if self.serialReadSize == 0:
 					available = self.serialPort.in_waiting
+					while available > 0:
+						self.lastRead += self.serialPort.read( available)
+						available = self.serialPort.in_waiting
 					
-				#print( "read( %s)" % self.lastRead)
-				
-				self.buffer += self.lastRead
-				
-# 				if available > 0:
-# 					#self.buffer += self.serialPort.read( available)
-# 					nextBlock = self.serialPort.read( available)
-
-
-# 				print( "about to call data available")
-				self.dataAvailable()
-				continue
-					
-				
 			except Exception as e:
 				XTension.debugLog( "exception in Serial Read Thread: %s" % e)
 
 				if XTension.isShuttingDown:
 					sys.exit()
 					return
+					
+				# close was called while we were waiting in the read
+				if self.closed:
+					return
 				try:
 					self.error( e)
 				except Exception as f:
@@ -4510,6 +8323,119 @@ class XTRemoteConnection:
 					
 				sleep( 2)
 				continue
+				
+			self._deliverData( self.lastRead)
+			
+			
+	#
+	#	_ R E A D   S E R I A L   B U R S T
+	#
+	#	waits up to the port timeout for a byte and then keeps reading whatever is waiting until
+	#	serialReadSize bytes, serialInterByteTimeout of quiet or the data ends with the delimiter
+	#	of the framer so a complete line isn't held waiting for the quiet. Returns b'' on a timeout.
+	#	Everything goes through pyserial so cancel_read, it's timeouts and errors still apply. It's
+	#	own inter_byte_timeout can't be used for this, on posix read still waits for the whole
+	#	timeout or size before it returns
+	#
+	def _readSerialBurst( self):
+		workPort = self.serialPort
+		readSize = self.serialReadSize
+		
+		workData = workPort.read( 1)
+		if workData == b'':
+			return workData
+			
+		boundary = getattr( self.framer, 'delimiter', b'')
+		boundarySize = len( boundary)
+		
+		while len( workData) < readSize:
+			available = workPort.in_waiting
+			
+			if available == 0:
+				if boundarySize > 0 and workData.endswith( boundary):
+					break
+					
+				sleep( self.serialInterByteTimeout)
+				available = workPort.in_waiting
+				
+				if available == 0:
+					break
+					
+			workData += workPort.read( min( available, readSize - len( workData)))
+			
+		return workData
+		
+		
+	#
+	#	_ O P E N   S E R I A L   P O R T
+	#
+	#	opens self.serialPort with the settings from XTension and calls eventConnected. Returns
+	#	False if it couldn't be opened, the error is only logged the first time until it opens
+	#
+	def _openSerialPort( self):
+	
+		# need this outside of the try so we can log errors properly
+		portPath = '/dev/tty.notset'
+		
+		try:
+			portPath = '/dev/tty.' + self.getParm( xtKeyPortName, 'none')
+
+
+			XTension.writeLog( "baud: %s bits: %s parity: %s stopBits: %s" % (self.getParm( xtKeyBaud, 9600), self.getByteSize(), self.getParity(), self.getStopBits()))
+			
+			self.serialPort = serial.Serial( 
+				port 			= portPath,
+				baudrate 		= self.getParm( xtKeyBaud, 9600),
+				bytesize 		= self.getByteSize(),
+				parity 			= self.getParity(),
+				stopbits 		= self.getStopBits(),
+				timeout 		= 1,	# we want the timeout so it can drive timers and be the same as the socket implementation
+				xonxoff 		= self.getParm( xtKeyHandshakeXONXOFF, False),
+				rtscts 			= self.getParm( xtKeyHandshakeRTSCTS, False),
+				dsrdtr 			= self.getParm( xtKeyHandshakeDSRDTR, False))
+
+			# if requested turn on the rts and or dtr pins
+			# note that this will be either ignored or break things or behave strangely
+			# if any hardware flow control is turned on as well.
+			self.serialPort.rts = self.getParm( xtKeyRTSOn, False)
+			self.serialPort.dtr = self.getParm( xtKeyDTROn, False)
+			
+			# flush the buffer. Not sure this will actually do anything in this case if the 
+			# interface itself is doing the buffering and not the system level part of it
+			# but still anything to avoid a bolus of stale data at connection should be attempted
+			self.serialPort.reset_input_buffer()
+			
+
+			XTension.setRunState( xtRunStateOK, "Port Opened: %s" % portPath)
+			self.errorSent = False
+			self.connected = True
+			
+			try:
+				self.eventConnected()
+			except Exception as e:
+				XTension.writeLog( "Error in serial port connected event: %s" % e, xtLogRed)
+				
+			return True
+			
+		except Exception as e:
+			self.serialPort = None
+
+			XTension.setRunState( xtRunStateError, "error opening port: %s" % portPath)
+			if not self.errorSent:
+				self.errorSent = True
+				XTension.writeLog( "Unable to open serial port: %s  %s" % (portPath, e))
+				
+			try:
+				# return true from the handler to make this not log it's own error
+				if not self.error( e):
+					XTension.writeLog( "Error opening port: %s" % e, xtLogRed)
+					XTension.writeLog( traceback.format_exc(), xtLogRed)
+					
+			except Exception as e:
+				XTension.writeLog( "error in error handler itself: XTRemoteConnection.serialThread.error( %s)" % e, xtLogRed)
+				XTension.writeLog( traceback.format_exc(), xtLogRed)
+				
+			return False
 								
 
 
@@ -4585,13 +8511,18 @@ class XTRemoteConnection:
 				# newData will be empty if the socket has closed sometimes without an 
 				# error being caught so we need to treat this like an error
 				
-				if newData == '':
+				if newData == b'':
 					if XTension.isShuttingDown:
 						sys.exit()
 						return
 					
 					self.isConnected = False # DEPRECATED use connected
 					self.connected = False
+					
+					# we closed it ourselves, that isn't an error and there is nothing to restart
+					if self.closed:
+						return
+						
 					self.error( 'disconnected')
 					
 					XTension.debugLog( "attempting to restart connection after empty reception")
@@ -4618,6 +8549,10 @@ class XTRemoteConnection:
 				if XTension.isShuttingDown:
 					sys.exit()
 					return
+					
+				if self.closed:
+					return
+					
 				try:
 					self.error( e)
 				except Exception as f:
@@ -4628,34 +8563,287 @@ class XTRemoteConnection:
 				
 			
 			#
-			# append to the buffer 
+			# append to the buffer and call the dataAvailable event in the subclass so that they
+			# can process this
 			#
-			self.buffer += newData
+			self._deliverData( newData)
 			
-			#
-			# call the dataAvailable event in the subclass so that they can process this
-			#
+			
+	#
+	#	_ D E L I V E R   D A T A
+	#
+	#	appends newly received data to the buffer and calls dataAvailable, for every kind of 
+	#	connection except UDP where each datagram replaces the buffer
+	#
+	def _deliverData( self, newData):
+		self._lastActivity = _monotonic()
+		
+		if self.framer != None:
+			self._deliverFrames( newData)
+			
+			# anything left over is sent anyway if nothing more arrives before the timeout
+			if self._parsingTimeout > 0 and self.framer != None and self.framer.pending() > 0:
+				self._scheduleParsingFlush()
+			return
+			
+		self.buffer += newData
+		
+		try:
 			self.dataAvailable()
+		except Exception as e:
+			XTension.writeLog( "error in XTRemoteConnection.dataAvailable( %s)" % e, xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+	#
+	# passes the data through the framer and calls frameReceived for each complete frame
+	#
+	def _deliverFrames( self, newData):
+		with self._frameLock:
+			workFramer = self.framer
+			workFramer.feed( newData)
+		
+			try:
+				workFrames = workFramer.frames()
+			except Exception as e:
+				XTension.writeLog( "error in %s.frames( %s)" % (workFramer.__class__.__name__, e), xtLogRed)
+				XTension.writeLog( traceback.format_exc(), xtLogRed)
+				workFramer.reset()
+				return
+				
+			self._sendFrames( workFrames)
+			
+	def _sendFrames( self, workFrames):
+		for workFrame in workFrames:
+			try:
+				self.frameReceived( workFrame)
+			except Exception as e:
+				XTension.writeLog( "error in XTRemoteConnection.frameReceived( %s)" % e, xtLogRed)
+				XTension.writeLog( traceback.format_exc(), xtLogRed)
+				
+	#
+	#	S E T   P A R S I N G   P A R A M S
+	#
+	# cut the received data into frames at the terminator, or after length bytes, and send
+	# whatever has arrived if nothing more comes in for timeout seconds. Any of them may be 
+	# empty or 0 to not use it, with none of them at all dataAvailable is called as usual. Data
+	# that has already arrived but not been sent yet is kept and cut by the new settings.
+	#
+	def setParsingParams( self, terminator=None, length=0, timeout=0):
+		if terminator == None:
+			terminator = b''
+		elif isPy3 and isinstance( terminator, str):
+			terminator = terminator.encode( 'utf-8')
+			
+		try:
+			length = int( length or 0)
+			timeout = float( timeout or 0)
+		except ValueError as e:
+			XTension.writeLog( "invalid parsing params length: %s timeout: %s" % (length, timeout), xtLogRed)
+			return
+			
+		XTension.debugLog( "parsing params terminator: %s length: %s timeout: %s" % (repr( terminator), length, timeout))
+		
+		with self._frameLock:
+			leftOver = b''
+			
+			if self.framer != None:
+				leftOver = b''.join( self._flushFramer())
+			
+			if terminator or length > 0 or timeout > 0:
+				self.framer = XTParsingFramer( terminator, length)
+			else:
+				self.framer = None
+				
+			self._parsingTimeout = timeout
+			
+			if timeout <= 0 and self._parsingFlush != None:
+				XTension.getScheduler().cancel( self._parsingFlush)
+				self._parsingFlush = None
+				
+			if leftOver:
+				self._deliverData( leftOver)
+				
+	#
+	#	S E T   P A R S I N G   P A R A M S   E V E N T
+	#
+	# XTension sends xtCommandSetParsingParams when the set parsing params verb is run
+	#
+	def event_setParsingParams( self, theCommand):
+		self.setParsingParams( theCommand.get( xtKeyTerminator, None), theCommand.get( xtKeyLength, 0), theCommand.get( xtKeyTimeout, 0))
+		
+	#
+	# pushes the parsing timeout back to timeout seconds from now, the scheduler only moves an
+	# entry when it's later so this is cheap for every read
+	#
+	def _scheduleParsingFlush( self):
+		if self._parsingFlush == None:
+			self._parsingFlush = XTension.getScheduler().callLater( self._parsingTimeout, self._parsingTimeoutExpired)
+		else:
+			self._parsingFlush = XTension.getScheduler().reschedule( self._parsingFlush, self._parsingTimeout)
+			
+	def _parsingTimeoutExpired( self):
+		# events happen on the loop thread when we're run by it
+		if self._ioLoop != None:
+			self._ioLoop.callSoon( self._flushParsing)
+		else:
+			self._flushParsing()
+			
+	def _flushParsing( self):
+		with self._frameLock:
+			if self.framer == None or self._parsingTimeout <= 0:
+				return
+				
+			# more data may have arrived as we were called and the flush moved later
+			if _monotonic() - self._lastActivity < self._parsingTimeout:
+				return
+				
+			workFrames = self._flushFramer()
+			
+			if workFrames:
+				self._sendFrames( workFrames)
+				
+	# everything waiting in the framer, a parsing framer can give more than one frame
+	def _flushFramer( self):
+		workFrames = []
+		workFrame = self.framer.flush()
+		
+		while workFrame:
+			workFrames.append( workFrame)
+			workFrame = self.framer.flush()
+			
+		return workFrames
+				
+	#
+	#	S E T   F R A M E R
+	#
+	# use the framer to split the received data into frames for frameReceived. Anything already
+	# in self.buffer is given to it first. Pass None to go back to self.buffer and dataAvailable
+	#
+	def setFramer( self, framer):
+		self.framer = framer
+		
+		if framer != None and self.buffer:
+			workBuffer = self.buffer
+			self.buffer = b''
+			self._deliverFrames( workBuffer)
+			
+	#
+	# empties the buffer, and the framer if there is one, at connect and close
+	#
+	def _resetBuffer( self):
+		self.buffer = b''
+		
+		if self.framer != None:
+			self.framer.reset()
 			
 	#
 	#	SOCKET TIMEOUT
 	#
-	# subclass to get an event every second as the socket times out
-	# good for doing pings or keeping track of other things
+	# subclass to get an event every second as the socket times out
+	# good for doing pings or keeping track of other things
+	#
+	# this does nothing in the super class
+	#
+	def socketTimeout( self):
+		pass
+			
+	#
+	#	TCPServerThread
+	#
+	# if creating a listening TCP server then this will be the thread that is used
+	# subclass the 
+	
+	def TCPServerThread( self):
+		
+		if not self._openTCPServerSocket():
+			sys.exit()
+			return
+			
+			
+		while not XTension.isShuttingDown:
+			
+			try:
+				workSock, addr = self.sock.accept()
+				
+			except socket.timeout as e:
+				# timeout just lets us check for being shut down
+				continue
+			
+			except Exception as e:
+			
+				if XTension.isShuttingDown or self.closed:
+					sys.exit()
+					return
+
+				self.isConnected = False
+				self.connected = False
+				self.error( e)
+				sleep( 1)
+				continue
+				
+			# startup the thread handler for the connection
+			
+			# attempt setting the socket keep alive here then rather than on the server itself
+			#workSock.setsockopt( socket.IPPROTO_TCP, TCP_KEEPALIVE, 30)
+			# AH but this is the incoming server stuff, and that is not what I was trying to fix arrg...
+			
+			self._acceptConnection( workSock, addr)
+			
+			
+	#
+	#	_ A C C E P T   C O N N E C T I O N
+	#
+	#	asks makeTCPServerThread for the object to handle a new connection and starts it
+	#
+	def _acceptConnection( self, workSock, addr):
+		workThread = self.makeTCPServerThread( addr[0])
+		
+		if workThread == None:
+			XTension.debugLog( "connection from %s was refused" % addr[0], xtLogRed)
+			try:
+				workSock.close()
+			except:
+				pass
+				
+			return
+		
+		self.connectedThreads.append( workThread)
+		
+		#def _setup( self, ip, port, sock, myServer):
+
+		workThread._setup( addr[0], addr[1], workSock, self)
+		
+		
+	#
+	#	_ L I S T E N   A D D R E S S
 	#
-	# this does nothing in the super class
+	#	the address and port for a listening server, the addresss to bind to should be either
+	#	what we get from getIp or 0.0.0.0 or whatever is set in XTension. The port is -1 if
+	#	none was set
 	#
-	def socketTimeout( self):
-		pass
+	def _listenAddress( self):
+		
+		# TODO: add script handler to set the local address
+		
+		if XTension.settings.exists( xtKeyForceIp):
+			listenNetwork = XTension.settings.get( xtKeyForceIp)
+		else:
+			listenNetwork = self.getParm( xtKeyLocalAddress, None)
 			
+			if listenNetwork == None or listenNetwork == '127.0.0.1':
+				listenNetwork = getIp()
+				
+		listenPort = int( self.getParm( xtKeyRemotePort, -1))
+		return (listenNetwork, listenPort)
+		
+		
 	#
-	#	TCPServerThread
+	#	_ O P E N   T C P   S E R V E R   S O C K E T
 	#
-	# if creating a listening TCP server then this will be the thread that is used
-	# subclass the 
-	
-	def TCPServerThread( self):
-		
+	#	creates the listening socket in self.sock and calls listening. Returns False if it
+	#	could not be opened
+	#
+	def _openTCPServerSocket( self):
 		TCP_KEEPALIVE = 0x10
 		try:
 			self.sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM)
@@ -4665,27 +8853,14 @@ class XTRemoteConnection:
 			# as that is on the listening socket. It does not carry through to the received
 			# sockets so add that to the ones we receive.
 			
-			# the addresss to bind to should be either what we get from getIp or 0.0.0.0
-			# or whatever is set in XTension
-			
-			# TODO: add script handler to set the local address
-			
-			if XTension.settings.exists( xtKeyForceIp):
-				listenNetwork = XTension.settings.get( xtKeyForceIp)
-			else:
-				listenNetwork = self.getParm( xtKeyLocalAddress, None)
-				
-				if listenNetwork == None or listenNetwork == '127.0.0.1':
-					listenNetwork = getIp()
-					
-			listenPort = int( self.getParm( xtKeyRemotePort, -1))
+			listenNetwork, listenPort = self._listenAddress()
 			
 			if listenPort == -1:
-				XTension.writeLog( "no port was specified for the listening TCP server. Cannot startup", xtLogred)
+				XTension.writeLog( "no port was specified for the listening TCP server. Cannot startup", xtLogRed)
 				XTension.setRunState( xtRunStateFail, "no port specified")
 				self.isConnected = False
 				self.connected = False
-				return
+				return False
 				
 			# not sure this will work actually but want to be able to stop the listen if we 
 			self.sock.settimeout( 1)
@@ -4695,60 +8870,16 @@ class XTRemoteConnection:
 			self.sock.listen( 10)
 			self.connected = True
 			self.listening()
+			return True
 			
 		except Exception as e:
 			self.isConnected = False
 			self.connected = False
 			self.error( e)
 			XTension.setRunState( xtRunStateFail, str( e))
-			sys.exit()
-			return
-			
-			
-		while not XTension.isShuttingDown:
-			
-			try:
-				workSock, addr = self.sock.accept()
-				
-			except socket.timeout as e:
-				# timeout just lets us check for being shut down
-				continue
-			
-			except Exception as e:
-			
-				if XTension.isShuttingDown:
-					sys.exit()
-					return
-
-				self.isConnected = False
-				self.connected = False
-				self.error( e)
-				
-			# startup the thread handler for the connection
-			
-			# attempt setting the socket keep alive here then rather than on the server itself
-			#workSock.setsockopt( socket.IPPROTO_TCP, TCP_KEEPALIVE, 30)
-			# AH but this is the incoming server stuff, and that is not what I was trying to fix arrg...
-			
-			
-			workThread = self.makeTCPServerThread( addr[0])
-			
-			if workThread == None:
-				XTension.debugLog( "connection from %s was refused" % addr[0], xtLogRed)
-				try:
-					workSocket.close()
-				except:
-					pass
-					
-				workSocket = None
-				continue
+			return False
 			
-			self.connectedThreads.append( workThread)
 			
-			#def _setup( self, ip, port, sock, myServer):
-
-			workThread._setup( addr[0], addr[1], workSock, self)
-					
 	#
 	#	MAKE TCP SERVER THREAD
 	#
@@ -4772,73 +8903,407 @@ class XTRemoteConnection:
 	
 	def UDPServerThread( self):
 
+		if not self._openUDPServerSocket():
+			return
+		
+		while not XTension.isShuttingDown:
+		
+			try:
+				workMessage, workAddress = self.sock.recvfrom( 4096)
+				
+			except socket.timeout:
+				continue
+			except Exception as e:
+				if XTension.isShuttingDown or self.closed:
+					sys.exit()
+					return
+				
+				self.error( e)
+				sleep( 1)
+				continue
+			
+			self._deliverDatagram( workMessage, workAddress)
+			
+			
+	#
+	# each datagram replaces the buffer rather than being added to it
+	#
+	def _deliverDatagram( self, workMessage, workAddress):
+		self._lastActivity = _monotonic()
+		self.remoteAddress = workAddress
+		
+		# a frame can't span datagrams, whatever is left of the last one is thrown away
+		if self.framer != None:
+			self.framer.reset()
+			self._deliverFrames( workMessage)
+			return
+			
+		self.buffer = workMessage
+		try:
+			self.dataAvailable()
+		except Exception as e:
+			XTension.writeLog( "error in datagramReceived: %s" % e, xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
+			
+			
+	#
+	#	_ O P E N   U D P   S E R V E R   S O C K E T
+	#
+	#	creates the UDP socket in self.sock and calls listening. Returns False if it could not
+	#	be opened
+	#
+	def _openUDPServerSocket( self):
 		try:
 			self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 			self.sock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-			# the addresss to bind to should be either what we get from getIp or 0.0.0.0
-			# or whatever is set in XTension
-			
-			# TODO: add script handler to set the local address
-			
-			if XTension.settings.exists( keyForceIp):
-				listenNetwork = XTension.settings.get( keyForceIp)
-			else:
-				listenNetwork = self.getParm( xtKeyLocalAddress, None)
-				
-				if listenNetwork == None or listenNetwork == '127.0.0.1':
-					listenNetwork = getIp()
-					
-			listenPort = int( self.getParm( xtKeyRemotePort, -1))
+			listenNetwork, listenPort = self._listenAddress()
 			
 			if listenPort == -1:
-				XTension.writeLog( "no port was specified for the listening UDP server. Cannot startup", xtLogred)
+				XTension.writeLog( "no port was specified for the listening UDP server. Cannot startup", xtLogRed)
 				XTension.setRunState( xtRunStateFail, "no port specified")
 				self.isConnected = False
 				self.connected = False
+				return False
+				
+			
+			self.sock.settimeout( 1)
+			self.sock.bind( (listenNetwork, listenPort))
+			
+			self.isConnected = True
+			self.connected = False
+		
+		except Exception as e:
+			self.error( e)
+			self.isConnected = False
+			self.connected = False
+			return False
+			
+		self.listening()
+		return True
+		
+		
+	#
+	#	I O   L O O P
+	#
+	#	the same connections as the threads above but run by the XTIOLoop. _ioStart returns
+	#	False if the loop isn't being used and the thread should be started instead. Everything
+	#	else here is only called in the loop thread.
+	#
+	def _ioStart( self, startMethod):
+		if not self.useIOLoop:
+			return False
+			
+		self._ioLoop = XTension.getIOLoop()
+		if self._ioLoop == None:
+			return False
+			
+		# an outgoing TCP socket is written by the loop when it has room, the others, which
+		# can't say when they have room, keep the queue's own thread
+		if self._writeQueue != None and startMethod == self._ioConnectTCP:
+			self._writeQueue.onWakeup = self._ioWakeWriter
+			
+		self._ioLoop.callSoon( startMethod)
+		return True
+		
+	def _ioWakeWriter( self):
+		self._ioLoop.callSoon( self._ioWantWrite)
+		
+	#
+	# called by the loop about once a second, calls socketTimeout if nothing has been received
+	# in the last second the same as the threads do
+	#
+	def _ioTick( self, workNow):
+		if workNow - self._lastActivity < 1.0:
+			return
+			
+		self._lastActivity = workNow
+		
+		try:
+			self.socketTimeout()
+		except Exception as e:
+			XTension.writeLog( "Error in xtRemoteConnection.socketTimeout( %s)" % e, xtLogRed)
+			
+	def _ioShouldStop( self):
+		return self.closed or XTension.isShuttingDown
+		
+		
+	#
+	# outgoing TCP. The connect is started without blocking and finished in _ioConnectReady
+	# when the socket becomes writable
+	#
+	def _ioConnectTCP( self):
+		if self._ioShouldStop():
+			return
+			
+		TCP_KEEPALIVE = 0x10
+		workSock = None
+		
+		try:
+			workSock = socket.socket( socket.AF_INET, socket.SOCK_STREAM)
+			workSock.setsockopt( socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+			workSock.setsockopt( socket.IPPROTO_TCP, TCP_KEEPALIVE, 5)
+			workSock.setblocking( False)
+			
+			workAddress = self.getParm( xtKeyRemoteAddress)
+			workPort = int( self.getParm( xtKeyRemotePort))
+		
+			XTension.debugLog( "connecting to: %s:%s" % (workAddress, str( workPort)))
+			
+			result = workSock.connect_ex( (workAddress, workPort))
+			if result != 0 and result != errno.EINPROGRESS and result != errno.EWOULDBLOCK:
+				raise socket.error( result, os.strerror( result))
+				
+		except Exception as e:
+			self._ioConnectFailed( workSock, e)
+			return
+			
+		self.sock = workSock
+		self._ioLoop.register( workSock, selectors.EVENT_WRITE, self._ioConnectReady)
+		
+		# the same 10 seconds the thread gives the connect
+		self._ioLoop.callLater( 10, self._ioConnectTimeout, workSock)
+		
+		
+	def _ioConnectTimeout( self, workSock):
+		if self.sock is workSock and not self.connected:
+			self._ioLoop.unregister( workSock)
+			self._ioConnectFailed( workSock, socket.timeout( 'timed out'))
+			
+			
+	def _ioConnectReady( self, workSock, mask):
+		self._ioLoop.unregister( workSock)
+		
+		result = workSock.getsockopt( socket.SOL_SOCKET, socket.SO_ERROR)
+		if result != 0:
+			self._ioConnectFailed( workSock, socket.error( result, os.strerror( result)))
+			return
+			
+		XTension.debugLog( "connected OK")
+		
+		# writes from other threads block for up to a second the same as the thread version,
+		# reads are only made when the loop says there is something to read
+		workSock.settimeout( 1)
+		
+		self._resetBuffer()
+		self.isConnected = True # DEPRECATED use connected
+		self.connected = True
+		self._lastActivity = _monotonic()
+		
+		# anything written while we were connecting is sent now
+		if self._writeQueue != None and self._writeQueue.hasPending():
+			self._ioLoop.register( workSock, selectors.EVENT_READ | selectors.EVENT_WRITE, self._ioEventTCP)
+		else:
+			self._ioLoop.register( workSock, selectors.EVENT_READ, self._ioEventTCP)
+			
+		self._ioLoop.addTicker( self)
+		
+		# protect our call to connected in case subclass code throws an unexpected error
+		try:
+			self.eventConnected()
+		except Exception as f:
+			XTension.writeLog( "Error in XTRemoteConnection.connected %s" % f, xtLogRed)
+			
+			
+	def _ioConnectFailed( self, workSock, e):
+		if workSock != None:
+			try:
+				workSock.close()
+			except:
+				pass
+				
+		if self.sock is workSock:
+			self.sock = None
+			
+		self.isConnected = False # DEPRECATED use .connected
+		self.connected = False
+		
+		if self.errorSent == False:
+			self.errorSent = True
+			
+			# protect our call to the error handler
+			try:
+				self.error( e)
+			except Exception as f:
+				XTension.writeLog( "Error in XTRemoteConnection.makeTCPConnection( %s) and a further error in XTRemoteConnection.error %s" % (e, f), xtLogRed) 
+				
+		# try again in a couple of seconds
+		if not self._ioShouldStop():
+			self._ioLoop.callLater( 2, self._ioConnectTCP)
+			
+			
+	def _ioEventTCP( self, workSock, mask):
+		if mask & selectors.EVENT_WRITE:
+			if not self._writeQueue.sendAvailable() and self.sock is workSock:
+				self._ioLoop.modify( workSock, selectors.EVENT_READ, self._ioEventTCP)
+				
+		if mask & selectors.EVENT_READ and self.sock is workSock:
+			self._ioReadTCP( workSock, mask)
+			
+	#
+	# the write queue has something to send, watch the socket for room. Only from the loop thread
+	#
+	def _ioWantWrite( self):
+		workSock = self.sock
+		
+		if workSock == None or not self.connected or not self._writeQueue.hasPending():
+			return
+			
+		self._ioLoop.modify( workSock, selectors.EVENT_READ | selectors.EVENT_WRITE, self._ioEventTCP)
+		
+	def _ioReadTCP( self, workSock, mask):
+		try:
+			newData = workSock.recv( 1024)
+		except socket.timeout:
+			return
+		except Exception as e:
+			self._ioDisconnected( workSock, e)
+			return
+			
+		# empty means the other end closed the connection
+		if newData == b'':
+			self._ioDisconnected( workSock, 'disconnected')
+			return
+			
+		self._deliverData( newData)
+		
+		
+	def _ioDisconnected( self, workSock, e):
+		self._ioLoop.unregister( workSock)
+		self._ioLoop.removeTicker( self)
+		
+		try:
+			workSock.close()
+		except:
+			pass
+			
+		if self.sock is workSock:
+			self.sock = None
+			
+		self.isConnected = False # DEPRECATED use connected
+		self.connected = False
+		
+		if self._ioShouldStop():
+			return
+			
+		try:
+			self.error( e)
+		except Exception as f:
+			XTension.writeLog( "Error in XTRemoteConnection.TCPSocketThread( %s) and a further error in XTRemoteConnection.error( %s)" % (e, f), xtLogRed)
+			
+		XTension.debugLog( "attempting to restart connection after %s" % e)
+		self._ioLoop.callLater( 2, self._ioConnectTCP)
+		
+		
+	#
+	# listening TCP server, each accepted connection is run by the loop as well
+	#
+	def _ioListenTCP( self):
+		if self._ioShouldStop():
+			return
+			
+		if self._openTCPServerSocket():
+			self._ioLoop.register( self.sock, selectors.EVENT_READ, self._ioAccept)
+			
+	def _ioAccept( self, workSock, mask):
+		try:
+			newSock, addr = workSock.accept()
+		except socket.timeout:
+			return
+		except Exception as e:
+			if self._ioShouldStop():
 				return
 				
+			self.error( e)
+			return
+			
+		self._acceptConnection( newSock, addr)
+		
+		
+	#
+	# UDP server
+	#
+	def _ioListenUDP( self):
+		if self._ioShouldStop():
+			return
+			
+		if self._openUDPServerSocket():
+			self._ioLoop.register( self.sock, selectors.EVENT_READ, self._ioReadUDP)
+			
+	def _ioReadUDP( self, workSock, mask):
+		try:
+			workMessage, workAddress = workSock.recvfrom( 4096)
+		except socket.timeout:
+			return
+		except Exception as e:
+			if not self._ioShouldStop():
+				self.error( e)
+			return
+			
+		self._deliverDatagram( workMessage, workAddress)
+		
+		
+	#
+	# serial port. pyserial ports have a file descriptor everywhere but windows, if not the 
+	# serial thread is used after all
+	#
+	def _ioOpenSerial( self):
+		if self._ioShouldStop():
+			return
 			
-			self.sock.settimeout( 1)
-			self.sock.bind( (listenNetwork, listenPort))
+		if not self._openSerialPort():
+			self._ioLoop.callLater( 1, self._ioOpenSerial)
+			return
 			
-			self.isConnected = True
-			self.connected = False
-		
-		except Exception as e:
-			self.error( e)
-			self.isConnected = False
-			self.connected = False
+		try:
+			self.serialPort.fileno()
+		except Exception:
+			XTension.debugLog( "serial port can't be used with the IO loop, starting the serial thread")
+			self._ioLoop = None
+			self.serialPort.close()
+			self.serialPort = None
+			self.workThread = Thread( target=self.serialThread, args=())
+			self.workThread.start()
 			return
 			
-		self.listening()
+		self._lastActivity = _monotonic()
+		self._ioLoop.register( self.serialPort, selectors.EVENT_READ, self._ioReadSerial)
+		self._ioLoop.addTicker( self)
 		
-		while not XTension.isShuttingDown:
 		
+	def _ioReadSerial( self, workPort, mask):
+		try:
+			self.lastRead = workPort.read( max( workPort.in_waiting, 1))
+		except Exception as e:
+			XTension.debugLog( "exception in Serial Read: %s" % e)
+			
+			self._ioLoop.unregister( workPort)
+			self._ioLoop.removeTicker( self)
+			
 			try:
-				workMessage, workAddress = self.sock.recvfrom( 4096)
+				workPort.close()
+			except:
+				pass
 				
-			except socket.timeout:
-				continue
-			except Exception as e:
-				if XTension.isShuttingDown:
-					sys.exit()
-					return
+			if self.serialPort is workPort:
+				self.serialPort = None
 				
-				self.error( e)
+			self.connected = False
 			
-			self.remoteAddress = workAddress
-			self.buffer = workMessage
+			if self._ioShouldStop():
+				return
+				
 			try:
-				self.dataAvailable()
-			except Exception as e:
-				XTension.writeLog( "error in datagramReceived: %s" % e, xtLogRed)
-				XTension.writeLog( traceback.format_exc(), xtLogRed)
-				continue
-						
-
-	
-		
+				self.error( e)
+			except Exception as f:
+				XTension.writeLog( "Error in XTRemoteConnection serial read( %s) and a further error in XTRemoteConnection.error( %s)" % (e, f), xtLogRed)
+				
+			self._ioLoop.callLater( 2, self._ioOpenSerial)
+			return
+			
+		if len( self.lastRead) > 0:
+			self._deliverData( self.lastRead)
+			
 			
 	#
 	#	MAKE TCP CONNECTION
@@ -4863,7 +9328,7 @@ class XTRemoteConnection:
 			self.sock.settimeout( 1) # 1 second timeout after that so we can catch shutdown messages from XTension
 			
 			# clear the buffer
-			self.buffer = ''
+			self._resetBuffer()
 			
 			# protect our call to connected in case subclass code throws an unexpected error
 			try:
@@ -4932,7 +9397,13 @@ class XTRemoteConnection:
 	#
 	def write( self, theData, toAddress=None):
 	
-		
+		# with useWriteQueue the data is only queued and sent by the queue
+		if self._writeQueue != None:
+			if self.sock == None and self.serialPort == None:
+				self.error( 'write with no connection')
+				return False
+				
+			return self._writeQueue.put( theData, toAddress)
 		
 # 		if self.sock == None:
 # 			XTension.writeLog( "attempt to send data with no connection: %s" % theData, xtLogRed)
@@ -5009,6 +9480,51 @@ class XTRemoteConnection:
 
 
 
+	#
+	# sends what it can of theData for the XTWriteQueue and returns how much that was
+	#
+	def _sendSome( self, theData, toAddress):
+		if self.connectionMethod == xtPortNameOutgoingTCP:
+			return self.sock.send( theData)
+			
+		elif self.serialPort != None:
+			self.serialPort.write( theData)
+			return len( theData)
+			
+		elif self.listenType == xtKeyListenTypeUDP:
+			self.sock.sendto( theData, toAddress)
+			return len( theData)
+			
+		raise socket.error( 'no connection to write to')
+		
+	#
+	#	F L U S H   W R I T E S
+	#
+	# with useWriteQueue, waits up to timeout seconds for everything written to be sent
+	#
+	def flushWrites( self, timeout=None):
+		if self._writeQueue == None:
+			return True
+			
+		return self._writeQueue.flush( timeout)
+		
+	#
+	#	G E T   W R I T E   M E T R I C S
+	#
+	# bytes waiting, how long writes wait to be sent and so on, see XTWriteQueue.getMetrics
+	#
+	def getWriteMetrics( self):
+		if self._writeQueue == None:
+			return None
+			
+		return self._writeQueue.getMetrics()
+		
+	#
+	#	I S   W R I T E   Q U E U E   F U L L
+	#
+	def isWriteQueueFull( self):
+		return self._writeQueue != None and self._writeQueue.isFull()
+		
 	#
 	#	 SUBCLASS THESE OUTGOING HANDLERS
 	#	in order to process the events
@@ -5047,6 +9563,14 @@ class XTRemoteConnection:
 	def dataAvailable( self):
 		XTension.writeLog( "received new data, check self.buffer")
 		
+	#
+	#	FRAME RECEIVED
+	#
+	# called instead of dataAvailable with each complete frame when there is a framer
+	#
+	def frameReceived( self, frame):
+		XTension.writeLog( "received frame: %s" % repr( frame))
+		
 	#
 	#	LISTENING
 	#
@@ -5054,6 +9578,21 @@ class XTRemoteConnection:
 	
 	def listening( self):
 		XTension.writeLog( "listening server is now ready for connections")
+		
+	#
+	#	WRITE QUEUE FULL
+	#
+	# with useWriteQueue, called when writeHighWater bytes are waiting to be sent. Nothing is 
+	# thrown away but you should stop writing until writeQueueDrained is called
+	#
+	def writeQueueFull( self):
+		XTension.debugLog( "write queue is full")
+		
+	#
+	#	WRITE QUEUE DRAINED
+	#
+	def writeQueueDrained( self):
+		XTension.debugLog( "write queue has room again")
 	
 	
 #
@@ -5064,68 +9603,153 @@ class XTRemoteConnection:
 
 
 class XTTCPServerConnection( threading.Thread):
+
+	framer = None
 	
 	# called by the server thread after you return the new class
 	# could do this in the constructor but then you'd have to remember to call the 
 	# super constructor which is not necessary if we do this
+	#
+	# if the server is run by the XTIOLoop then so is this connection and the thread is never started
 	def _setup( self, ip, port, sock, myServer):
 		self.ip = ip
 		self.port = port
 		self.sock = sock
 		self.parentServer = myServer
 		
-		self.buffer = ''
+		self.buffer = b''
 		self.isConnected = True
 		self.connected = True
 		self.writeLock = threading.Lock() 
+		
+		self._ioLoop = myServer._ioLoop
 
-		self.start()
+		if self._ioLoop == None:
+			self.start()
+		else:
+			self.sock.settimeout( 1)
+			self._ioLoop.register( self.sock, selectors.EVENT_READ, self._ioRead)
+			self._connectedEvent()
 
 		
 	def run( self):
 	
 		self.sock.settimeout( 1)
 		
-		self.eventConnected()
+		self._connectedEvent()
 		
-		while not XTension.isShuttingDown:
+		while not XTension.isShuttingDown and self.connected:
 		
 			try:
 				newData = self.sock.recv( 2048)
 			
-				if newData == '':
-					self.isConnected = False
-					self.connected = False
-					self.error( 'disconnected')
-				
-					if self in parentServer.connectedThreads:
-						del parentServer.connectedThreads[ self]
-				
-					sys.exit()
-					return
-			
 			except socket.timeout:
 				# no error, just checking to make sure that we're not being shutdown
 				continue
 				
 			except Exception as e:
-				
-				self.isConnected = False
-				self.connected = False
-				self.error( e)
-				
-				if self in parentServer.connectedThreads:
-					del parentServer.connectedThreads[ self]
-					
+				self._connectionLost( e)
 				sys.exit()
 				return
 				
-			self.buffer += newData
+			if newData == b'':
+				self._connectionLost( 'disconnected')
+				sys.exit()
+				return
+			
+			self._deliverData( newData)
+			
+			
+	def _ioRead( self, workSock, mask):
+		try:
+			newData = workSock.recv( 2048)
+		except socket.timeout:
+			return
+		except Exception as e:
+			self._connectionLost( e)
+			return
+			
+		if newData == b'':
+			self._connectionLost( 'disconnected')
+			return
+			
+		self._deliverData( newData)
+		
+		
+	def _connectedEvent( self):
+		try:
+			self.eventConnected()
+		except Exception as e:
+			XTension.writeLog( "error in XTTCPServerConnection.eventConnected %s" % e, xtLogRed)
+			
+			
+	def _deliverData( self, newData):
+		if self.framer != None:
+			self._deliverFrames( newData)
+			return
+			
+		self.buffer += newData
+		
+		try:
+			self.dataAvailable()
+		except Exception as e:
+			XTension.writeLog( "error in XTTCPServerThread.dataAvailable %s" % e)
 			
+	def _deliverFrames( self, newData):
+		workFramer = self.framer
+		workFramer.feed( newData)
+		
+		try:
+			workFrames = workFramer.frames()
+		except Exception as e:
+			XTension.writeLog( "error in %s.frames( %s)" % (workFramer.__class__.__name__, e), xtLogRed)
+			workFramer.reset()
+			return
+				
+		for workFrame in workFrames:
 			try:
-				self.dataAvailable()
+				self.frameReceived( workFrame)
 			except Exception as e:
-				XTension.writeLog( "error in XTTCPServerThread.dataAvailable %s" % e)
+				XTension.writeLog( "error in XTTCPServerConnection.frameReceived %s" % e, xtLogRed)
+				
+	#
+	#	S E T   F R A M E R
+	#
+	# the same as XTRemoteConnection.setFramer. Each connection needs a framer of its own so
+	# make one in eventConnected which is called before anything is read
+	#
+	def setFramer( self, framer):
+		self.framer = framer
+		
+		if framer != None and self.buffer:
+			workBuffer = self.buffer
+			self.buffer = b''
+			self._deliverFrames( workBuffer)
+			
+			
+	#
+	# the other end closed the connection or there was an error reading from it
+	#
+	def _connectionLost( self, e):
+		self.isConnected = False
+		self.connected = False
+		
+		if self._ioLoop != None:
+			self._ioLoop.unregister( self.sock)
+			
+		try:
+			self.sock.close()
+		except:
+			pass
+			
+		if self in self.parentServer.connectedThreads:
+			self.parentServer.connectedThreads.remove( self)
+			
+		if not XTension.isShuttingDown:
+			try:
+				self.error( e)
+			except Exception as f:
+				XTension.writeLog( "error in XTTCPServerConnection.error %s" % f, xtLogRed)
 	
 				
 	#
@@ -5148,7 +9772,7 @@ class XTTCPServerConnection( threading.Thread):
 		totalsent = 0
 		while totalsent < len( theData):
 			try:
-				send = self.sock.send( theData[ totalsent:])
+				sent = self.sock.send( theData[ totalsent:])
 				
 				if sent == 0:
 					self.writeLock.release()
@@ -5171,7 +9795,7 @@ class XTTCPServerConnection( threading.Thread):
 					self.error( e)
 					return
 						
-		self.writeLog.release()				
+		self.writeLock.release()				
 
 			
 	
@@ -5184,14 +9808,23 @@ class XTTCPServerConnection( threading.Thread):
 	#
 	#	CONNECTED EVENT
 	#
-	def connected( self):
-		XTension.writeLog( "Accepted Connection from: %s:%s" & (self.ip, str( self.port)))
+	# this used to be called connected which is also the name of the connected flag so it was
+	# never called, the thread called eventConnected which did not exist.
+	#
+	def eventConnected( self):
+		XTension.writeLog( "Accepted Connection from: %s:%s" % (self.ip, str( self.port)))
 		
 	#
 	#	DATA AVAILABLE
 	#
 	def dataAvailable( self):
 		XTension.writeLog( "received new data, check self.buffer")
+		
+	#
+	#	FRAME RECEIVED
+	#
+	def frameReceived( self, frame):
+		XTension.writeLog( "received frame: %s" % repr( frame))
 	
 	#
 	#	ERROR
@@ -5493,6 +10126,14 @@ def hexify( data):
 # 	the timeout can be changed at any time after the class is created by setting the class property timeout
 #	to whatever you wish, though it will not affect a command that has already been started. If the timer is not
 #	already running then the next one will use the new value.
+#
+#	the waiting is done by the XTension.getScheduler() thread rather than starting a thread for every command
+#	there are also these optional kwds:
+#		extendOnAdd=True	every add pushes the send back to timeout seconds after it, so a dimmer being 
+#							dragged is sent once it stops moving rather than half a second after it started
+#		maxLatency=2.0		with extendOnAdd the command is never held longer than this after the first add
+#		maxFields=10		sends the command as soon as it has this many values in it rather than waiting
+#	these can also be changed as properties at any time.
 
 class xtDeferredCommand():
 	#
@@ -5502,9 +10143,60 @@ class xtDeferredCommand():
 
 		self.parentUnit = inParentUnit
 		self.command = None
-		self.thread = None
 		self.lock = threading.Lock()
 		self.timeout = kwds.get( "timeout", 0.5)
+		self.extendOnAdd = kwds.get( "extendOnAdd", False)
+		self.maxLatency = kwds.get( "maxLatency", None)
+		self.maxFields = kwds.get( "maxFields", None)
+		
+		# the hue, saturation and value for xtKeyColorHSV are kept separately and only joined
+		# when the command is sent, see addHue and addSaturation
+		self._hsv = None
+		
+		# the XTScheduledCall that will send the command and when the command was started
+		self._scheduled = None
+		self._startTime = 0.0
+		
+		# counts the commands sent. A scheduled send carries the count from when it was
+		# scheduled so one that was already on its way when the command went out, by flush or
+		# by a reschedule that came too late, doesn't send the next command early
+		self._sendCount = 0
+		
+	
+	#
+	#	_ B E G I N
+	#
+	#	called with the lock held by everything that adds to the command. Starts a new command 
+	#	and schedules it to be sent, or with extendOnAdd pushes back the one already waiting
+	#
+	def _begin( self):
+		if self.command == None:
+			self.command = {}
+			self._startTime = _monotonic()
+			self._scheduled = XTension.getScheduler().callLater( self.timeout, self.deferredSend, self._sendCount)
+			
+		elif self.extendOnAdd and self._scheduled != None:
+			delay = self.timeout
+			
+			if self.maxLatency != None:
+				delay = min( delay, self._startTime + self.maxLatency - _monotonic())
+				
+			self._scheduled = XTension.getScheduler().reschedule( self._scheduled, max( delay, 0))
+			
+	#
+	#	_ I S   F U L L
+	#
+	#	True if maxFields is set and the command has that many values. Also called with the lock held
+	#
+	def _isFull( self):
+		if self.maxFields == None or self.command == None:
+			return False
+			
+		fieldCount = len( self.command)
+		if self._hsv != None:
+			fieldCount += 1
+			
+		return fieldCount >= self.maxFields
 		
 	
 	#
@@ -5520,6 +10212,7 @@ class xtDeferredCommand():
 	def addData(self, **kwds):
 		self.lock.acquire()
 		isConditional = False
+		isFull = False
 
 		try:		
 			if "conditional" in kwds:
@@ -5527,37 +10220,36 @@ class xtDeferredCommand():
 				# and then remove this as we don't want to send it to XTension
 				del( kwds[ "conditional"])
 		
-
-			# if the command is None then we have no outstanding command and we should create one
-			if self.command == None:
-				# all commands must have a command reference in them so start it with the NoOp
-				# so if some of the data does not trigger an on or off it will still br properly 
-				# published
-				self.command = {}
+			# if the command is None then we have no outstanding command and this creates one
+			self._begin()
 			
-				# now transfer all the remaining keys from kwds into the command dict
-				for key in kwds:
-					# if conditional then dont add it if it's already there
-					if isConditional and key in self.command:
-						continue
+			# now transfer all the remaining keys from kwds into the command dict
+			for key in kwds:
+				# if conditional then dont add it if it's already there
+				if isConditional and key in self.command:
+					continue
 					
-					self.command[ key] = kwds[ key]
-			
-				self.thread = Thread( target=self.deferredSend, args=())
-				self.thread.start()
-			else:
-				# our command is outstanding so we can instead just add any passed key to it
-				for key in kwds:
-					if isConditional and key in self.command:
+				# a whole HSV replaces what addHue and addSaturation have set so far, the
+				# next of those starts from this one. A conditional one doesn't replace them
+				if key == xtKeyColorHSV and self._hsv != None:
+					if isConditional:
 						continue
 						
-					self.command[ key] = kwds[ key]
+					self._hsv = None
+					
+				self.command[ key] = kwds[ key]
+				
+			isFull = self._isFull()
+				
 		except Exception as e:
 			XTension.writeLog( "error in deferredCommand.addData( %s)" % e, xtLogRed)
 			XTension.writeLog( traceback.format_exc(), xtLogRed)
 			
 		# the try block above assures that the release gets called even if an error happens
 		self.lock.release()
+		
+		if isFull:
+			self.flush()
 	
 	
 	#
@@ -5571,24 +10263,7 @@ class xtDeferredCommand():
 	#
 	# hue must be between 0 and 1 for XTension
 	def addHue( self, newHue):
-		self.lock.acquire()
-		
-		if self.command == None:
-			self.command = {}
-			self.thread = Thread( target=self.deferredSend, args=())
-			self.thread.start()
-			
-		
-		if xtKeyColorHSV in self.command:
-			[workHue, workSaturation, workValue] = self.command[ xtKeyColorHSV].split( ',')
-			
-			
-			self.command[ xtKeyColorHSV] = ','.join( [str( newHue), workSaturation, workValue])
-			
-		else:
-			self.command[ xtKeyColorHSV] = ','.join( [str( newHue), "1", "1"])
-			
-		self.lock.release()
+		self._addHSV( 0, newHue)
 		
 	
 	#
@@ -5598,22 +10273,33 @@ class xtDeferredCommand():
 	#
 	# sats must be between 0 and 1 for XTension
 	def addSaturation( self, newSat):
+		self._addHSV( 1, newSat)
+		
+		
+	def _addHSV( self, index, newValue):
 		self.lock.acquire()
+		isFull = False
+		
+		try:
+			self._begin()
 			
-		if self.command == None:
-			self.command = {}
-			self.thread = Thread( target=self.deferredSend, args=())
-			self.thread.start()
-			
-		if xtKeyColorHSV in self.command:
-			[workHue, workSaturation, workValue] = self.command[ xtKeyColorHSV].split( ',')
+			if self._hsv == None:
+				if xtKeyColorHSV in self.command:
+					self._hsv = self.command.pop( xtKeyColorHSV).split( ',')
+				else:
+					self._hsv = ["1", "1", "1"]
+				
+			self._hsv[ index] = str( newValue)
+			isFull = self._isFull()
 			
-			self.command[ xtKeyColorHSV] = ','.join( [workHue, str( newSat), workValue])
-		
-		else:
-			self.command[ xtKeyColorHSV] = ','.join( ["1", str( newSat), "1"])
+		except Exception as e:
+			XTension.writeLog( "error in deferredCommand._addHSV( %s)" % e, xtLogRed)
+			XTension.writeLog( traceback.format_exc(), xtLogRed)
 			
 		self.lock.release()
+		
+		if isFull:
+			self.flush()
 	
 	
 	#
@@ -5633,12 +10319,11 @@ class xtDeferredCommand():
 	def addUnitProperty( self, key, value):
 		
 		self.lock.acquire()
+		wasAdded = False
+		isFull = False
 		
 		try:
-			if self.command == None:
-				self.command = {}
-				self.thread = Thread( target=self.deferredSend, args=())
-				self.thread.start()
+			self._begin()
 		
 			for i in range( 0, 10):
 				workNameKey = xtKeyUnitPropertyName + str( i)
@@ -5649,8 +10334,9 @@ class xtDeferredCommand():
 					if self.command[ workNameKey] == key:
 						# replace the previous one with the new one
 						self.command[ xtKeyUnitPropertyValue + str( i)] = value
-						self.lock.release()
-						return True
+						wasAdded = True
+						break
+						
 					# this one is already set, keep looking for a free spot
 					continue
 				else:
@@ -5658,55 +10344,93 @@ class xtDeferredCommand():
 				
 					self.command[ workNameKey] = key
 					self.command[ xtKeyUnitPropertyValue + str( i)] = value
-					self.lock.release()
-					return True
+					wasAdded = True
+					break
+					
+			isFull = self._isFull()
 
 		except Exception as e:
 			XTension.writeLog( "Error: deferredCommand.addUnitProperty( %s)" % e, xtLogRed)
 			XTension.writeLog( traceback.format_exc(), xtLogRed)
 		
-		# we went through all the available keys an there is no slot for another property to be added
-		# 
+		# if wasAdded is still False we went through all the available keys an there is no slot for 
+		# another property to be added
 		self.lock.release()
-		return False
+		
+		if isFull:
+			self.flush()
+			
+		return wasAdded
+			
+			
+	#
+	#	F L U S H
+	#
+	#	sends whatever has been added so far right now rather than waiting for the timeout
+	#
+	def flush( self):
+		self.lock.acquire()
+		
+		if self._scheduled != None:
+			XTension.getScheduler().cancel( self._scheduled)
 			
+		self.lock.release()
+		self.deferredSend()
 		
 
 	#
 	#	D E F E R R E D   S E N D
 	#
-	#	created when you start adding data to the command
-	#	is running in a thread so the sleep command will not block other threads
-	#	sleeps for half a second and then sends the command, clearing it afterwards so that
-	#	a new one can be created after that.
+	#	called by the scheduler thread when the timeout is up, or by flush, and sends the command
+	#	clearing it first so that a new one can be started while this one is being sent
+	#
+	#	sendCount is passed by the scheduled call, if a command has been sent since it was
+	#	scheduled then it's for a command that's gone and nothing is done
 	#	
-	def deferredSend( self):
-		sleep( self.timeout)
+	def deferredSend( self, sendCount=None):
 		
-		try:
-			self.lock.acquire()
+		self.lock.acquire()
+		
+		if sendCount != None and sendCount != self._sendCount:
+			self.lock.release()
+			return
+			
+		workCommand = self.command
+		workHSV = self._hsv
+		
+		# clear us out of the object so it can be used again
+		self.command = None
+		self._hsv = None
+		self._scheduled = None
+		
+		if workCommand != None:
+			self._sendCount += 1
+		
+		self.lock.release()
 		
+		if workCommand == None:
+			# already sent by flush
+			return
+		
+		try:
+			if workHSV != None:
+				workCommand[ xtKeyColorHSV] = ','.join( workHSV)
 			
 			# make sure there is a command and if not use NoOp
-			if not "xtKeyCommand" in self.command:
+			if not "xtKeyCommand" in workCommand:
 				# I believe this is actually incorrect, since these are keywords parameters
 				# the name of it will be the string "xtKeyCommand" and not the value of it
 				#self.command[ xtKeyCommand] = xtCommandNoOp
-				self.command[ "xtKeyCommand"] = xtCommandNoOp
+				workCommand[ "xtKeyCommand"] = xtCommandNoOp
 
 
 			#XTension.debugLog( "sending deferred command", xtLogGreen)			
-			self.parentUnit.sendCommand( **self.command)
+			self.parentUnit.sendCommand( **workCommand)
 		
 		except Exception as e:
 			XTension.writeLog( "error in deferredCommand.deferredSend( %s)" % e, xtLogRed)
 			XTension.writeLog( traceback.format_exc(), xtLogRed)
 
-		# clear us out of the object so it can be used again
-		self.command = None
-
-		self.lock.release()
-
 		#XTension.debugLog( "deferredSend complete", xtLogGreen)		
 			
 